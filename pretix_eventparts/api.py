@@ -0,0 +1,277 @@
+from django.db.models import OuterRef, Subquery
+from django.shortcuts import get_object_or_404
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from django_scopes import scope
+from pretix.api.serializers.i18n import I18nAwareModelSerializer
+from pretix.base.models import CheckinList, Order, OrderPosition
+from rest_framework import mixins, serializers, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
+from rest_framework.response import Response
+
+from pretix_eventparts.assignments import CapacityExceeded, set_assignments
+from pretix_eventparts.checkin import checkin_data
+from pretix_eventparts.models import EventPart, EventPartAssignment
+from pretix_eventparts.tickets import TICKET_FIELDS, queue_eventpart_ticket_regeneration
+
+TYPES = EventPart.EventPartTypes.values
+
+
+class IdCursorPagination(CursorPagination):
+    ordering = ("id",)
+    page_size = 50
+    max_page_size = 1000
+    page_size_query_param = "page_size"
+
+
+class EventPartSerializer(I18nAwareModelSerializer):
+    occupancy = serializers.IntegerField(source="used_places", read_only=True)
+
+    class Meta:
+        model = EventPart
+        fields = (
+            "id",
+            "name",
+            "description",
+            "category",
+            "type",
+            "capacity",
+            "occupancy",
+        )
+
+    def validate_type(self, value):
+        if (
+            self.instance is not None
+            and value != self.instance.type
+            and self.instance.has_assignments()
+        ):
+            raise ValidationError(
+                _(
+                    "The type cannot be changed while orders are assigned to "
+                    "this eventpart."
+                )
+            )
+        return value
+
+
+class EventPartViewSet(viewsets.ModelViewSet):
+    serializer_class = EventPartSerializer
+    queryset = EventPart.objects.none()
+    pagination_class = IdCursorPagination
+    permission = "can_view_orders"
+    write_permission = "can_change_items"
+
+    def get_queryset(self):
+        with scope(event=self.request.event):
+            qs = EventPart.objects.filter(event=self.request.event)
+            if self.request.method == "GET":
+                qs = qs.with_occupancy()
+            return qs
+
+    def perform_create(self, serializer):
+        serializer.save(event=self.request.event)
+        serializer.instance.log_action(
+            "pretix_eventparts.eventpart.added",
+            user=self.request.user,
+            auth=self.request.auth,
+            data=self.request.data,
+        )
+
+    def perform_update(self, serializer):
+        outdated = any(
+            f in serializer.validated_data
+            and serializer.validated_data[f] != getattr(serializer.instance, f)
+            for f in TICKET_FIELDS
+        )
+        serializer.save(event=self.request.event)
+        if outdated:
+            queue_eventpart_ticket_regeneration(serializer.instance)
+        serializer.instance.log_action(
+            "pretix_eventparts.eventpart.changed",
+            user=self.request.user,
+            auth=self.request.auth,
+            data=self.request.data,
+        )
+
+    def perform_destroy(self, instance):
+        instance.log_action(
+            "pretix_eventparts.eventpart.deleted",
+            user=self.request.user,
+            auth=self.request.auth,
+        )
+        instance.delete()
+
+
+class EventPartAssignmentSerializer(serializers.Serializer):
+    order = serializers.CharField(source="code", read_only=True)
+    start = serializers.IntegerField(
+        source="eventpart_start", allow_null=True, required=False
+    )
+    middle = serializers.IntegerField(
+        source="eventpart_middle", allow_null=True, required=False
+    )
+    end = serializers.IntegerField(
+        source="eventpart_end", allow_null=True, required=False
+    )
+
+    def validate(self, data):
+        eventparts = self.context["eventparts"]
+        parts = {}
+        for type in TYPES:
+            key = "eventpart_{}".format(type)
+            if key not in data:
+                continue
+            pk = data[key]
+            if pk is None:
+                parts[type] = None
+            elif pk in eventparts and eventparts[pk].type == type:
+                parts[type] = eventparts[pk]
+            else:
+                raise ValidationError(
+                    {type: [_("No eventpart of this type with this ID exists.")]}
+                )
+        return parts
+
+
+class EventPartAssignmentViewSet(
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.UpdateModelMixin,
+    viewsets.GenericViewSet,
+):
+    serializer_class = EventPartAssignmentSerializer
+    queryset = Order.objects.none()
+    pagination_class = IdCursorPagination
+    lookup_field = "code"
+    permission = "can_view_orders"
+    write_permission = "can_change_orders"
+
+    def get_queryset(self):
+        with scope(event=self.request.event):
+            return (
+                Order.objects.filter(event=self.request.event)
+                .annotate(
+                    **{
+                        "eventpart_{}".format(t): Subquery(
+                            EventPartAssignment.objects.filter(
+                                order_id=OuterRef("pk"), type=t
+                            )
+                            .order_by("position_id")
+                            .values("eventpart_id")[:1]
+                        )
+                        for t in TYPES
+                    }
+                )
+                .only("id", "code")
+            )
+
+    def get_serializer_context(self):
+        ctx = super().get_serializer_context()
+        if self.request.method not in ("GET", "HEAD", "OPTIONS"):
+            with scope(event=self.request.event):
+                ctx["eventparts"] = {e.pk: e for e in EventPart.objects.all()}
+        return ctx
+
+    def perform_update(self, serializer):
+        try:
+            set_assignments(
+                self.request.event, {serializer.instance: serializer.validated_data}
+            )
+        except CapacityExceeded as e:
+            raise ValidationError(str(e))
+
+    def update(self, request, *args, **kwargs):
+        super().update(request, *args, **kwargs)
+        return Response(self.get_serializer(self.get_object()).data)
+
+    @action(detail=False, methods=["POST"])
+    def bulk(self, request, *args, **kwargs):
+        if not isinstance(request.data, dict):
+            raise ValidationError(
+                _("Expected an object mapping order codes to assignments.")
+            )
+
+        context = self.get_serializer_context()
+        orders = {
+            o.code: o
+            for o in Order.objects.filter(
+                event=self.request.event, code__in=list(request.data)
+            ).only("id", "code", "event_id")
+        }
+
+        assignments = {}
+        errors = {}
+        for code, data in request.data.items():
+            if code not in orders:
+                errors[code] = [_("No order with this code exists.")]
+                continue
+            serializer = self.get_serializer(data=data, context=context)
+            if serializer.is_valid():
+                assignments[orders[code]] = serializer.validated_data
+            else:
+                errors[code] = serializer.errors
+        if errors:
+            raise ValidationError(errors)
+
+        try:
+            changed = set_assignments(self.request.event, assignments)
+        except CapacityExceeded as e:
+            raise ValidationError(str(e))
+        return Response(
+            {"orders": len(assignments), "eventparts_changed": len(changed)},
+            status=status.HTTP_200_OK,
+        )
+
+
+class CheckinPositionSerializer(serializers.Serializer):
+    id = serializers.IntegerField()
+    order = serializers.CharField(source="order.code")
+    positionid = serializers.IntegerField()
+    secret = serializers.CharField()
+    eventparts = serializers.SerializerMethodField()
+
+    def get_eventparts(self, position):
+        parts = self.context["positions"].get(position.pk, {})
+        return {type: parts.get(type) for type in TYPES}
+
+
+class CheckinListEventPartViewSet(mixins.ListModelMixin, viewsets.GenericViewSet):
+    """Lists the positions of a check-in list together with their eventparts,
+    for scanners that sync the list for offline use.
+
+    Lists filtered by eventpart only contain the positions assigned to
+    one of their eventparts. pretix itself does not apply this filter,
+    so it only holds for scanners syncing through this endpoint.
+    """
+
+    serializer_class = CheckinPositionSerializer
+    queryset = OrderPosition.all.none()
+    pagination_class = IdCursorPagination
+    permission = ("can_view_orders", "can_checkin_orders")
+
+    @cached_property
+    def checkinlist(self):
+        return get_object_or_404(
+            CheckinList, event=self.request.event, pk=self.kwargs["list"]
+        )
+
+    @cached_property
+    def checkin_data(self):
+        return checkin_data(self.checkinlist)
+
+    def get_queryset(self):
+        with scope(event=self.request.event):
+            qs = self.checkinlist.positions.select_related("order").only(
+                "id", "positionid", "secret", "order__code"
+            )
+            members = self.checkin_data["members"]
+            if members is not None:
+                qs = qs.filter(pk__in=members)
+            return qs
+
+    def get_serializer_context(self):
+        ctx = super().get_serializer_context()
+        ctx["positions"] = self.checkin_data["positions"]
+        return ctx
@@ -0,0 +1,555 @@
+from collections import defaultdict
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils.timezone import now
+from django.utils.translation import gettext as _
+from django_scopes import scopes_disabled
+from pretix.base.models import Order, OrderPosition
+
+from pretix_eventparts.cache import (
+    eventparts_cache,
+    invalidate_event_assignments,
+    invalidate_order_info,
+)
+from pretix_eventparts.models import (
+    ACTIVE_STATUSES,
+    EventPart,
+    EventPartAssignment,
+    EventPartWaitingListEntry,
+)
+from pretix_eventparts.occupancy import update_occupancy
+from pretix_eventparts.tickets import queue_ticket_regeneration
+from pretix_eventparts.utils import clear_eventparts_for_order
+
+
+class CapacityExceeded(Exception):
+    def __init__(self, eventpart):
+        self.eventpart = eventpart
+        super().__init__(
+            _(
+                "The eventpart {name} does not have enough capacity left "
+                "({capacity} places)."
+            ).format(name=eventpart.name, capacity=eventpart.capacity)
+        )
+
+
+def _lock_eventparts(eventpart_ids):
+    # Locking in primary key order keeps concurrent writers from deadlocking.
+    # Callers check the capacity afterwards with _check_capacity, which counts
+    # the same ACTIVE_STATUSES as every other occupancy query
+    with scopes_disabled():
+        list(
+            EventPart.objects.select_for_update()
+            .filter(pk__in=eventpart_ids)
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+
+
+def _check_capacity(eventpart_ids, orders=()):
+    # Places reserved by customers of other orders count as taken, places of
+    # canceled and expired orders do not
+    with scopes_disabled():
+        for eventpart in (
+            EventPart.objects.filter(pk__in=eventpart_ids)
+            .with_occupancy(status=ACTIVE_STATUSES)
+            .with_reserved(exclude_orders=orders)
+        ):
+            if eventpart.exceeds_capacity(eventpart.occupancy + eventpart.reserved):
+                raise CapacityExceeded(eventpart)
+
+
+def _seats_per_order(event):
+    return dict(
+        Order.objects.filter(event=event, status=Order.STATUS_PAID)
+        .order_by()
+        .annotate(
+            seats=Count(
+                "all_positions",
+                filter=Q(
+                    all_positions__canceled=False,
+                    all_positions__item__admission=True,
+                ),
+            )
+        )
+        .values_list("pk", "seats")
+    )
+
+
+def _admission_positions(order_ids):
+    positions = defaultdict(list)
+    with scopes_disabled():
+        for order_id, pk in (
+            OrderPosition.objects.filter(order_id__in=order_ids, item__admission=True)
+            .order_by("positionid")
+            .values_list("order_id", "pk")
+        ):
+            positions[order_id].append(pk)
+    return positions
+
+
+def _pick_eventpart(candidates, free, seats, balance_categories):
+    fitting = [e for e in candidates if free[e.pk] >= seats]
+    if not fitting:
+        return None
+    if not balance_categories:
+        return fitting[0]
+
+    by_category = defaultdict(list)
+    for e in fitting:
+        by_category[e.category].append(e)
+
+    def fill_ratio(category):
+        parts = [e for e in candidates if e.category == category]
+        if not all(e.capacity for e in parts):
+            # A category with an unlimited eventpart never fills up
+            return 0
+        capacity = sum(e.capacity for e in parts)
+        used = sum(e.capacity - free[e.pk] for e in parts)
+        return used / capacity if capacity else 1
+
+    category = min(sorted(by_category), key=fill_ratio)
+    return max(by_category[category], key=lambda e: free[e.pk])
+
+
+def plan_auto_assignment(event, balance_categories=False):
+    """Distributes all paid orders that lack an eventpart of a type over the
+    eventparts of that type without exceeding their capacity.
+
+    Orders are placed in the order they were created. By default every
+    order goes into the first part that still has enough room for all
+    of its admission positions; with ``balance_categories``, the
+    category with the lowest fill ratio is preferred and the order goes
+    into the emptiest part of that category.
+
+    Returns a JSON serializable plan with the planned
+    ``(order_id, eventpart_id)`` pairs in ``assignments``, the
+    occupancy of every part before and after in ``eventparts`` and the
+    number of orders that did not fit per type in ``unplaced``.
+    """
+    with scopes_disabled():
+        eventparts = list(
+            EventPart.objects.filter(event=event)
+            .with_occupancy()
+            .with_reserved()
+            .order_by("type", "category", "name", "pk")
+        )
+        seats = _seats_per_order(event)
+        assigned_types = defaultdict(set)
+        for order_id, type in (
+            EventPartAssignment.objects.filter(eventpart__event=event)
+            .order_by()
+            .values_list("order_id", "type")
+            .distinct()
+        ):
+            assigned_types[order_id].add(type)
+
+    free = {e.pk: e.places_left(e.occupancy + e.reserved) for e in eventparts}
+    plan = {
+        "assignments": [],
+        "eventparts": {
+            e.pk: {
+                "name": e.name,
+                "type": e.type,
+                "category": e.category,
+                "capacity": e.capacity,
+                "before": e.occupancy,
+                "after": e.occupancy,
+            }
+            for e in eventparts
+        },
+        "unplaced": {},
+    }
+
+    for type in EventPart.EventPartTypes.values:
+        candidates = [e for e in eventparts if e.type == type]
+        if not candidates:
+            continue
+        unplaced = 0
+        for order_id in sorted(seats):
+            if type in assigned_types[order_id]:
+                continue
+            eventpart = _pick_eventpart(
+                candidates, free, seats[order_id], balance_categories
+            )
+            if eventpart is None:
+                unplaced += 1
+                continue
+            free[eventpart.pk] -= seats[order_id]
+            plan["eventparts"][eventpart.pk]["after"] += seats[order_id]
+            plan["assignments"].append((order_id, eventpart.pk))
+        plan["unplaced"][type] = unplaced
+
+    return plan
+
+
+def apply_auto_assignment(event, plan, chunk_size=1000, progress=None):
+    """Writes the assignments of a plan created by
+    :func:`plan_auto_assignment` with one bulk insert per chunk, each in
+    its own transaction.
+
+    The eventparts of a chunk are locked while it is written, so
+    assignments made in parallel are taken into account: orders that
+    have been assigned an eventpart of the type in the meantime are
+    skipped, and if an eventpart turns out to be full by now,
+    :class:`CapacityExceeded` is raised and the chunk is rolled back.
+    The chunks written before stay, and the number of orders they
+    assigned is stored on the exception as ``assigned``.
+
+    ``progress`` is called with the completed percentage after every
+    chunk. Returns the number of assigned orders.
+    """
+    types = {int(pk): e["type"] for pk, e in plan["eventparts"].items()}
+    assignments = plan["assignments"]
+    assigned = 0
+    try:
+        for start in range(0, len(assignments), chunk_size):
+            end = start + chunk_size
+            chunk = assignments[start:end]
+            eventpart_ids = {eventpart_id for order_id, eventpart_id in chunk}
+            with transaction.atomic():
+                _lock_eventparts(eventpart_ids)
+                with scopes_disabled():
+                    taken = set(
+                        EventPartAssignment.objects.filter(
+                            order_id__in={order_id for order_id, e in chunk}
+                        ).values_list("order_id", "type")
+                    )
+                    chunk = [
+                        (order_id, eventpart_id)
+                        for order_id, eventpart_id in chunk
+                        if (order_id, types[eventpart_id]) not in taken
+                    ]
+                    positions = _admission_positions(
+                        {order_id for order_id, e in chunk}
+                    )
+                    EventPartAssignment.objects.bulk_create(
+                        [
+                            EventPartAssignment(
+                                order_id=order_id,
+                                position_id=position_id,
+                                eventpart_id=eventpart_id,
+                                type=types[eventpart_id],
+                            )
+                            for order_id, eventpart_id in chunk
+                            for position_id in positions[order_id] or [None]
+                        ],
+                        ignore_conflicts=True,
+                    )
+                update_occupancy(eventpart_ids)
+                _check_capacity(
+                    eventpart_ids,
+                    orders={order_id for order_id, eventpart_id in chunk},
+                )
+                queue_ticket_regeneration(
+                    event,
+                    positions={pk for ids in positions.values() for pk in ids},
+                    orders={order_id for order_id, eventpart_id in chunk},
+                )
+            assigned += len(chunk)
+            if progress:
+                progress(round(100 * min(end, len(assignments)) / len(assignments)))
+    except CapacityExceeded as e:
+        e.assigned = assigned
+        raise
+    finally:
+        eventparts_cache(event).clear()
+    return assigned
+
+
+@transaction.atomic
+def set_assignments(event, assignments, batch_size=1000):
+    """Changes the eventpart assignments of many orders at once.
+
+    ``assignments`` maps orders or single order positions to a dict of
+    ``{type: eventpart}``. An order stands for all of its admission
+    positions; a single position must be an active admission position,
+    otherwise :class:`ValueError` is raised. Only the given types are
+    touched, an eventpart of ``None`` removes the assignment of that
+    type. All changes are written with bulk deletes, updates and inserts
+    in a single transaction.
+
+    Every eventpart that gains positions is locked for the duration of
+    the transaction and its occupancy is verified after the write,
+    counting places reserved for other orders as taken. If it exceeds
+    the capacity, :class:`CapacityExceeded` is raised and nothing is
+    changed.
+
+    Returns the ids of all eventparts whose occupancy changed.
+    """
+    orders = {}
+    for key in assignments:
+        order = key.order if isinstance(key, OrderPosition) else key
+        orders.setdefault(order.pk, order)
+    positions = _admission_positions(orders)
+    for key in assignments:
+        if isinstance(key, OrderPosition) and key.pk not in positions[key.order_id]:
+            raise ValueError(
+                "Position {} does not grant admission and cannot be assigned to "
+                "an eventpart.".format(key.pk)
+            )
+
+    current = {}
+    assigned_positions = defaultdict(list)
+    with scopes_disabled():
+        for pk, order_id, position_id, type, eventpart_id in (
+            EventPartAssignment.objects.filter(order_id__in=orders)
+            .order_by()
+            .values_list("pk", "order_id", "position_id", "type", "eventpart_id")
+        ):
+            current[order_id, position_id, type] = (pk, eventpart_id)
+            assigned_positions[order_id, type].append(position_id)
+
+    wanted = {}
+    for key, parts in assignments.items():
+        for type, eventpart in parts.items():
+            if isinstance(key, OrderPosition):
+                wanted[key.order_id, key.pk, type] = eventpart
+                continue
+            for position_id in positions[key.pk] or [None]:
+                wanted[key.pk, position_id, type] = eventpart
+            # Rows of positions that no longer grant admission are dropped
+            for position_id in assigned_positions[key.pk, type]:
+                wanted.setdefault((key.pk, position_id, type), None)
+
+    delete = []
+    create = []
+    update = []
+    changed = set()
+    gaining = set()
+    losing = set()
+    touched = set()
+    for (order_id, position_id, type), eventpart in wanted.items():
+        pk, eventpart_id = current.get((order_id, position_id, type), (None, None))
+        new_id = eventpart.pk if eventpart else None
+        if eventpart_id == new_id:
+            continue
+        touched.add((order_id, position_id))
+        if pk:
+            changed.add(eventpart_id)
+            losing.add(eventpart_id)
+        if pk and eventpart:
+            update.append(
+                EventPartAssignment(pk=pk, eventpart_id=new_id, assigned_at=now())
+            )
+        elif pk:
+            delete.append(pk)
+        else:
+            create.append(
+                EventPartAssignment(
+                    order_id=order_id,
+                    position_id=position_id,
+                    eventpart_id=new_id,
+                    type=type,
+                )
+            )
+        if eventpart:
+            changed.add(new_id)
+            gaining.add(new_id)
+
+    _lock_eventparts(gaining)
+
+    with scopes_disabled():
+        for start in range(0, len(delete), batch_size):
+            end = start + batch_size
+            EventPartAssignment.objects.filter(pk__in=delete[start:end]).delete()
+        EventPartAssignment.objects.bulk_update(
+            update, ["eventpart", "assigned_at"], batch_size=batch_size
+        )
+        EventPartAssignment.objects.bulk_create(create, batch_size=batch_size)
+    # The capacity check reads the counters, so they are brought up to date
+    # within the transaction first
+    update_occupancy(changed)
+    _check_capacity(gaining, orders=list(orders))
+
+    schedule_promotion(event, losing)
+    queue_ticket_regeneration(
+        event,
+        positions={position_id for order_id, position_id in touched if position_id},
+        orders={order_id for order_id, position_id in touched},
+    )
+    if len(orders) == 1:
+        order = next(iter(orders.values()))
+        clear_eventparts_for_order(order)
+        invalidate_order_info(order)
+        if changed:
+            invalidate_event_assignments(event)
+    elif changed:
+        eventparts_cache(event).clear()
+        for order in orders.values():
+            clear_eventparts_for_order(order)
+    return changed
+
+
+@transaction.atomic
+def sync_order_assignments(order):
+    """Brings the assignments of ``order`` in line with its positions after the
+    order has been changed.
+
+    Assignments of canceled positions or positions that no longer grant
+    admission are removed. New admission positions are assigned to the
+    eventpart of a type if all other positions share it and it has room
+    left, otherwise they stay unassigned.
+    """
+    with scopes_disabled():
+        rows = list(
+            EventPartAssignment.objects.filter(order=order).values_list(
+                "pk", "position_id", "type", "eventpart_id"
+            )
+        )
+        if not rows:
+            return
+        active = set(_admission_positions([order.pk])[order.pk])
+        stale = [
+            (pk, eventpart_id)
+            for pk, position_id, type, eventpart_id in rows
+            if position_id is not None and position_id not in active
+        ]
+        EventPartAssignment.objects.filter(pk__in=[pk for pk, e in stale]).delete()
+
+        parts_by_type = defaultdict(set)
+        for pk, position_id, type, eventpart_id in rows:
+            if (pk, eventpart_id) not in stale:
+                parts_by_type[type].add(eventpart_id)
+        eventparts = EventPart.objects.in_bulk(
+            [next(iter(ids)) for ids in parts_by_type.values() if len(ids) == 1]
+        )
+
+    for type, ids in parts_by_type.items():
+        if len(ids) == 1:
+            try:
+                set_assignments(order.event, {order: {type: eventparts[ids.pop()]}})
+            except CapacityExceeded:
+                pass
+
+    update_occupancy(eventpart_id for pk, eventpart_id in stale)
+    if stale:
+        queue_ticket_regeneration(order.event, orders=[order.pk])
+    clear_eventparts_for_order(order)
+    invalidate_order_info(order)
+    if stale:
+        invalidate_event_assignments(order.event)
+
+
+PROMOTION_DELAY = 10
+
+
+def schedule_promotion(event, eventpart_ids):
+    """Schedules :func:`promote_waiting_list` for ``event`` if one of
+    ``eventpart_ids`` has a waiting list.
+
+    Changes within :data:`PROMOTION_DELAY` seconds share one run.
+    """
+    from pretix_eventparts.tasks import promote_waiting_list_task
+
+    if not eventpart_ids:
+        return
+    with scopes_disabled():
+        if not EventPartWaitingListEntry.objects.filter(
+            eventpart_id__in=eventpart_ids
+        ).exists():
+            return
+    key = "pretix_eventparts:promotion_scheduled:{}".format(event.pk)
+    if cache.add(key, True, timeout=PROMOTION_DELAY):
+        transaction.on_commit(
+            lambda: promote_waiting_list_task.apply_async(
+                args=(event.pk,), countdown=PROMOTION_DELAY
+            )
+        )
+
+
+def schedule_waiting_list_promotions():
+    """Schedules :func:`promote_waiting_list` for every event with a waiting
+    list, to catch places that became free without an assignment change, e.g.
+    after a capacity was raised or a reservation expired."""
+    from pretix_eventparts.tasks import promote_waiting_list_task
+
+    with scopes_disabled():
+        events = (
+            EventPartWaitingListEntry.objects.order_by()
+            .values_list("eventpart__event", flat=True)
+            .distinct()
+        )
+        for event_id in events:
+            promote_waiting_list_task.apply_async(args=(event_id,))
+
+
+@transaction.atomic
+def promote_waiting_list(event):
+    """Assigns waiting orders to the eventparts of ``event`` that have free
+    places.
+
+    Entries are taken by priority and age. An entry is skipped if the
+    eventpart has no room for all admission positions of its order, so
+    smaller orders further down can still move up. Promoted orders leave
+    the eventpart of the same type they were assigned to before, and
+    their other entries for that type are removed.
+
+    The eventparts with a waiting list are locked first, so concurrent
+    runs and assignments are applied one after another. The entries are
+    selected with one query and all promotions are written with a single
+    call to :func:`set_assignments`.
+
+    Returns the number of promoted orders.
+    """
+    with scopes_disabled():
+        entries = EventPartWaitingListEntry.objects.filter(eventpart__event=event)
+        entries.exclude(order__status__in=ACTIVE_STATUSES).delete()
+        entries.filter(order__eventpart_assignments__eventpart=F("eventpart")).delete()
+
+        eventpart_ids = set(entries.values_list("eventpart_id", flat=True))
+        if not eventpart_ids:
+            return 0
+        _lock_eventparts(eventpart_ids)
+        eventparts = {
+            e.pk: e
+            for e in EventPart.objects.filter(pk__in=eventpart_ids)
+            .with_occupancy()
+            .with_reserved()
+        }
+        free = {
+            pk: e.places_left(e.occupancy + e.reserved) for pk, e in eventparts.items()
+        }
+
+        candidates = (
+            entries.filter(eventpart_id__in=[pk for pk, f in free.items() if f > 0])
+            .select_related("order")
+            .annotate(
+                seats=Count(
+                    "order__all_positions",
+                    filter=Q(
+                        order__all_positions__canceled=False,
+                        order__all_positions__item__admission=True,
+                    ),
+                )
+            )
+            .order_by("-priority", "created", "pk")
+        )
+
+        assignments = defaultdict(dict)
+        promoted = defaultdict(set)
+        for entry in candidates:
+            eventpart = eventparts[entry.eventpart_id]
+            if entry.order_id in promoted[eventpart.type]:
+                continue
+            if entry.seats > free[eventpart.pk]:
+                continue
+            free[eventpart.pk] -= entry.seats
+            assignments[entry.order][eventpart.type] = eventpart
+            promoted[eventpart.type].add(entry.order_id)
+        if not assignments:
+            return 0
+
+        set_assignments(event, assignments)
+        done = Q()
+        for type, order_ids in promoted.items():
+            if order_ids:
+                done |= Q(eventpart__type=type, order_id__in=order_ids)
+        entries.filter(done).delete()
+
+    event.log_action(
+        "pretix_eventparts.waitinglist.promoted",
+        data={"orders": len(assignments)},
+    )
+    return len(assignments)
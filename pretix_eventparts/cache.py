@@ -0,0 +1,46 @@
+from django.utils.translation import get_language
+from pretix.base.cache import NamespacedCache
+
+ORDER_INFO_TIMEOUT = 3600
+
+
+def eventparts_cache(event) -> NamespacedCache:
+    """Cache namespace for everything this plugin caches about an event.
+
+    Clearing it invalidates all entries at once, which is done whenever
+    an eventpart or the eventpart settings of the event change.
+    """
+    return NamespacedCache("pretix_eventparts:event:{}".format(event.pk))
+
+
+def order_info_cache_key(order, editable, language=None):
+    return "order_info:{}:{}:{}".format(
+        order.pk, language or get_language(), "edit" if editable else "view"
+    )
+
+
+def invalidate_order_info(order):
+    """Drops the cached order info fragments of ``order`` in all languages."""
+    eventparts_cache(order.event).delete_many(
+        [
+            order_info_cache_key(order, editable, language)
+            for language in order.event.settings.locales
+            for editable in (True, False)
+        ]
+    )
+
+
+def checkin_cache_key(checkinlist_id):
+    return "checkin:{}".format(checkinlist_id)
+
+
+def invalidate_event_assignments(event):
+    """Drops the aggregates computed over all assignments of ``event``, i.e.
+    the check-in data of its check-in lists and the dashboard fill levels."""
+    eventparts_cache(event).delete_many(
+        [
+            checkin_cache_key(pk)
+            for pk in event.checkin_lists.values_list("pk", flat=True)
+        ]
+        + ["dashboard"]
+    )
@@ -0,0 +1,78 @@
+from collections import defaultdict
+from django_scopes import scopes_disabled
+from pretix.base.models import OrderPosition
+
+from pretix_eventparts.cache import checkin_cache_key, eventparts_cache
+from pretix_eventparts.models import EventPart, EventPartAssignment
+
+CHECKIN_TIMEOUT = 3600
+
+
+def _compute(checkinlist):
+    with scopes_disabled():
+        eventpart_ids = set(
+            EventPart.checkin_lists.through.objects.filter(
+                checkinlist=checkinlist
+            ).values_list("eventpart_id", flat=True)
+        )
+        assignments = EventPartAssignment.objects.filter(
+            eventpart__event=checkinlist.event
+        )
+        if eventpart_ids:
+            # Only orders assigned to one of the eventparts of the list can
+            # have members, but all of their eventparts are listed
+            assignments = assignments.filter(
+                order__in=EventPartAssignment.objects.filter(
+                    eventpart__in=eventpart_ids
+                ).values("order")
+            )
+
+        by_order = defaultdict(dict)
+        by_position = defaultdict(dict)
+        for order_id, position_id, type, eventpart_id in assignments.order_by(
+            "position_id"
+        ).values_list("order_id", "position_id", "type", "eventpart_id"):
+            by_order[order_id].setdefault(type, eventpart_id)
+            if position_id:
+                by_position[position_id][type] = eventpart_id
+
+        positions = {}
+        for pk, order_id in OrderPosition.objects.filter(
+            order_id__in=list(by_order)
+        ).values_list("pk", "order_id"):
+            positions[pk] = {**by_order[order_id], **by_position.get(pk, {})}
+
+    members = None
+    if eventpart_ids:
+        members = frozenset(
+            pk
+            for pk, parts in positions.items()
+            if not eventpart_ids.isdisjoint(parts.values())
+        )
+    return {"positions": positions, "members": members}
+
+
+def checkin_data(checkinlist):
+    """Returns the eventparts of the assigned positions of ``checkinlist`` and
+    the positions admitted by its eventpart filter.
+
+    ``positions`` maps position ids to the ids of their eventparts keyed
+    by type, falling back to the eventparts of the order like
+    :func:`~pretix_eventparts.utils.eventparts_for_position`.
+    ``members`` is the set of ids of the positions assigned to one of
+    the eventparts of the list, or ``None`` if the list is not filtered
+    by eventpart. Both are computed with a few queries and cached per
+    list until an assignment or eventpart changes, so check-in never
+    needs to join the assignments per position.
+    """
+    return eventparts_cache(checkinlist.event).get_or_set(
+        checkin_cache_key(checkinlist.pk),
+        lambda: _compute(checkinlist),
+        timeout=CHECKIN_TIMEOUT,
+    )
+
+
+def checkin_list_members(checkinlist):
+    """Returns the ids of the positions admitted by the eventpart filter of
+    ``checkinlist``, or ``None`` if the list is not filtered by eventpart."""
+    return checkin_data(checkinlist)["members"]
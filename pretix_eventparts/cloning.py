@@ -0,0 +1,97 @@
+from django.db import transaction
+from django_scopes import scopes_disabled
+
+from pretix_eventparts.cache import eventparts_cache
+from pretix_eventparts.models import EventPart, EventPartTemplate
+
+COPIED_FIELDS = ("name", "description", "category", "type", "capacity")
+
+
+def _copy(obj, **kwargs):
+    return {**{f: getattr(obj, f) for f in COPIED_FIELDS}, **kwargs}
+
+
+@transaction.atomic
+def copy_eventparts(source, target, checkin_list_map=None):
+    """Copies all eventparts of ``source`` into ``target``, which must not have
+    any eventparts yet, e.g. because it has just been cloned from ``source``.
+
+    The eventparts are created with one query. Their check-in lists are
+    mapped with ``checkin_list_map``, a dict from the ids of the check-
+    in lists of ``source`` to the ones of ``target``; lists without a
+    counterpart are dropped.
+    """
+    with scopes_disabled():
+        eventparts = list(
+            EventPart.objects.filter(event=source)
+            .prefetch_related("checkin_lists")
+            .order_by("pk")
+        )
+        if not eventparts:
+            return []
+        copies = EventPart.objects.bulk_create(
+            [EventPart(**_copy(e, event=target)) for e in eventparts]
+        )
+        if copies[0].pk is None:
+            # Not every database returns the ids of bulk inserted rows
+            copies = list(EventPart.objects.filter(event=target).order_by("pk"))
+
+        checkin_list_map = checkin_list_map or {}
+        through = EventPart.checkin_lists.through
+        through.objects.bulk_create(
+            [
+                through(eventpart_id=copy.pk, checkinlist=checkin_list_map[cl.pk])
+                for original, copy in zip(eventparts, copies)
+                for cl in original.checkin_lists.all()
+                if cl.pk in checkin_list_map
+            ]
+        )
+    eventparts_cache(target).clear()
+    return copies
+
+
+def save_as_templates(event):
+    """Creates an organizer template for every eventpart of ``event`` that has
+    no template of the same name and type yet.
+
+    Returns the number of created templates.
+    """
+    with scopes_disabled():
+        existing = set(
+            EventPartTemplate.objects.filter(organizer=event.organizer).values_list(
+                "name", "type"
+            )
+        )
+        created = EventPartTemplate.objects.bulk_create(
+            [
+                EventPartTemplate(**_copy(e, organizer=event.organizer))
+                for e in EventPart.objects.filter(event=event).order_by("pk")
+                if (e.name, e.type) not in existing
+            ]
+        )
+    return len(created)
+
+
+@transaction.atomic
+def apply_templates(event, templates):
+    """Creates an eventpart in ``event`` for every template in ``templates``
+    that has no eventpart of the same name and type there yet, so a template
+    set can be applied repeatedly.
+
+    The eventparts are created with one query. Returns the number of
+    created eventparts.
+    """
+    with scopes_disabled():
+        existing = set(
+            EventPart.objects.filter(event=event).values_list("name", "type")
+        )
+        created = EventPart.objects.bulk_create(
+            [
+                EventPart(**_copy(t, event=event))
+                for t in templates
+                if (t.name, t.type) not in existing
+            ]
+        )
+    if created:
+        eventparts_cache(event).clear()
+    return len(created)
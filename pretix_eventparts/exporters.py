@@ -0,0 +1,95 @@
+from collections import OrderedDict
+from django import forms
+from django.db.models import OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils.translation import gettext as _, gettext_lazy
+from django_scopes import scope
+from pretix.base.exporter import ListExporter
+from pretix.base.models import Order, OrderPosition
+
+from pretix_eventparts.models import EventPart, EventPartAssignment, type_names
+
+
+class EventPartAssignmentExporter(ListExporter):
+    identifier = "eventparts"
+    verbose_name = gettext_lazy("Eventpart assignments")
+    chunk_size = 2000
+
+    @property
+    def additional_form_fields(self):
+        return OrderedDict(
+            [
+                (
+                    "paid_only",
+                    forms.BooleanField(
+                        label=gettext_lazy("Only paid orders"),
+                        initial=True,
+                        required=False,
+                    ),
+                ),
+            ]
+        )
+
+    def get_filename(self):
+        return "{}_eventparts".format(self.event.slug)
+
+    def iterate_list(self, form_data):
+        with scope(event=self.event):
+            eventparts = {e.pk: e for e in EventPart.objects.all()}
+        types = EventPart.EventPartTypes.values
+
+        with scope(event=self.event):
+            assignments = EventPartAssignment.objects.all()
+        # Positions without an assignment of their own show the ones of
+        # their order
+        qs = OrderPosition.objects.filter(order__event=self.event).annotate(
+            **{
+                "eventpart_{}".format(t): Coalesce(
+                    Subquery(
+                        assignments.filter(position_id=OuterRef("pk"), type=t).values(
+                            "eventpart_id"
+                        )[:1]
+                    ),
+                    Subquery(
+                        assignments.filter(order_id=OuterRef("order_id"), type=t)
+                        .order_by("position_id")
+                        .values("eventpart_id")[:1]
+                    ),
+                )
+                for t in types
+            }
+        )
+        if form_data.get("paid_only", True):
+            qs = qs.filter(order__status=Order.STATUS_PAID)
+
+        names = type_names(self.event)
+        yield [
+            _("Order code"),
+            _("Position ID"),
+            _("Order status"),
+            _("Email"),
+            _("Attendee name"),
+            _("Product"),
+        ] + [str(name) for name in names.values()]
+
+        yield self.ProgressSetTotal(total=qs.count())
+        rows = qs.order_by("order__code", "positionid").values_list(
+            "order__code",
+            "positionid",
+            "order__status",
+            "order__email",
+            "attendee_name_cached",
+            "item__name",
+            *["eventpart_{}".format(t) for t in types],
+        )
+        statuses = dict(Order.STATUS_CHOICE)
+        for row in rows.iterator(chunk_size=self.chunk_size):
+            code, positionid, status, email, attendee_name, item_name = row[:6]
+            yield [
+                code,
+                positionid,
+                str(statuses.get(status, status)),
+                email or "",
+                attendee_name or "",
+                str(item_name),
+            ] + [eventparts[pk].name if pk in eventparts else "" for pk in row[6:]]
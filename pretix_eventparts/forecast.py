@@ -0,0 +1,179 @@
+from collections import defaultdict
+from datetime import timedelta
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils.timezone import now
+from django_scopes import scopes_disabled
+from pretix.base.models import Organizer
+
+from pretix_eventparts.models import (
+    ACTIVE_STATUSES,
+    EventPart,
+    EventPartAssignment,
+    EventPartForecast,
+)
+
+# Number of days the current assignment velocity is measured over
+FORECAST_WINDOW = 14
+SNAPSHOT_MAX_AGE = timedelta(hours=1)
+
+
+def _extract(organizer, since):
+    """Loads the eventparts of all upcoming events of ``organizer`` and their
+    assigned places per day with one query each."""
+    with scopes_disabled():
+        eventparts = list(
+            EventPart.objects.filter(
+                event__organizer=organizer, event__date_from__gte=since
+            )
+            .order_by("event__date_from", "event_id", "type", "category", "name")
+            .values(
+                "pk",
+                "name",
+                "category",
+                "type",
+                "capacity",
+                "event_id",
+                "event__slug",
+                "event__name",
+                "event__date_from",
+            )
+        )
+        days = (
+            EventPartAssignment.objects.filter(
+                eventpart__event__organizer=organizer,
+                eventpart__event__date_from__gte=since,
+                position__isnull=False,
+                order__status__in=ACTIVE_STATUSES,
+            )
+            .annotate(day=TruncDate("assigned_at"))
+            .order_by()
+            .values_list("eventpart_id", "day")
+            .annotate(places=Count("pk"))
+        )
+        return eventparts, list(days)
+
+
+def _project(row, today):
+    days_left = max((row["event_date"] - today).days, 0)
+    row["forecast"] = row["occupancy"] + round(row["velocity"] * days_left)
+    if not row["capacity"]:
+        # Eventparts without a limit never fill up
+        row["days_until_full"] = None
+        row["overflow"] = False
+        return row
+    free = row["capacity"] - row["occupancy"]
+    if free <= 0:
+        row["days_until_full"] = 0
+    elif row["velocity"] > 0:
+        row["days_until_full"] = round(free / row["velocity"], 1)
+    else:
+        row["days_until_full"] = None
+    row["overflow"] = row["forecast"] > row["capacity"]
+    return row
+
+
+def compute_forecast(organizer, at=None):
+    """Forecasts the occupancy of the eventparts of all upcoming events of
+    ``organizer``.
+
+    The velocity of an eventpart is the average number of places
+    assigned per day over the last :data:`FORECAST_WINDOW` days. It is
+    extrapolated to the start of the event and compared to the
+    capacity. Categories of an event are summed up the same way.
+
+    Both aggregations run in one pass over a single extract of the
+    assigned places per eventpart and day. Returns a JSON serializable
+    dict.
+    """
+    at = at or now()
+    today = at.date()
+    window_start = today - timedelta(days=FORECAST_WINDOW)
+    eventparts, days = _extract(organizer, at)
+
+    occupancy = defaultdict(int)
+    recent = defaultdict(int)
+    for eventpart_id, day, places in days:
+        occupancy[eventpart_id] += places
+        if day > window_start:
+            recent[eventpart_id] += places
+
+    rows = []
+    categories = {}
+    unlimited = set()
+    for e in eventparts:
+        row = {
+            "eventpart": e["pk"],
+            "name": e["name"],
+            "category": e["category"],
+            "type": e["type"],
+            "capacity": e["capacity"],
+            "event": e["event_id"],
+            "event_slug": e["event__slug"],
+            "event_name": str(e["event__name"]),
+            "event_date": e["event__date_from"].date(),
+            "occupancy": occupancy[e["pk"]],
+            "velocity": recent[e["pk"]] / FORECAST_WINDOW,
+        }
+        rows.append(row)
+
+        key = (e["event_id"], e["type"], e["category"])
+        if key not in categories:
+            categories[key] = {
+                k: row[k]
+                for k in ("category", "type", "event", "event_slug", "event_name")
+            }
+            categories[key].update(
+                event_date=row["event_date"], capacity=0, occupancy=0, velocity=0
+            )
+        for k in ("capacity", "occupancy", "velocity"):
+            categories[key][k] += row[k]
+        if not row["capacity"]:
+            unlimited.add(key)
+    for key in unlimited:
+        categories[key]["capacity"] = 0
+
+    def serialize(rows):
+        rows = [_project(row, today) for row in rows]
+        for row in rows:
+            row["event_date"] = row["event_date"].isoformat()
+            row["velocity"] = round(row["velocity"], 2)
+        return rows
+
+    return {
+        "created": at.isoformat(),
+        "window": FORECAST_WINDOW,
+        "eventparts": serialize(rows),
+        "categories": serialize(categories.values()),
+    }
+
+
+def refresh_forecast(organizer):
+    """Computes the forecast of ``organizer`` and stores it as its snapshot."""
+    data = compute_forecast(organizer)
+    with scopes_disabled():
+        snapshot, created = EventPartForecast.objects.update_or_create(
+            organizer=organizer, defaults={"data": data}
+        )
+    return snapshot
+
+
+def schedule_forecast_refreshes():
+    """Refreshes the snapshots of organizers with upcoming eventparts that are
+    older than :data:`SNAPSHOT_MAX_AGE` in the background."""
+    from pretix_eventparts.tasks import refresh_eventpart_forecast
+
+    with scopes_disabled():
+        organizers = (
+            Organizer.objects.filter(
+                events__date_from__gte=now(), events__eventparts__isnull=False
+            )
+            .exclude(eventpart_forecast__updated__gte=now() - SNAPSHOT_MAX_AGE)
+            .order_by()
+            .values_list("pk", flat=True)
+            .distinct()
+        )
+        for organizer_id in organizers:
+            refresh_eventpart_forecast.apply_async(
+                kwargs={"organizer": organizer_id, "user": None}
+            )
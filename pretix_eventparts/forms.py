@@ -1,49 +1,387 @@
 from django import forms
+from django.conf import settings
+from django.forms.models import ModelChoiceIterator
 from django.utils.translation import gettext_lazy as _
-from django_scopes import scope
-from django_scopes.forms import SafeModelChoiceField
+from django_scopes import scope, scopes_disabled
+from django_scopes.forms import SafeModelChoiceField, SafeModelMultipleChoiceField
 from i18nfield.forms import I18nFormField, I18nTextarea, I18nTextInput, LazyI18nString
-from pretix.base.forms import I18nModelForm, SettingsForm
+from pretix.base.email import get_available_placeholders
+from pretix.base.forms import I18nModelForm, PlaceholderValidator, SettingsForm
+from pretix.base.models import Event, Order
 
-from pretix_eventparts.models import EventPart
+from pretix_eventparts.cache import eventparts_cache
+from pretix_eventparts.importers import AssignmentImportError, read_rows, type_columns
+from pretix_eventparts.models import EventPart, EventPartTemplate, type_names
 
 
 class EventPartForm(I18nModelForm):
     class Meta:
         model = EventPart
         localized_fields = "__all__"
-        fields = ["name", "description", "category", "type", "capacity"]
-        widgets = {"description": I18nTextarea}
+        fields = [
+            "name",
+            "description",
+            "category",
+            "type",
+            "capacity",
+            "checkin_lists",
+        ]
+        widgets = {
+            "description": I18nTextarea,
+            "checkin_lists": forms.CheckboxSelectMultiple,
+        }
+        field_classes = {"checkin_lists": SafeModelMultipleChoiceField}
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.fields["type"].choices = self.instance.choices
+        self.fields["checkin_lists"].queryset = self.instance.event.checkin_lists.all()
+
+    def clean_type(self):
+        # Assignments store the type of their eventpart, so it is fixed once
+        # orders have been assigned
+        type = self.cleaned_data["type"]
+        if type != self.instance.type and self.instance.has_assignments():
+            raise forms.ValidationError(
+                _(
+                    "The type cannot be changed while orders are assigned to "
+                    "this eventpart."
+                )
+            )
+        return type
+
+    def _save_m2m(self):
+        super()._save_m2m()
+        eventparts_cache(self.instance.event).clear()
+
+
+class PreloadedChoiceIterator(ModelChoiceIterator):
+    def __iter__(self):
+        if self.field.empty_label is not None:
+            yield ("", self.field.empty_label)
+        for obj in self.field.objects:
+            yield self.choice(obj)
+
+    def __len__(self):
+        return len(self.field.objects) + (self.field.empty_label is not None)
+
+
+class PreloadedModelChoiceField(forms.ModelChoiceField):
+    """A model choice field offering a list of objects that has been loaded
+    before, so rendering and validating it does not query the database."""
+
+    iterator = PreloadedChoiceIterator
+
+    def __init__(self, **kwargs):
+        self.objects = []
+        super().__init__(queryset=None, **kwargs)
+
+    def set_objects(self, objects):
+        self.objects = list(objects)
+        self.widget.choices = self.choices
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        for obj in self.objects:
+            if str(obj.pk) == str(value):
+                return obj
+        raise forms.ValidationError(
+            self.error_messages["invalid_choice"], code="invalid_choice"
+        )
 
 
 class AssignEventPartForm(forms.Form):
-    class Meta:
-        field_classes = {
-            "eventpart_start": SafeModelChoiceField,
-            "eventpart_middle": SafeModelChoiceField,
-            "eventpart_end": SafeModelChoiceField,
+    eventpart_start = PreloadedModelChoiceField(required=False)
+    eventpart_middle = PreloadedModelChoiceField(required=False)
+    eventpart_end = PreloadedModelChoiceField(required=False)
+
+    def __init__(self, event, eventparts=None, **kwargs):
+        """``eventparts`` optionally passes the eventparts of ``event``, so
+        forms for many orders can share them."""
+        super().__init__(**kwargs)
+        if eventparts is None:
+            with scope(event=event):
+                eventparts = list(event.eventparts.order_by("name", "pk"))
+        for type in EventPart.EventPartTypes.values:
+            self.fields["eventpart_" + type].set_objects(
+                e for e in eventparts if e.type == type
+            )
+
+
+class EventPartSelectionForm(forms.Form):
+    """Lets a customer pick one eventpart per type.
+
+    Only eventparts with enough places left for all of the order's
+    ``seats`` are offered, next to the ones currently assigned. Leaving
+    a field empty keeps the current assignment.
+    """
+
+    def __init__(self, event, eventparts, current, available, seats, **kwargs):
+        super().__init__(**kwargs)
+        self.current = current
+        self.eventparts = {e.pk: e for e in eventparts}
+        names = type_names(event)
+        for type in EventPart.EventPartTypes.values:
+            choices = []
+            for e in eventparts:
+                if e.type != type:
+                    continue
+                left = available.get(e.pk, 0)
+                if e == current.get(type):
+                    choices.append((e.pk, _("{name} (current)").format(name=e.name)))
+                elif left is None:
+                    choices.append((e.pk, e.name))
+                elif left >= seats:
+                    choices.append(
+                        (
+                            e.pk,
+                            _("{name} ({count} places left)").format(
+                                name=e.name, count=left
+                            ),
+                        )
+                    )
+            if not choices:
+                continue
+            self.fields[type] = forms.TypedChoiceField(
+                label=names[type],
+                choices=[("", "---------")] + choices,
+                coerce=int,
+                empty_value=None,
+                required=False,
+                initial=current[type].pk if current.get(type) else None,
+            )
+
+    def changes(self):
+        """Returns the newly chosen eventparts keyed by their type."""
+        return {
+            type: self.eventparts[pk]
+            for type, pk in self.cleaned_data.items()
+            if pk is not None and self.eventparts[pk] != self.current.get(type)
         }
 
+
+class AutoAssignForm(forms.Form):
+    balance_categories = forms.BooleanField(
+        label=_("Balance orders across categories"),
+        help_text=_(
+            "If enabled, each order is placed in the category with the lowest "
+            "fill level instead of filling up the eventparts one after another."
+        ),
+        required=False,
+    )
+    dry_run = forms.BooleanField(
+        label=_("Preview only"),
+        help_text=_("Show the resulting distribution without assigning any orders."),
+        required=False,
+        initial=True,
+    )
+
+
+class AssignmentUploadForm(forms.Form):
+    file = forms.FileField(
+        label=_("File"),
+        help_text=_(
+            'A CSV or XLSX file with an "order" column, an optional "position" '
+            "column with the position ID and one column per eventpart type."
+        ),
+    )
+
+    def __init__(self, event, **kwargs):
+        self.event = event
+        super().__init__(**kwargs)
+
+    def clean_file(self):
+        file = self.cleaned_data["file"]
+        if not file.name.lower().endswith((".csv", ".xlsx")):
+            raise forms.ValidationError(_("Please only upload CSV or XLSX files."))
+        if file.size > settings.FILE_UPLOAD_MAX_SIZE_OTHER:
+            raise forms.ValidationError(
+                _("Please do not upload files larger than 10 MB.")
+            )
+        try:
+            header, rows = read_rows(file, file.name)
+            if not type_columns(self.event, header):
+                raise AssignmentImportError(
+                    _("The file does not contain a column for any eventpart type.")
+                )
+        except AssignmentImportError as e:
+            raise forms.ValidationError(str(e))
+        file.seek(0)
+        return file
+
+
+class AssignmentImportForm(forms.Form):
+    match_by = forms.ChoiceField(
+        label=_("Eventparts are identified by"),
+        choices=(("name", _("Name")), ("id", _("ID"))),
+        initial="name",
+    )
+
+
+class ParticipantMailForm(forms.Form):
+    eventparts = SafeModelMultipleChoiceField(
+        label=_("Participants of these eventparts"),
+        queryset=EventPart.objects.none(),
+        widget=forms.CheckboxSelectMultiple,
+        required=False,
+    )
+    categories = forms.MultipleChoiceField(
+        label=_("Participants of eventparts in these categories"),
+        widget=forms.CheckboxSelectMultiple,
+        required=False,
+    )
+
+    def __init__(self, event, **kwargs):
+        self.event = event
+        super().__init__(**kwargs)
+        with scope(event=event):
+            self.fields["eventparts"].queryset = EventPart.objects.filter(
+                event=event
+            ).order_by("type", "name")
+            self.fields["categories"].choices = [
+                (c, c)
+                for c in EventPart.objects.filter(event=event)
+                .exclude(category="")
+                .order_by("category")
+                .values_list("category", flat=True)
+                .distinct()
+            ]
+
+        placeholders = [
+            "{%s}" % p for p in sorted(get_available_placeholders(event, ["event"]))
+        ]
+        for fn, label, widget in (
+            ("subject", _("Subject"), I18nTextInput),
+            ("message", _("Message"), I18nTextarea),
+        ):
+            self.fields[fn] = I18nFormField(
+                label=label,
+                widget=widget,
+                locales=event.settings.get("locales"),
+                help_text=_("Available placeholders: {list}").format(
+                    list=", ".join(placeholders)
+                ),
+                validators=[PlaceholderValidator(placeholders)],
+            )
+
+    def clean(self):
+        data = super().clean()
+        eventpart_ids = {e.pk for e in data.get("eventparts", ())}
+        if data.get("categories"):
+            with scope(event=self.event):
+                eventpart_ids.update(
+                    EventPart.objects.filter(
+                        event=self.event, category__in=data["categories"]
+                    ).values_list("pk", flat=True)
+                )
+        if not eventpart_ids:
+            raise forms.ValidationError(
+                _("Please select at least one eventpart or category.")
+            )
+        data["eventpart_ids"] = sorted(eventpart_ids)
+        return data
+
+
+class WaitingListEntryForm(forms.Form):
+    order = forms.CharField(label=_("Order code"))
+    priority = forms.IntegerField(
+        label=_("Priority"),
+        initial=0,
+        help_text=_("Entries with a higher priority are promoted first."),
+    )
+
+    def __init__(self, eventpart, **kwargs):
+        self.eventpart = eventpart
+        super().__init__(**kwargs)
+
+    def clean_order(self):
+        event = self.eventpart.event
+        code = self.cleaned_data["order"].strip().upper()
+        with scope(organizer=event.organizer, event=event):
+            try:
+                order = event.orders.get(code=code)
+            except Order.DoesNotExist:
+                raise forms.ValidationError(_("No order with this code exists."))
+            if self.eventpart.waiting_list.filter(order=order).exists():
+                raise forms.ValidationError(
+                    _("This order is already on the waiting list.")
+                )
+        return order
+
+
+class EventPartOrderFilterForm(forms.Form):
+    eventpart = SafeModelChoiceField(
+        queryset=EventPart.objects.none(),
+        label=_("Eventpart"),
+        required=False,
+    )
+
     def __init__(self, event, **kwargs):
         super().__init__(**kwargs)
         with scope(event=event):
-            self.fields["eventpart_start"].queryset = EventPart.objects.filter(
-                type=EventPart.EventPartTypes.START
-            ).all()
-            self.fields["eventpart_middle"].queryset = EventPart.objects.filter(
-                type=EventPart.EventPartTypes.MIDDLE
-            ).all()
-            self.fields["eventpart_end"].queryset = EventPart.objects.filter(
-                type=EventPart.EventPartTypes.END
-            ).all()
+            self.fields["eventpart"].queryset = event.eventparts.order_by(
+                "type", "name"
+            )
+
+    def filter_qs(self, qs):
+        eventpart = self.cleaned_data.get("eventpart")
+        if eventpart:
+            with scopes_disabled():
+                qs = qs.filter(pk__in=eventpart.assignments.values("order_id"))
+        return qs
 
-    eventpart_start = forms.ModelChoiceField(required=False, queryset=None)
-    eventpart_middle = forms.ModelChoiceField(required=False, queryset=None)
-    eventpart_end = forms.ModelChoiceField(required=False, queryset=None)
+    def filter_to_strings(self):
+        eventpart = self.cleaned_data.get("eventpart")
+        if eventpart:
+            return [_("Eventpart: {eventpart}").format(eventpart=eventpart.name)]
+        return []
+
+
+def _template_events(organizer, request):
+    return (
+        request.user.get_events_with_permission("can_change_items", request)
+        .filter(organizer=organizer, plugins__contains="pretix_eventparts")
+        .order_by("-date_from")
+    )
+
+
+class SaveTemplatesForm(forms.Form):
+    event = SafeModelChoiceField(
+        queryset=Event.objects.none(),
+        label=_("Event"),
+        help_text=_(
+            "Every eventpart of this event is saved as a template, unless a "
+            "template of the same name and type exists already."
+        ),
+    )
+
+    def __init__(self, organizer, request, **kwargs):
+        super().__init__(**kwargs)
+        self.fields["event"].queryset = _template_events(organizer, request)
+
+
+class ApplyTemplatesForm(forms.Form):
+    templates = SafeModelMultipleChoiceField(
+        queryset=EventPartTemplate.objects.none(),
+        label=_("Templates"),
+        widget=forms.CheckboxSelectMultiple,
+    )
+    events = SafeModelMultipleChoiceField(
+        queryset=Event.objects.none(),
+        label=_("Events"),
+        widget=forms.CheckboxSelectMultiple,
+        help_text=_(
+            "Templates are skipped in events that already contain an eventpart "
+            "of the same name and type."
+        ),
+    )
+
+    def __init__(self, organizer, request, **kwargs):
+        super().__init__(**kwargs)
+        self.fields["templates"].queryset = organizer.eventpart_templates.all()
+        self.fields["templates"].initial = list(self.fields["templates"].queryset)
+        self.fields["events"].queryset = _template_events(organizer, request)
 
 
 class EventpartSettingsForm(SettingsForm):
@@ -52,6 +390,24 @@ class EventpartSettingsForm(SettingsForm):
         required=False,
         initial=False,
     )
+    eventparts__selfservice = forms.BooleanField(
+        label=_("Let customers choose their eventparts"),
+        help_text=_(
+            "Customers can pick eventparts with free places from their order view."
+        ),
+        required=False,
+        initial=False,
+    )
+    eventparts__selfservice_reservation_time = forms.IntegerField(
+        label=_("Reservation period"),
+        help_text=_(
+            "The number of minutes places are held for a customer until they "
+            "confirm their choice."
+        ),
+        min_value=1,
+        required=True,
+        initial=10,
+    )
     eventparts__public_name = I18nFormField(
         label=_("Customer facing name of the eventparts section"),
         required=True,
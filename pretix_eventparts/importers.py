@@ -0,0 +1,277 @@
+import codecs
+import csv
+import io
+from collections import defaultdict
+from django.utils.translation import gettext as _
+from django_scopes import scopes_disabled
+from itertools import chain, islice
+from openpyxl import load_workbook
+from pretix.base.models import Order, OrderPosition
+
+from pretix_eventparts.assignments import CapacityExceeded, set_assignments
+from pretix_eventparts.models import EventPart, type_names
+
+# Number of bytes the encoding of a CSV file is guessed from
+CSV_SAMPLE_SIZE = 64 * 1024
+
+
+class AssignmentImportError(Exception):
+    pass
+
+
+def _csv_reader(file):
+    # Decodes the file line by line instead of reading it at once like
+    # pretix' parse_csv, with the encoding guessed from its beginning
+    file.seek(0)
+    sample = file.read(CSV_SAMPLE_SIZE)
+    file.seek(0)
+    try:
+        import chardet
+
+        charset = chardet.detect(sample)["encoding"]
+    except ImportError:
+        charset = getattr(file, "charset", None)
+    try:
+        decoder = codecs.getreader(charset or "utf-8")
+    except LookupError:
+        decoder = codecs.getreader("utf-8")
+    lines = decoder(file, errors="replace")
+
+    first = lines.readline()
+    try:
+        dialect = csv.Sniffer().sniff(first, delimiters=";,.#:")
+    except csv.Error:
+        return None
+    return csv.DictReader(chain([first], lines), dialect=dialect)
+
+
+def read_rows(file, filename):
+    """Reads an uploaded CSV or XLSX file.
+
+    Returns the list of column names, lower cased, and an iterator over
+    ``(line, row)`` tuples with every row as a dict of stripped strings.
+    The rows are read from the file as they are consumed. Raises
+    :class:`AssignmentImportError` if the file cannot be read.
+    """
+    if filename.lower().endswith(".xlsx"):
+        try:
+            sheet = load_workbook(file, read_only=True, data_only=True).worksheets[0]
+        except Exception:
+            raise AssignmentImportError(_("The file is not a valid XLSX file."))
+        rows = sheet.iter_rows(values_only=True)
+        header = [str(c or "").strip().lower() for c in next(rows, ())]
+        records = (
+            (line, dict(zip(header, values)))
+            for line, values in enumerate(rows, start=2)
+        )
+    else:
+        reader = _csv_reader(file)
+        if reader is None or not reader.fieldnames:
+            raise AssignmentImportError(_("The file is not a valid CSV file."))
+        header = [str(c or "").strip().lower() for c in reader.fieldnames]
+        records = (
+            (line, dict(zip(header, record.values())))
+            for line, record in enumerate(reader, start=2)
+        )
+
+    if "order" not in header:
+        raise AssignmentImportError(_('The file does not contain an "order" column.'))
+
+    def clean():
+        for line, record in records:
+            record = {
+                k: str(v).strip() if v is not None else ""
+                for k, v in record.items()
+                if k
+            }
+            if any(record.values()):
+                yield line, record
+
+    return header, clean()
+
+
+def count_rows(file, filename):
+    """Returns the number of data rows of an uploaded CSV or XLSX file without
+    parsing them, for progress reporting.
+
+    CSV rows spanning several lines are counted once per line.
+    """
+    file.seek(0)
+    if filename.lower().endswith(".xlsx"):
+        try:
+            sheet = load_workbook(file, read_only=True).worksheets[0]
+        except Exception:
+            return 0
+        count = (sheet.max_row or 1) - 1
+    else:
+        count = sum(1 for line in file) - 1
+    file.seek(0)
+    return max(count, 0)
+
+
+def type_columns(event, header):
+    """Maps the columns of ``header`` that name an eventpart type, either by
+    its key or its public name, to the type."""
+    names = {}
+    for type, name in type_names(event).items():
+        names[type] = type
+        names[str(name).strip().lower()] = type
+    return {column: names[column] for column in header if column in names}
+
+
+def _eventpart_lookup(event, match_by):
+    lookup = defaultdict(list)
+    with scopes_disabled():
+        for eventpart in EventPart.objects.filter(event=event):
+            key = str(eventpart.pk) if match_by == "id" else eventpart.name.lower()
+            lookup[eventpart.type, key].append(eventpart)
+    return lookup
+
+
+def _position_id(value):
+    # Spreadsheets tend to store position IDs as numbers such as "2.0"
+    try:
+        number = float(value)
+    except ValueError:
+        return None
+    if not number.is_integer() or number < 1:
+        return None
+    return int(number)
+
+
+def _resolve(chunk, event):
+    codes = {record["order"].upper() for line, record in chunk}
+    with scopes_disabled():
+        orders = {
+            o.code: o
+            for o in Order.objects.filter(event=event, code__in=codes).only(
+                "id", "code", "event_id"
+            )
+        }
+        positions = {}
+        position_ids = {
+            _position_id(record["position"])
+            for line, record in chunk
+            if record.get("position")
+        } - {None}
+        if position_ids:
+            # Only admission positions take up a place in an eventpart
+            for p in OrderPosition.objects.filter(
+                order__in=orders.values(),
+                positionid__in=position_ids,
+                item__admission=True,
+            ).select_related("order"):
+                positions[p.order.code, p.positionid] = p
+    return orders, positions
+
+
+def import_assignments(
+    event, header, rows, match_by="name", chunk_size=1000, progress=None, total=None
+):
+    """Applies the assignments in ``rows`` as read by :func:`read_rows`.
+
+    Every row names an order, optionally a position of it, and an
+    eventpart for some of the types; empty cells leave the assignment
+    of that type untouched, but a row must name at least one. The rows
+    are read and processed in chunks, so the file is never loaded at
+    once: the orders and positions of a chunk are resolved with one
+    query each and its assignments are written with a single call to
+    :func:`set_assignments`. If that exceeds the capacity of an
+    eventpart, the orders of the chunk are retried one by one to find
+    the rows that do not fit.
+
+    ``progress`` is called with the completed percentage after every
+    chunk if the ``total`` number of rows is known, e.g. from
+    :func:`count_rows`.
+
+    Returns the number of imported rows and a list of
+    ``(line, order, position, message)`` tuples for the failed ones.
+    """
+    columns = type_columns(event, header)
+    if not columns:
+        raise AssignmentImportError(
+            _("The file does not contain a column for any eventpart type.")
+        )
+    lookup = _eventpart_lookup(event, match_by)
+    rows = iter(rows)
+    done = 0
+    imported = 0
+    errors = []
+
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+        done += len(chunk)
+        orders, positions = _resolve(chunk, event)
+
+        assignments = {}
+        lines = defaultdict(list)
+        for line, record in chunk:
+            code = record["order"].upper()
+            position = record.get("position", "")
+
+            def fail(message):
+                errors.append((line, code, position, message))
+
+            if code not in orders:
+                fail(_("No order with this code exists."))
+                continue
+            key = orders[code]
+            if position:
+                positionid = _position_id(position)
+                if positionid is None:
+                    fail(_("The position ID is not a number."))
+                    continue
+                key = positions.get((code, positionid))
+                if key is None:
+                    fail(_("The order has no admission position with this ID."))
+                    continue
+
+            parts = {}
+            for column, type in columns.items():
+                value = record.get(column, "")
+                if not value:
+                    continue
+                found = lookup.get((type, value.lower()), [])
+                if len(found) != 1:
+                    fail(
+                        _(
+                            'No unique eventpart "{value}" exists for "{column}".'
+                        ).format(value=value, column=column)
+                    )
+                    break
+                parts[type] = found[0]
+            else:
+                if not parts:
+                    fail(_("The row does not name an eventpart."))
+                    continue
+                assignments.setdefault(key, {}).update(parts)
+                lines[key].append((line, code, position))
+
+        try:
+            set_assignments(event, assignments)
+            imported += sum(len(v) for v in lines.values())
+        except CapacityExceeded:
+            for key, parts in assignments.items():
+                try:
+                    set_assignments(event, {key: parts})
+                    imported += len(lines[key])
+                except CapacityExceeded as e:
+                    errors.extend(row + (str(e),) for row in lines[key])
+
+        if progress and total:
+            progress(min(round(100 * done / total), 100))
+
+    return imported, sorted(errors)
+
+
+def error_report(errors):
+    """Renders the failed rows returned by :func:`import_assignments` as
+    CSV."""
+    output = io.StringIO()
+    writer = csv.writer(output, quoting=csv.QUOTE_NONNUMERIC, delimiter=",")
+    writer.writerow([_("Line"), _("Order code"), _("Position ID"), _("Error")])
+    for row in errors:
+        writer.writerow(row)
+    return output.getvalue().encode("utf-8")
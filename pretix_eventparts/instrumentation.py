@@ -0,0 +1,93 @@
+import functools
+import json
+import logging
+import time
+from django.conf import settings
+from django.db import connection
+from pretix.base.metrics import Counter, Histogram
+
+logger = logging.getLogger(__name__)
+
+ENABLED = settings.CONFIG_FILE.getboolean(
+    "pretix_eventparts", "instrumentation", fallback=False
+)
+
+receiver_duration_seconds = Histogram(
+    "pretix_eventparts_receiver_duration_seconds",
+    "Wall time of eventparts signal receivers.",
+    ["receiver"],
+)
+receiver_db_seconds_total = Counter(
+    "pretix_eventparts_receiver_db_seconds_total",
+    "Time spent in database queries by eventparts signal receivers.",
+    ["receiver"],
+)
+receiver_queries_total = Counter(
+    "pretix_eventparts_receiver_queries_total",
+    "Database queries run by eventparts signal receivers.",
+    ["receiver"],
+)
+
+
+class QueryStats:
+    """Counts the queries run on the default connection and the time spent in
+    them, to be installed with ``connection.execute_wrapper``."""
+
+    def __init__(self):
+        self.queries = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.duration += time.perf_counter() - start
+
+
+def record(name, duration, stats):
+    logger.info(
+        json.dumps(
+            {
+                "receiver": name,
+                "duration": round(duration, 6),
+                "queries": stats.queries,
+                "db_duration": round(stats.duration, 6),
+            },
+            sort_keys=True,
+        )
+    )
+    if settings.METRICS_ENABLED:
+        receiver_duration_seconds.observe(duration, receiver=name)
+        receiver_db_seconds_total.inc(stats.duration, receiver=name)
+        receiver_queries_total.inc(stats.queries, receiver=name)
+
+
+def instrumented(name):
+    """Decorates a signal receiver to record its wall time, number of queries
+    and database time per call.
+
+    The numbers are logged as JSON to the
+    ``pretix_eventparts.instrumentation`` logger and, if pretix' metrics
+    are enabled, exported through its ``/metrics`` endpoint. Nothing is
+    recorded unless ``instrumentation`` is switched on in the
+    ``[pretix_eventparts]`` section of pretix.cfg.
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not ENABLED:
+                return func(*args, **kwargs)
+            stats = QueryStats()
+            start = time.perf_counter()
+            try:
+                with connection.execute_wrapper(stats):
+                    return func(*args, **kwargs)
+            finally:
+                record(name, time.perf_counter() - start, stats)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,44 @@
+from django.db.models.functions import Lower
+from django_scopes import scopes_disabled
+from pretix.base.models import Order
+
+from pretix_eventparts.models import EventPartAssignment
+
+
+def participant_recipients(eventpart_ids, chunk_size=2000):
+    """Yields ``(email, locale)`` for every distinct email address of the paid
+    or pending orders assigned to one of ``eventpart_ids``.
+
+    The addresses are streamed from the database ordered by their lower
+    cased form, so duplicates are adjacent and can be dropped without
+    keeping the addresses seen so far in memory.
+    """
+    with scopes_disabled():
+        rows = (
+            EventPartAssignment.objects.filter(
+                eventpart_id__in=eventpart_ids,
+                order__status__in=(Order.STATUS_PAID, Order.STATUS_PENDING),
+                order__email__isnull=False,
+            )
+            .exclude(order__email="")
+            .annotate(email=Lower("order__email"))
+            .order_by("email")
+            .values_list("email", "order__locale")
+            .iterator(chunk_size=chunk_size)
+        )
+        last = None
+        for email, locale in rows:
+            if email != last:
+                last = email
+                yield email, locale
+
+
+def batches(recipients, batch_size):
+    batch = []
+    for recipient in recipients:
+        batch.append(recipient)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+from django_scopes import scopes_disabled
+
+from pretix_eventparts.models import EventPart
+from pretix_eventparts.occupancy import rebuild_occupancy
+
+
+class Command(BaseCommand):
+    help = "Rebuild the occupancy counters of all eventparts and report drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=500,
+            help="Number of eventparts recomputed per transaction",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        drifted = 0
+        with scopes_disabled():
+            eventparts = EventPart.objects.select_related(
+                "event", "event__organizer"
+            ).order_by("pk")
+            total = 0
+            last_pk = 0
+            while True:
+                batch = {
+                    e.pk: e for e in eventparts.filter(pk__gt=last_pk)[:batch_size]
+                }
+                if not batch:
+                    break
+                total += len(batch)
+                last_pk = max(batch)
+                for pk, fields in rebuild_occupancy(batch.values()).items():
+                    drifted += 1
+                    eventpart = batch[pk]
+                    self.stdout.write(
+                        "{}/{} {} (#{}): {}".format(
+                            eventpart.event.organizer.slug,
+                            eventpart.event.slug,
+                            eventpart.name,
+                            pk,
+                            ", ".join(
+                                "{} {} -> {}".format(f, stored, actual)
+                                for f, (stored, actual) in sorted(fields.items())
+                            ),
+                        )
+                    )
+
+        self.stdout.write(
+            "Rebuilt {} occupancy counters, {} had drifted.".format(total, drifted)
+        )
@@ -0,0 +1,38 @@
+# Generated by Django 3.2.8 on 2026-10-18 10:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pretix_eventparts", "0009_alter_eventpart_name"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EventPartOccupancy",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True, primary_key=True, serialize=False
+                    ),
+                ),
+                ("pending", models.PositiveIntegerField(default=0)),
+                ("paid", models.PositiveIntegerField(default=0)),
+                ("expired", models.PositiveIntegerField(default=0)),
+                ("canceled", models.PositiveIntegerField(default=0)),
+                ("updated", models.DateTimeField(auto_now=True)),
+                (
+                    "eventpart",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="occupancy_counter",
+                        to="pretix_eventparts.eventpart",
+                    ),
+                ),
+            ],
+        ),
+    ]
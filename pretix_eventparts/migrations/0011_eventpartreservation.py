@@ -0,0 +1,44 @@
+# Generated by Django 3.2.8 on 2026-10-18 09:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pretixbase", "0197_auto_20210914_0814"),
+        ("pretix_eventparts", "0010_eventpartoccupancy"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EventPartReservation",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True, primary_key=True, serialize=False
+                    ),
+                ),
+                ("seats", models.PositiveIntegerField(default=1)),
+                ("expires", models.DateTimeField(db_index=True)),
+                (
+                    "eventpart",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="reservations",
+                        to="pretix_eventparts.eventpart",
+                    ),
+                ),
+                (
+                    "order",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="eventpart_reservations",
+                        to="pretixbase.order",
+                    ),
+                ),
+            ],
+        ),
+    ]
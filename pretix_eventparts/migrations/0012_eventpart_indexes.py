@@ -0,0 +1,35 @@
+from django.db import migrations, models
+
+ORDER_INDEX = models.Index(
+    fields=["order", "eventpart"], name="pretix_eventparts_ord_part"
+)
+
+
+def add_order_index(apps, schema_editor):
+    # The order side of the automatically created M2M table only has a
+    # single column index, so looking up the parts of an order needs to
+    # visit the table rows as well.
+    through = apps.get_model("pretix_eventparts", "EventPart").orders.through
+    schema_editor.add_index(through, ORDER_INDEX)
+
+
+def remove_order_index(apps, schema_editor):
+    through = apps.get_model("pretix_eventparts", "EventPart").orders.through
+    schema_editor.remove_index(through, ORDER_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pretix_eventparts", "0011_eventpartreservation"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="eventpart",
+            index=models.Index(
+                fields=["event", "type"], name="pretix_eventparts_evt_type"
+            ),
+        ),
+        migrations.RunPython(add_order_index, remove_order_index),
+    ]
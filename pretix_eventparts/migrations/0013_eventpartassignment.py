@@ -0,0 +1,87 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pretixbase", "0197_auto_20210914_0814"),
+        ("pretix_eventparts", "0012_eventpart_indexes"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EventPartAssignment",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True, primary_key=True, serialize=False
+                    ),
+                ),
+                (
+                    "type",
+                    models.CharField(
+                        choices=[
+                            ("start", "Start"),
+                            ("middle", "Middle"),
+                            ("end", "End"),
+                        ],
+                        max_length=6,
+                    ),
+                ),
+                ("assigned_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "eventpart",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="assignments",
+                        to="pretix_eventparts.eventpart",
+                    ),
+                ),
+                (
+                    "order",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="eventpart_assignments",
+                        to="pretixbase.order",
+                    ),
+                ),
+                (
+                    "position",
+                    models.ForeignKey(
+                        null=True,
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="eventpart_assignments",
+                        to="pretixbase.orderposition",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="eventpartassignment",
+            index=models.Index(
+                fields=["eventpart", "position"], name="pretix_eventparts_part_pos"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="eventpartassignment",
+            index=models.Index(
+                fields=["order", "type"], name="pretix_eventparts_ord_type"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="eventpartassignment",
+            constraint=models.UniqueConstraint(
+                fields=("position", "type"), name="pretix_eventparts_position_type"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="eventpartassignment",
+            constraint=models.UniqueConstraint(
+                condition=models.Q(position__isnull=True),
+                fields=("order", "type"),
+                name="pretix_eventparts_order_type",
+            ),
+        ),
+    ]
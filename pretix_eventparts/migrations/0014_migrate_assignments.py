@@ -0,0 +1,114 @@
+from django.db import migrations, transaction
+from django.db.models import OuterRef, Subquery
+
+BATCH_SIZE = 1000
+
+
+def forward(apps, schema_editor):
+    """Copies the order assignments into one row per admission position.
+
+    The old assignments did not record when they were made, so the order
+    date is used as the best guess instead of the time of the migration.
+    Orders are converted in batches, each in its own short transaction,
+    so the tables are never locked for long on large events.
+    """
+    EventPart = apps.get_model("pretix_eventparts", "EventPart")
+    EventPartAssignment = apps.get_model("pretix_eventparts", "EventPartAssignment")
+    Order = apps.get_model("pretixbase", "Order")
+    OrderPosition = apps.get_model("pretixbase", "OrderPosition")
+    through = EventPart.orders.through
+
+    last = 0
+    while True:
+        order_ids = list(
+            through.objects.filter(order_id__gt=last)
+            .order_by("order_id")
+            .values_list("order_id", flat=True)
+            .distinct()[:BATCH_SIZE]
+        )
+        if not order_ids:
+            break
+        last = order_ids[-1]
+
+        positions = {}
+        for order_id, position_id in (
+            OrderPosition.all.filter(
+                order_id__in=order_ids, canceled=False, item__admission=True
+            )
+            .order_by("positionid")
+            .values_list("order_id", "pk")
+        ):
+            positions.setdefault(order_id, []).append(position_id)
+
+        rows = []
+        seen = set()
+        for order_id, eventpart_id, type in (
+            through.objects.filter(order_id__in=order_ids)
+            .order_by("order_id", "eventpart_id")
+            .values_list("order_id", "eventpart_id", "eventpart__type")
+        ):
+            # Orders could be assigned to several parts of a type, only the
+            # first one has ever been shown
+            if (order_id, type) in seen:
+                continue
+            seen.add((order_id, type))
+            for position_id in positions.get(order_id) or [None]:
+                rows.append(
+                    EventPartAssignment(
+                        order_id=order_id,
+                        position_id=position_id,
+                        eventpart_id=eventpart_id,
+                        type=type,
+                    )
+                )
+
+        with transaction.atomic():
+            EventPartAssignment.objects.bulk_create(rows, ignore_conflicts=True)
+            # assigned_at is set on insert, so it is overwritten afterwards
+            EventPartAssignment.objects.filter(order_id__in=order_ids).update(
+                assigned_at=Subquery(
+                    Order.objects.filter(pk=OuterRef("order_id")).values("datetime")[:1]
+                )
+            )
+
+
+def backward(apps, schema_editor):
+    EventPart = apps.get_model("pretix_eventparts", "EventPart")
+    EventPartAssignment = apps.get_model("pretix_eventparts", "EventPartAssignment")
+    through = EventPart.orders.through
+
+    last = 0
+    while True:
+        order_ids = list(
+            EventPartAssignment.objects.filter(order_id__gt=last)
+            .order_by("order_id")
+            .values_list("order_id", flat=True)
+            .distinct()[:BATCH_SIZE]
+        )
+        if not order_ids:
+            break
+        last = order_ids[-1]
+        with transaction.atomic():
+            through.objects.bulk_create(
+                [
+                    through(order_id=order_id, eventpart_id=eventpart_id)
+                    for order_id, eventpart_id in EventPartAssignment.objects.filter(
+                        order_id__in=order_ids
+                    )
+                    .values_list("order_id", "eventpart_id")
+                    .distinct()
+                ],
+                ignore_conflicts=True,
+            )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("pretix_eventparts", "0013_eventpartassignment"),
+    ]
+
+    operations = [
+        migrations.RunPython(forward, backward),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations, models
+
+
+def restore_order_index(apps, schema_editor):
+    # The automatically created M2M table is recreated when this migration is
+    # reversed, it needs the index added in 0012 back.
+    through = apps.get_model("pretix_eventparts", "EventPart").orders.through
+    schema_editor.add_index(
+        through,
+        models.Index(fields=["order", "eventpart"], name="pretix_eventparts_ord_part"),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pretixbase", "0197_auto_20210914_0814"),
+        ("pretix_eventparts", "0014_migrate_assignments"),
+    ]
+
+    operations = [
+        migrations.RunPython(migrations.RunPython.noop, restore_order_index),
+        migrations.RemoveField(
+            model_name="eventpart",
+            name="orders",
+        ),
+        migrations.AddField(
+            model_name="eventpart",
+            name="orders",
+            field=models.ManyToManyField(
+                through="pretix_eventparts.EventPartAssignment", to="pretixbase.Order"
+            ),
+        ),
+    ]
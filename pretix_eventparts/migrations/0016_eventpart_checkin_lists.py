@@ -0,0 +1,23 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pretixbase", "0197_auto_20210914_0814"),
+        ("pretix_eventparts", "0015_eventpart_orders_through"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="eventpart",
+            name="checkin_lists",
+            field=models.ManyToManyField(
+                blank=True,
+                help_text="Scanning apps that sync these check-in lists through the eventparts API only receive attendees assigned to this or another selected eventpart. Check-in in pretix itself is not restricted.",
+                related_name="eventparts",
+                to="pretixbase.CheckinList",
+                verbose_name="Check-in lists",
+            ),
+        ),
+    ]
@@ -0,0 +1,62 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pretixbase", "0197_auto_20210914_0814"),
+        ("pretix_eventparts", "0017_pendingticketregeneration"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EventPartWaitingListEntry",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True, primary_key=True, serialize=False
+                    ),
+                ),
+                (
+                    "priority",
+                    models.IntegerField(
+                        default=0,
+                        help_text="Entries with a higher priority are promoted first.",
+                        verbose_name="Priority",
+                    ),
+                ),
+                ("created", models.DateTimeField(auto_now_add=True)),
+                (
+                    "eventpart",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="waiting_list",
+                        to="pretix_eventparts.eventpart",
+                    ),
+                ),
+                (
+                    "order",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="eventpart_waiting_list",
+                        to="pretixbase.order",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="eventpartwaitinglistentry",
+            index=models.Index(
+                fields=["eventpart", "-priority", "created"],
+                name="pretix_eventparts_wl_rank",
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="eventpartwaitinglistentry",
+            constraint=models.UniqueConstraint(
+                fields=("eventpart", "order"), name="pretix_eventparts_wl_order"
+            ),
+        ),
+    ]
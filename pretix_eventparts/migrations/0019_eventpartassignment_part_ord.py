@@ -0,0 +1,17 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pretix_eventparts", "0018_eventpartwaitinglistentry"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="eventpartassignment",
+            index=models.Index(
+                fields=["eventpart", "order"], name="pretix_eventparts_part_ord"
+            ),
+        ),
+    ]
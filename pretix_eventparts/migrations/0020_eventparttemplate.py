@@ -0,0 +1,69 @@
+import django.db.models.deletion
+import i18nfield.fields
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("pretixbase", "0197_auto_20210914_0814"),
+        ("pretix_eventparts", "0019_eventpartassignment_part_ord"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="EventPartTemplate",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("name", models.CharField(max_length=200, verbose_name="Name")),
+                (
+                    "description",
+                    i18nfield.fields.I18nCharField(
+                        default="", verbose_name="Description"
+                    ),
+                ),
+                (
+                    "category",
+                    models.CharField(
+                        default="", max_length=200, verbose_name="Category"
+                    ),
+                ),
+                (
+                    "capacity",
+                    models.IntegerField(default=0, verbose_name="Capacity"),
+                ),
+                (
+                    "type",
+                    models.CharField(
+                        choices=[
+                            ("start", "Start"),
+                            ("middle", "Middle"),
+                            ("end", "End"),
+                        ],
+                        default="start",
+                        max_length=6,
+                        verbose_name="Type",
+                    ),
+                ),
+                (
+                    "organizer",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="eventpart_templates",
+                        to="pretixbase.organizer",
+                    ),
+                ),
+            ],
+            options={
+                "ordering": ("type", "category", "name"),
+            },
+        ),
+    ]
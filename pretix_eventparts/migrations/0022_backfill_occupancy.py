@@ -0,0 +1,62 @@
+from django.db import migrations, transaction
+from django.db.models import Count
+
+BATCH_SIZE = 1000
+
+STATUS_FIELDS = {"n": "pending", "p": "paid", "e": "expired", "c": "canceled"}
+
+
+def forward(apps, schema_editor):
+    """Computes the occupancy counters of all eventparts from their
+    assignments, which have been read from the counters since.
+
+    Eventparts are counted in batches, each in its own short
+    transaction.
+    """
+    EventPart = apps.get_model("pretix_eventparts", "EventPart")
+    EventPartAssignment = apps.get_model("pretix_eventparts", "EventPartAssignment")
+    EventPartOccupancy = apps.get_model("pretix_eventparts", "EventPartOccupancy")
+
+    last = 0
+    while True:
+        eventpart_ids = list(
+            EventPart.objects.filter(pk__gt=last)
+            .order_by("pk")
+            .values_list("pk", flat=True)[:BATCH_SIZE]
+        )
+        if not eventpart_ids:
+            break
+        last = eventpart_ids[-1]
+
+        counts = {pk: {f: 0 for f in STATUS_FIELDS.values()} for pk in eventpart_ids}
+        for eventpart_id, status, c in (
+            EventPartAssignment.objects.filter(
+                eventpart_id__in=eventpart_ids, position__isnull=False
+            )
+            .order_by()
+            .values_list("eventpart_id", "order__status")
+            .annotate(c=Count("*"))
+        ):
+            if status in STATUS_FIELDS:
+                counts[eventpart_id][STATUS_FIELDS[status]] = c
+
+        with transaction.atomic():
+            EventPartOccupancy.objects.filter(eventpart_id__in=eventpart_ids).delete()
+            EventPartOccupancy.objects.bulk_create(
+                [
+                    EventPartOccupancy(eventpart_id=pk, **values)
+                    for pk, values in counts.items()
+                ]
+            )
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("pretix_eventparts", "0021_eventpartforecast"),
+    ]
+
+    operations = [
+        migrations.RunPython(forward, migrations.RunPython.noop),
+    ]
@@ -1,11 +1,71 @@
+import math
 from django.db import models
+from django.db.models import F, IntegerField, OuterRef, Subquery, Sum, Value
 from django.db.models.fields import CharField
+from django.db.models.functions import Coalesce
+from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
-from django_scopes import ScopedManager
+from django_scopes import ScopedManager, scopes_disabled
 from i18nfield.fields import I18nCharField
-from pretix.base.models import Event, Order
+from pretix.base.models import CheckinList, Event, Order, OrderPosition, Organizer
 from pretix.base.models.base import LoggedModel
 
+from pretix_eventparts.cache import eventparts_cache
+
+# Only orders with these states take up a place in an eventpart
+ACTIVE_STATUSES = (Order.STATUS_PENDING, Order.STATUS_PAID)
+
+
+class EventPartQuerySet(models.QuerySet):
+    def with_occupancy(self, status=ACTIVE_STATUSES):
+        """Annotates every eventpart with ``occupancy``, the number of
+        admission positions of pending and paid orders assigned to it.
+
+        The number is read from the :class:`EventPartOccupancy` counters
+        with a join instead of counting the assignments. ``status``
+        optionally counts orders with another status (e.g.
+        ``Order.STATUS_PAID``) or list of statuses instead.
+        """
+        if isinstance(status, str):
+            status = [status]
+        fields = [
+            F("occupancy_counter__" + EventPartOccupancy.STATUS_FIELDS[s])
+            for s in status
+        ]
+
+        return self.annotate(
+            occupancy=Coalesce(
+                sum(fields[1:], fields[0]), Value(0), output_field=IntegerField()
+            )
+        )
+
+    def with_reserved(self, exclude_orders=()):
+        """Annotates every eventpart with ``reserved``, the number of places
+        held by unexpired reservations.
+
+        Reservations of the orders in ``exclude_orders`` are not
+        counted.
+        """
+        reservations = EventPartReservation.objects.filter(
+            eventpart=OuterRef("pk"), expires__gt=now()
+        ).exclude(order__in=exclude_orders)
+
+        return self.annotate(
+            reserved=Coalesce(
+                Subquery(
+                    reservations.values("eventpart")
+                    .order_by()
+                    .annotate(s=Sum("seats"))
+                    .values("s")
+                ),
+                Value(0),
+                output_field=IntegerField(),
+            )
+        )
+
+
+PARTICIPANTS_PAGE_SIZE = 50
+
 
 class EventPart(LoggedModel):
     class EventPartTypes(models.TextChoices):
@@ -21,7 +81,11 @@ class EventPart(LoggedModel):
         max_length=None, verbose_name=_("Description"), default=""
     )
     category = CharField(max_length=200, verbose_name=_("Category"), default="")
-    capacity = models.IntegerField(verbose_name=_("Capacity"), default=0)
+    capacity = models.IntegerField(
+        verbose_name=_("Capacity"),
+        default=0,
+        help_text=_("Leave at 0 for an eventpart without a limit."),
+    )
 
     type = models.CharField(
         max_length=6,
@@ -36,39 +100,347 @@ class EventPart(LoggedModel):
         on_delete=models.CASCADE,
     )
 
-    orders = models.ManyToManyField(Order)
+    orders = models.ManyToManyField(Order, through="EventPartAssignment")
+    checkin_lists = models.ManyToManyField(
+        CheckinList,
+        blank=True,
+        related_name="eventparts",
+        verbose_name=_("Check-in lists"),
+        help_text=_(
+            "Scanning apps that sync these check-in lists through the eventparts "
+            "API only receive attendees assigned to this or another selected "
+            "eventpart. Check-in in pretix itself is not restricted."
+        ),
+    )
 
-    objects = ScopedManager(event="event")
+    objects = ScopedManager(
+        event="event",
+        _manager_class=models.Manager.from_queryset(EventPartQuerySet),
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["event", "type"], name="pretix_eventparts_evt_type"),
+        ]
 
     @property
     def type_name(self):
         return self.key_name(self.type)
 
     def key_name(self, key):
-        if key == "start":
-            return self.event.settings.eventparts__public_start_name
-        if key == "middle":
-            return self.event.settings.eventparts__public_middle_name
-        if key == "end":
-            return self.event.settings.eventparts__public_end_name
+        return type_names(self.event).get(key)
 
     def choices(self):
-        x = [(c, self.key_name(c)) for c in self.EventPartTypes.values]
-        return x
+        return list(type_names(self.event).items())
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        eventparts_cache(self.event).clear()
+
+    def delete(self, *args, **kwargs):
+        eventparts_cache(self.event).clear()
+        return super().delete(*args, **kwargs)
+
+    def has_assignments(self) -> bool:
+        if self.pk is None:
+            return False
+        with scopes_disabled():
+            return self.assignments.exists()
+
+    def exceeds_capacity(self, taken) -> bool:
+        """Returns whether ``taken`` places are more than this eventpart holds.
+
+        A capacity of 0 means the eventpart has no limit.
+        """
+        return bool(self.capacity) and taken > self.capacity
+
+    def places_left(self, taken):
+        """Returns the number of places left when ``taken`` places are used, or
+        ``math.inf`` for eventparts without a limit."""
+        if not self.capacity:
+            return math.inf
+        return max(self.capacity - taken, 0)
 
     def used_places(self) -> int:
-        used_places = 0
-        for o in self.orders.all().prefetch_related("positions__item"):
-            for p in o.positions.all():
-                if p.item.admission:
-                    used_places += 1
-        return used_places
+        if hasattr(self, "occupancy"):
+            return self.occupancy
+        with scopes_disabled():
+            counter = EventPartOccupancy.objects.filter(eventpart=self).first()
+        return counter.active if counter else 0
+
+    def participant_orders(self, after=None, limit=PARTICIPANTS_PAGE_SIZE):
+        """Returns up to ``limit`` orders assigned to this eventpart, ordered
+        by id and starting after the order with the id ``after``.
+
+        Paging by the last seen id instead of an offset keeps every page
+        an index range scan, no matter how far into the list it is.
+        """
+        with scopes_disabled():
+            ids = self.assignments.order_by("order_id").values_list(
+                "order_id", flat=True
+            )
+            if after:
+                ids = ids.filter(order_id__gt=after)
+            ids = list(ids.distinct()[:limit])
+            return list(
+                Order.objects.filter(pk__in=ids)
+                .select_related("invoice_address")
+                .prefetch_related("positions")
+                .order_by("pk")
+            )
 
     def contacts(self):
-        contacts = []
-        for o in self.orders.all():
-            contacts.append(o.email)
-        return contacts
+        from pretix_eventparts.mails import participant_recipients
+
+        return [email for email, locale in participant_recipients([self.pk])]
+
+    def __str__(self):
+        return self.name
+
+
+def type_names(event):
+    """Returns the public names of the eventpart types of ``event``, keyed by
+    type in the order of :class:`EventPart.EventPartTypes`.
+
+    The names are read from the settings once and memoized on the event
+    instance, so all eventparts sharing it, e.g. the rows of a list or
+    the positions of a ticket, share the lookup.
+    """
+    names = getattr(event, "_eventpart_type_names", None)
+    if names is None:
+        settings = event.settings
+        names = {
+            EventPart.EventPartTypes.START: settings.eventparts__public_start_name,
+            EventPart.EventPartTypes.MIDDLE: settings.eventparts__public_middle_name,
+            EventPart.EventPartTypes.END: settings.eventparts__public_end_name,
+        }
+        event._eventpart_type_names = names
+    return names
+
+
+def clear_type_names(event):
+    event.__dict__.pop("_eventpart_type_names", None)
+
+
+class EventPartAssignment(models.Model):
+    """Assigns an admission position to an eventpart.
+
+    Orders are assigned position by position, so the attendees of a
+    group order can take part in different eventparts. Orders without
+    admission positions are assigned with a single row without a
+    position, which does not take up a place.
+    """
+
+    order = models.ForeignKey(
+        Order,
+        related_name="eventpart_assignments",
+        on_delete=models.CASCADE,
+    )
+    position = models.ForeignKey(
+        OrderPosition,
+        related_name="eventpart_assignments",
+        on_delete=models.CASCADE,
+        null=True,
+    )
+    eventpart = models.ForeignKey(
+        EventPart,
+        related_name="assignments",
+        on_delete=models.CASCADE,
+    )
+    type = models.CharField(
+        max_length=6,
+        choices=EventPart.EventPartTypes.choices,
+    )
+    assigned_at = models.DateTimeField(auto_now_add=True)
+
+    objects = ScopedManager(event="eventpart__event")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["position", "type"], name="pretix_eventparts_position_type"
+            ),
+            models.UniqueConstraint(
+                fields=["order", "type"],
+                condition=models.Q(position__isnull=True),
+                name="pretix_eventparts_order_type",
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["eventpart", "position"], name="pretix_eventparts_part_pos"
+            ),
+            models.Index(
+                fields=["eventpart", "order"], name="pretix_eventparts_part_ord"
+            ),
+            models.Index(fields=["order", "type"], name="pretix_eventparts_ord_type"),
+        ]
+
+
+class EventPartOccupancy(models.Model):
+    eventpart = models.OneToOneField(
+        EventPart,
+        related_name="occupancy_counter",
+        on_delete=models.CASCADE,
+    )
+    pending = models.PositiveIntegerField(default=0)
+    paid = models.PositiveIntegerField(default=0)
+    expired = models.PositiveIntegerField(default=0)
+    canceled = models.PositiveIntegerField(default=0)
+    updated = models.DateTimeField(auto_now=True)
+
+    objects = ScopedManager(event="eventpart__event")
+
+    STATUS_FIELDS = {
+        Order.STATUS_PENDING: "pending",
+        Order.STATUS_PAID: "paid",
+        Order.STATUS_EXPIRED: "expired",
+        Order.STATUS_CANCELED: "canceled",
+    }
+
+    @property
+    def active(self) -> int:
+        return self.pending + self.paid
+
+    def counts(self) -> dict:
+        return {f: getattr(self, f) for f in self.STATUS_FIELDS.values()}
+
+
+class EventPartReservation(models.Model):
+    """Holds places of an eventpart for an order while its customer is
+    choosing, the same way a cart position holds quota.
+
+    Expired reservations are ignored everywhere and cleaned up
+    periodically.
+    """
+
+    eventpart = models.ForeignKey(
+        EventPart,
+        related_name="reservations",
+        on_delete=models.CASCADE,
+    )
+    order = models.ForeignKey(
+        Order,
+        related_name="eventpart_reservations",
+        on_delete=models.CASCADE,
+    )
+    seats = models.PositiveIntegerField(default=1)
+    expires = models.DateTimeField(db_index=True)
+
+    objects = ScopedManager(event="eventpart__event")
+
+
+class PendingTicketRegeneration(models.Model):
+    """Marks a position whose tickets show outdated eventpart information.
+
+    Every position is marked at most once, no matter how often its
+    eventparts change until its tickets are regenerated.
+    """
+
+    event = models.ForeignKey(
+        Event,
+        related_name="+",
+        on_delete=models.CASCADE,
+    )
+    position = models.OneToOneField(
+        OrderPosition,
+        related_name="+",
+        on_delete=models.CASCADE,
+    )
+    created = models.DateTimeField(auto_now_add=True)
+
+    objects = ScopedManager(event="event")
+
+
+class EventPartWaitingListEntry(models.Model):
+    """Puts an order on the waiting list of a full eventpart.
+
+    Entries are promoted by priority first and by age second as soon as
+    the eventpart has enough free places for all admission positions of
+    the order.
+    """
+
+    eventpart = models.ForeignKey(
+        EventPart,
+        related_name="waiting_list",
+        on_delete=models.CASCADE,
+    )
+    order = models.ForeignKey(
+        Order,
+        related_name="eventpart_waiting_list",
+        on_delete=models.CASCADE,
+    )
+    priority = models.IntegerField(
+        default=0,
+        verbose_name=_("Priority"),
+        help_text=_("Entries with a higher priority are promoted first."),
+    )
+    created = models.DateTimeField(auto_now_add=True)
+
+    objects = ScopedManager(event="eventpart__event")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["eventpart", "order"], name="pretix_eventparts_wl_order"
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=["eventpart", "-priority", "created"],
+                name="pretix_eventparts_wl_rank",
+            ),
+        ]
+
+
+class EventPartTemplate(models.Model):
+    """An eventpart kept on the organizer level to be created in many events at
+    once."""
+
+    organizer = models.ForeignKey(
+        Organizer,
+        related_name="eventpart_templates",
+        on_delete=models.CASCADE,
+    )
+    name = CharField(
+        max_length=200,
+        verbose_name=_("Name"),
+    )
+    description = I18nCharField(
+        max_length=None, verbose_name=_("Description"), default=""
+    )
+    category = CharField(max_length=200, verbose_name=_("Category"), default="")
+    capacity = models.IntegerField(
+        verbose_name=_("Capacity"),
+        default=0,
+        help_text=_("Leave at 0 for an eventpart without a limit."),
+    )
+    type = models.CharField(
+        max_length=6,
+        verbose_name=_("Type"),
+        choices=EventPart.EventPartTypes.choices,
+        default=EventPart.EventPartTypes.START,
+    )
+
+    objects = ScopedManager(organizer="organizer")
+
+    class Meta:
+        ordering = ("type", "category", "name")
 
     def __str__(self):
         return self.name
+
+
+class EventPartForecast(models.Model):
+    """The latest occupancy forecast of the eventparts of an organizer, as
+    computed by :func:`pretix_eventparts.forecast.compute_forecast`."""
+
+    organizer = models.OneToOneField(
+        Organizer,
+        related_name="eventpart_forecast",
+        on_delete=models.CASCADE,
+    )
+    data = models.JSONField(default=dict)
+    updated = models.DateTimeField(auto_now=True)
+
+    objects = ScopedManager(organizer="organizer")
@@ -0,0 +1,162 @@
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import Count
+from django_scopes import scopes_disabled
+
+from pretix_eventparts.cache import eventparts_cache
+from pretix_eventparts.models import EventPart, EventPartAssignment, EventPartOccupancy
+
+DASHBOARD_TIMEOUT = 60
+
+
+def compute_occupancy(eventpart_ids) -> dict:
+    """Counts the admission positions of the given eventparts split by order
+    status with one grouped query.
+
+    Returns a dict mapping every eventpart id to the field values of its
+    :class:`EventPartOccupancy`.
+    """
+    eventpart_ids = set(eventpart_ids)
+    counts = {
+        pk: {f: 0 for f in EventPartOccupancy.STATUS_FIELDS.values()}
+        for pk in eventpart_ids
+    }
+    if not eventpart_ids:
+        return counts
+
+    with scopes_disabled():
+        rows = (
+            EventPartAssignment.objects.filter(
+                eventpart__in=eventpart_ids, position__isnull=False
+            )
+            .order_by()
+            .values("eventpart", "order__status")
+            .annotate(c=Count("*"))
+        )
+        for row in rows:
+            field = EventPartOccupancy.STATUS_FIELDS.get(row["order__status"])
+            if field:
+                counts[row["eventpart"]][field] = row["c"]
+    return counts
+
+
+@transaction.atomic
+def update_occupancy(eventpart_ids):
+    """Recomputes the persisted counters of the given eventparts.
+
+    The counter rows are locked for the duration of the transaction, so
+    concurrent updates of the same parts are applied one after another
+    and never interleave.
+    """
+    eventpart_ids = sorted(set(eventpart_ids))
+    if not eventpart_ids:
+        return
+
+    with scopes_disabled():
+        existing = {
+            c.eventpart_id: c
+            for c in EventPartOccupancy.objects.select_for_update().filter(
+                eventpart_id__in=eventpart_ids
+            )
+        }
+        counts = compute_occupancy(eventpart_ids)
+
+        create = []
+        for pk, values in counts.items():
+            counter = existing.get(pk)
+            if counter is None:
+                create.append(EventPartOccupancy(eventpart_id=pk, **values))
+            elif counter.counts() != values:
+                EventPartOccupancy.objects.filter(pk=counter.pk).update(**values)
+        if create:
+            EventPartOccupancy.objects.bulk_create(create, ignore_conflicts=True)
+
+
+def update_order_occupancy(order, extra_eventpart_ids=()):
+    """Recomputes the counters of all eventparts ``order`` is assigned to, plus
+    ``extra_eventpart_ids`` (e.g. parts it was just removed from).
+
+    Returns the ids of the recomputed eventparts.
+    """
+    with scopes_disabled():
+        eventpart_ids = set(
+            order.eventpart_assignments.values_list("eventpart_id", flat=True)
+        )
+    eventpart_ids |= set(extra_eventpart_ids)
+    update_occupancy(eventpart_ids)
+    return eventpart_ids
+
+
+def rebuild_occupancy(eventparts):
+    """Recomputes the counters of ``eventparts`` from scratch.
+
+    Returns a dict mapping the ids of eventparts whose stored counters
+    deviated to a dict of ``field: (stored, actual)`` pairs.
+    """
+    drift = defaultdict(dict)
+    with scopes_disabled():
+        eventpart_ids = [e.pk for e in eventparts]
+        stored = {
+            c.eventpart_id: c.counts()
+            for c in EventPartOccupancy.objects.filter(eventpart_id__in=eventpart_ids)
+        }
+        for pk, values in compute_occupancy(eventpart_ids).items():
+            before = stored.get(pk, {f: 0 for f in values})
+            for field, value in values.items():
+                if before[field] != value:
+                    drift[pk][field] = (before[field], value)
+    update_occupancy(eventpart_ids)
+    return drift
+
+
+def _fill(entry):
+    capacity, occupancy = entry["capacity"], entry["occupancy"]
+    entry["percent"] = min(round(100 * occupancy / capacity), 100) if capacity else 0
+    return entry
+
+
+def occupancy_summary(event):
+    """Returns the fill levels of the eventparts of ``event`` and of their
+    categories per type for the dashboard.
+
+    The numbers come from one aggregated query and are cached for
+    :data:`DASHBOARD_TIMEOUT` seconds. Assignment changes drop the
+    cached summary right away.
+    """
+
+    def compute():
+        with scopes_disabled():
+            parts = list(
+                EventPart.objects.filter(event=event)
+                .with_occupancy()
+                .order_by("type", "category", "name")
+                .values("pk", "name", "type", "category", "capacity", "occupancy")
+            )
+        categories = {}
+        unlimited = set()
+        for part in parts:
+            key = (part["type"], part["category"])
+            category = categories.setdefault(
+                key,
+                {
+                    "type": part["type"],
+                    "category": part["category"],
+                    "capacity": 0,
+                    "occupancy": 0,
+                },
+            )
+            category["capacity"] += part["capacity"]
+            category["occupancy"] += part["occupancy"]
+            if not part["capacity"]:
+                unlimited.add(key)
+        for key in unlimited:
+            # A category with an eventpart without a limit has none either
+            categories[key]["capacity"] = 0
+        return {
+            "parts": [_fill(p) for p in parts],
+            "categories": [_fill(c) for c in categories.values()],
+        }
+
+    return eventparts_cache(event).get_or_set(
+        "dashboard", compute, timeout=DASHBOARD_TIMEOUT
+    )
@@ -0,0 +1,113 @@
+from datetime import timedelta
+from django.db import transaction
+from django.utils.timezone import now
+from django_scopes import scopes_disabled
+
+from pretix_eventparts.assignments import CapacityExceeded, set_assignments
+from pretix_eventparts.cache import eventparts_cache
+from pretix_eventparts.models import EventPart, EventPartReservation
+
+AVAILABILITY_TIMEOUT = 30
+
+
+def order_seats(order) -> int:
+    """Returns the number of places ``order`` takes up in an eventpart."""
+    return order.positions.filter(item__admission=True).count()
+
+
+def available_places(event) -> dict:
+    """Returns the number of places left per eventpart id, or ``None`` for
+    eventparts without a limit.
+
+    The numbers are computed with one query and cached for
+    :data:`AVAILABILITY_TIMEOUT` seconds, so they are meant for display
+    only. Reservations are always checked against the database.
+    """
+
+    def compute():
+        with scopes_disabled():
+            return {
+                pk: max(capacity - occupancy - reserved, 0) if capacity else None
+                for pk, capacity, occupancy, reserved in EventPart.objects.filter(
+                    event=event
+                )
+                .with_occupancy()
+                .with_reserved()
+                .values_list("pk", "capacity", "occupancy", "reserved")
+            }
+
+    return eventparts_cache(event).get_or_set(
+        "availability", compute, timeout=AVAILABILITY_TIMEOUT
+    )
+
+
+def active_reservations(order):
+    with scopes_disabled():
+        return list(
+            EventPartReservation.objects.filter(order=order, expires__gt=now())
+            .select_related("eventpart")
+            .order_by("eventpart__type")
+        )
+
+
+def release_reservations(order):
+    with scopes_disabled():
+        EventPartReservation.objects.filter(order=order).delete()
+
+
+def reserve_eventparts(order, eventparts):
+    """Reserves places in ``eventparts`` for all admission positions of
+    ``order``, replacing any reservations the order held before.
+
+    The reservations are written first and the eventparts are counted
+    afterwards, so no eventpart row is locked and customers choosing at
+    the same time do not wait for each other. Two customers competing
+    for the last place both see each other's reservation and are both
+    rejected with :class:`CapacityExceeded` rather than overselling it.
+    This must therefore not run inside a transaction.
+    """
+    release_reservations(order)
+    expires = now() + timedelta(
+        minutes=order.event.settings.eventparts__selfservice_reservation_time
+    )
+    seats = order_seats(order)
+    with scopes_disabled():
+        EventPartReservation.objects.bulk_create(
+            [
+                EventPartReservation(
+                    eventpart=eventpart, order=order, seats=seats, expires=expires
+                )
+                for eventpart in eventparts
+            ]
+        )
+        for eventpart in (
+            EventPart.objects.filter(pk__in=[e.pk for e in eventparts])
+            .with_occupancy()
+            .with_reserved()
+        ):
+            if eventpart.exceeds_capacity(eventpart.occupancy + eventpart.reserved):
+                release_reservations(order)
+                raise CapacityExceeded(eventpart)
+    return expires
+
+
+@transaction.atomic
+def confirm_reservations(order):
+    """Turns the unexpired reservations of ``order`` into assignments.
+
+    Returns the eventparts the order has been assigned to, which is
+    empty if its reservations have expired in the meantime.
+    """
+    reservations = active_reservations(order)
+    if reservations:
+        set_assignments(
+            order.event,
+            {order: {r.eventpart.type: r.eventpart for r in reservations}},
+        )
+    release_reservations(order)
+    return [r.eventpart for r in reservations]
+
+
+def clear_expired_reservations():
+    with scopes_disabled():
+        EventPartReservation.objects.filter(expires__lte=now()).delete()
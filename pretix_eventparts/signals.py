@@ -1,18 +1,52 @@
 # Register your receivers here
 
+import functools
+import os
+from django.conf import settings
 from django.contrib.staticfiles import finders
+from django.db.models import Q
 from django.dispatch.dispatcher import receiver
 from django.template.loader import render_to_string
 from django.urls import resolve, reverse
 from django.utils.translation import gettext_lazy as _
-from django_scopes import scope
+from django_scopes import scopes_disabled
 from i18nfield.forms import LazyI18nString
 from pretix.base.settings import settings_hierarkey
-from pretix.base.signals import layout_text_variables, logentry_display
+from pretix.base.signals import (
+    event_copy_data,
+    layout_text_variables,
+    logentry_display,
+    order_canceled,
+    order_changed,
+    order_denied,
+    order_expired,
+    order_paid,
+    order_reactivated,
+    periodic_task,
+    register_data_exporters,
+)
 from pretix.control import signals
 from pretix.presale.signals import order_info, sass_postamble
 
-from pretix_eventparts.models import EventPart
+from pretix_eventparts.assignments import (
+    schedule_promotion,
+    schedule_waiting_list_promotions,
+    sync_order_assignments,
+)
+from pretix_eventparts.cache import (
+    ORDER_INFO_TIMEOUT,
+    eventparts_cache,
+    order_info_cache_key,
+)
+from pretix_eventparts.cloning import copy_eventparts
+from pretix_eventparts.forecast import schedule_forecast_refreshes
+from pretix_eventparts.forms import EventPartOrderFilterForm
+from pretix_eventparts.instrumentation import instrumented
+from pretix_eventparts.models import EventPart, EventPartAssignment, type_names
+from pretix_eventparts.occupancy import occupancy_summary, update_order_occupancy
+from pretix_eventparts.reservations import clear_expired_reservations
+from pretix_eventparts.tickets import schedule_stale_regenerations
+from pretix_eventparts.utils import eventparts_for_order, eventparts_for_position
 
 settings_hierarkey.add_default(
     key="eventparts__public_name", default_type=LazyI18nString, value="Eventpart"
@@ -29,9 +63,16 @@ settings_hierarkey.add_default(
 settings_hierarkey.add_default(
     key="eventparts__public_end_name", default_type=LazyI18nString, value="End"
 )
+settings_hierarkey.add_default(
+    key="eventparts__selfservice", default_type=bool, value="False"
+)
+settings_hierarkey.add_default(
+    key="eventparts__selfservice_reservation_time", default_type=int, value="10"
+)
 
 
 @receiver(signals.nav_event, dispatch_uid="pretix_eventparts")
+@instrumented("nav_event")
 def navbar_entry(request, **kwargs):
     url = resolve(request.path_info)
     nav = [
@@ -51,21 +92,59 @@ def navbar_entry(request, **kwargs):
     return nav
 
 
-@receiver(signals.order_info, dispatch_uid="pretix_eventparts")
-def order_eventpart_selection(sender, order, request, **kwargs):
-    with scope(event=order.event):
-        ep = order.eventpart_set.all()
-        eventparts = {
-            "start": ep.filter(type=EventPart.EventPartTypes.START).first(),
-            "middle": ep.filter(type=EventPart.EventPartTypes.MIDDLE).first(),
-            "end": ep.filter(type=EventPart.EventPartTypes.END).first(),
+@receiver(signals.event_dashboard_widgets, dispatch_uid="pretix_eventparts")
+@instrumented("event_dashboard_widgets")
+def dashboard_widgets(sender, subevent=None, lazy=False, **kwargs):
+    content = None
+    if lazy:
+        # The fill levels are only computed once the widget is loaded
+        with scopes_disabled():
+            if not EventPart.objects.filter(event=sender).exists():
+                return []
+    else:
+        summary = occupancy_summary(sender)
+        if not summary["parts"]:
+            return []
+        names = type_names(sender)
+        groups = []
+        for type in EventPart.EventPartTypes.values:
+            rows = [
+                {**c, "label": c["category"], "is_category": True}
+                for c in summary["categories"]
+                if c["type"] == type and c["category"]
+            ] + [
+                {**p, "label": p["name"], "is_category": False}
+                for p in summary["parts"]
+                if p["type"] == type
+            ]
+            if rows:
+                groups.append({"name": names[type], "rows": rows})
+        content = render_to_string(
+            "pretix_eventparts/eventparts/dashboard_widget.html",
+            {"title": _("Eventpart occupancy"), "groups": groups},
+        )
+    return [
+        {
+            "content": content,
+            "lazy": "eventparts-occupancy",
+            "display_size": "big",
+            "priority": 40,
+            "url": reverse(
+                "plugins:pretix_eventparts:eventpart.list",
+                kwargs={"event": sender.slug, "organizer": sender.organizer.slug},
+            ),
         }
+    ]
 
+
+@receiver(signals.order_info, dispatch_uid="pretix_eventparts")
+@instrumented("control.order_info")
+def order_eventpart_selection(sender, order, request, **kwargs):
     return render_to_string(
         "pretix_eventparts/eventparts/eventpart_assignments.html",
         {
             "order": order,
-            "eventparts": eventparts,
+            "eventparts": eventparts_for_order(order),
             "request": request,
             "settings": request.event.settings,
         },
@@ -73,38 +152,67 @@ def order_eventpart_selection(sender, order, request, **kwargs):
 
 
 @receiver(order_info, dispatch_uid="pretix_eventparts")
+@instrumented("presale.order_info")
 def order_eventpart_selection_public(sender, order, request, **kwargs):
-    if request.event.settings.eventparts__public is False:
-        return None
-
-    with scope(event=order.event):
-        ep = order.eventpart_set.all()
-        eventparts = {
-            "start": ep.filter(type=EventPart.EventPartTypes.START).first(),
-            "middle": ep.filter(type=EventPart.EventPartTypes.MIDDLE).first(),
-            "end": ep.filter(type=EventPart.EventPartTypes.END).first(),
-        }
+    editable = "can_change_orders" in getattr(request, "eventpermset", ())
 
-    return render_to_string(
-        "pretix_eventparts/eventparts/eventpart_assignments_public.html",
-        {
-            "order": order,
-            "eventparts": eventparts,
-            "request": request,
-            "settings": request.event.settings,
-        },
+    def render():
+        if request.event.settings.eventparts__public is False:
+            return ""
+        return render_to_string(
+            "pretix_eventparts/eventparts/eventpart_assignments_public.html",
+            {
+                "order": order,
+                "eventparts": eventparts_for_order(order),
+                "request": request,
+                "settings": request.event.settings,
+            },
+        )
+
+    fragment = eventparts_cache(request.event).get_or_set(
+        order_info_cache_key(order, editable), render, timeout=ORDER_INFO_TIMEOUT
     )
+    return fragment or None
+
+
+@functools.lru_cache(maxsize=None)
+def _postamble_path():
+    return finders.find("pretix_eventparts/postamble.scss")
+
+
+@functools.lru_cache(maxsize=1)
+def _postamble_content(path, mtime):
+    with open(path, "r") as fp:
+        return fp.read()
+
+
+def postamble():
+    """Returns the plugin's SCSS, which is looked up and read only once per
+    process.
+
+    In DEBUG mode, the file is read again after it has been modified.
+    """
+    path = _postamble_path()
+    return _postamble_content(path, os.path.getmtime(path) if settings.DEBUG else None)
 
 
 @receiver(sass_postamble, dispatch_uid="pretix_eventparts")
+@instrumented("sass_postamble")
 def r_sass_postamble(filename, **kwargs):
     if filename == "main.scss":
-        with open(finders.find("pretix_eventparts/postamble.scss"), "r") as fp:
-            return fp.read()
+        return postamble()
     return " "
 
 
+@receiver(register_data_exporters, dispatch_uid="pretix_eventparts_export")
+def register_exporters(sender, **kwargs):
+    from pretix_eventparts.exporters import EventPartAssignmentExporter
+
+    return EventPartAssignmentExporter
+
+
 @receiver(signals.nav_event_settings, dispatch_uid="pretix_eventparts")
+@instrumented("nav_event_settings")
 def nav_event_settings(sender, request, **kwargs):
     url = resolve(request.path_info)
     if not request.user.has_event_permission(
@@ -126,6 +234,57 @@ def nav_event_settings(sender, request, **kwargs):
     ]
 
 
+@receiver(signals.order_search_filter_q, dispatch_uid="pretix_eventparts")
+def order_search_filter_q(sender, query, **kwargs):
+    if sender is None or "pretix_eventparts" not in sender.get_plugins():
+        return Q()
+    with scopes_disabled():
+        return Q(
+            pk__in=EventPartAssignment.objects.filter(
+                eventpart__event=sender, eventpart__name__icontains=query
+            ).values("order_id")
+        )
+
+
+@receiver(signals.order_search_forms, dispatch_uid="pretix_eventparts")
+def order_search_forms(sender, request, **kwargs):
+    return EventPartOrderFilterForm(event=sender, data=request.GET, prefix="eventparts")
+
+
+@receiver(signals.nav_organizer, dispatch_uid="pretix_eventparts")
+def nav_organizer(sender, request, organizer, **kwargs):
+    if not request.user.has_organizer_permission(
+        organizer, "can_change_organizer_settings", request=request
+    ):
+        return []
+    url = resolve(request.path_info)
+    return [
+        {
+            "label": _("Eventpart forecast"),
+            "url": reverse(
+                "plugins:pretix_eventparts:forecast",
+                kwargs={"organizer": organizer.slug},
+            ),
+            "active": url.url_name == "forecast",
+            "icon": "line-chart",
+        },
+        {
+            "label": _("Eventpart templates"),
+            "url": reverse(
+                "plugins:pretix_eventparts:templates",
+                kwargs={"organizer": organizer.slug},
+            ),
+            "active": url.url_name in ("templates", "templates.apply"),
+            "icon": "forward",
+        },
+    ]
+
+
+@receiver(event_copy_data, dispatch_uid="pretix_eventparts")
+def event_copy_data_receiver(sender, other, checkin_list_map, **kwargs):
+    copy_eventparts(other, sender, checkin_list_map=checkin_list_map)
+
+
 @receiver(logentry_display, dispatch_uid="pretix_eventparts")
 def logentry_display_f(logentry, **kwargs):
     if logentry.action_type == "pretix_eventparts.public":
@@ -136,118 +295,150 @@ def logentry_display_f(logentry, **kwargs):
         return _(
             "Eventpart information is no longer shown in the customers order view."
         )
+    if logentry.action_type == "pretix_eventparts.autoassign":
+        return _("Orders have been assigned to eventparts automatically.")
+    if logentry.action_type == "pretix_eventparts.import":
+        return _("Eventpart assignments have been imported from a file.")
+    if logentry.action_type == "pretix_eventparts.mail":
+        return _("An email has been sent to the participants of eventparts.")
+    if logentry.action_type == "pretix_eventparts.waitinglist.promoted":
+        return _("Orders on the waiting list have been assigned to eventparts.")
+    if logentry.action_type == "pretix_eventparts.templates.applied":
+        return _("Eventparts have been created from the organizer's templates.")
+    if logentry.action_type == "pretix_eventparts.selfservice":
+        return _("The customer has chosen eventparts.")
     return None
 
 
+def _eventpart_attribute(type, attribute):
+    @instrumented("layout_text_variables.evaluate")
+    def evaluate(orderposition, order, event):
+        eventpart = eventparts_for_position(orderposition, order)[type]
+        if eventpart is None:
+            return ""
+        return str(getattr(eventpart, attribute))
+
+    return evaluate
+
+
 @receiver(layout_text_variables, dispatch_uid="pretix_eventparts")
+@instrumented("layout_text_variables")
 def ticket_text_variables(**kwargs):
     return {
         "pretix_eventparts_start_type": {
             "label": _("1st Eventpart Type"),
             "editor_sample": _("1st Part Type"),
-            "evaluate": lambda orderposition, order, event: order.eventpart_set.filter(
-                type=EventPart.EventPartTypes.START
-            )
-            .first()
-            .type_name,
+            "evaluate": _eventpart_attribute(
+                EventPart.EventPartTypes.START, "type_name"
+            ),
         },
         "pretix_eventparts_start_name": {
             "label": _("1st Eventpart Name"),
             "editor_sample": _("1st Part Name"),
-            "evaluate": lambda orderposition, order, event: order.eventpart_set.filter(
-                type=EventPart.EventPartTypes.START
-            )
-            .first()
-            .name,
+            "evaluate": _eventpart_attribute(EventPart.EventPartTypes.START, "name"),
         },
         "pretix_eventparts_start_description": {
             "label": _("1st Eventpart Description"),
             "editor_sample": _("Descriptive Text ..."),
-            "evaluate": lambda orderposition, order, event: order.eventpart_set.filter(
-                type=EventPart.EventPartTypes.START
-            )
-            .first()
-            .description,
+            "evaluate": _eventpart_attribute(
+                EventPart.EventPartTypes.START, "description"
+            ),
         },
         "pretix_eventparts_start_category": {
             "label": _("1st Eventpart Category"),
             "editor_sample": _("Category 1"),
-            "evaluate": lambda orderposition, order, event: order.eventpart_set.filter(
-                type=EventPart.EventPartTypes.START
-            )
-            .first()
-            .category,
+            "evaluate": _eventpart_attribute(
+                EventPart.EventPartTypes.START, "category"
+            ),
         },
         "pretix_eventparts_middle_type": {
             "label": _("2nd Eventpart Type"),
             "editor_sample": _("2nd Part Type"),
-            "evaluate": lambda orderposition, order, event: order.eventpart_set.filter(
-                type=EventPart.EventPartTypes.MIDDLE
-            )
-            .first()
-            .type_name,
+            "evaluate": _eventpart_attribute(
+                EventPart.EventPartTypes.MIDDLE, "type_name"
+            ),
         },
         "pretix_eventparts_middle_name": {
             "label": _("2nd Eventpart Name"),
             "editor_sample": _("2nd Part Name"),
-            "evaluate": lambda orderposition, order, event: order.eventpart_set.filter(
-                type=EventPart.EventPartTypes.MIDDLE
-            )
-            .first()
-            .name,
+            "evaluate": _eventpart_attribute(EventPart.EventPartTypes.MIDDLE, "name"),
         },
         "pretix_eventparts_middle_description": {
             "label": _("2nd Eventpart Description"),
             "editor_sample": _("Descriptive Text ..."),
-            "evaluate": lambda orderposition, order, event: order.eventpart_set.filter(
-                type=EventPart.EventPartTypes.MIDDLE
-            )
-            .first()
-            .description,
+            "evaluate": _eventpart_attribute(
+                EventPart.EventPartTypes.MIDDLE, "description"
+            ),
         },
         "pretix_eventparts_middle_category": {
             "label": _("2nd Eventpart Category"),
             "editor_sample": _("Category 2"),
-            "evaluate": lambda orderposition, order, event: order.eventpart_set.filter(
-                type=EventPart.EventPartTypes.MIDDLE
-            )
-            .first()
-            .category,
+            "evaluate": _eventpart_attribute(
+                EventPart.EventPartTypes.MIDDLE, "category"
+            ),
         },
         "pretix_eventparts_end_type": {
             "label": _("3rd Eventpart Type"),
             "editor_sample": _("3rd Part Type"),
-            "evaluate": lambda orderposition, order, event: order.eventpart_set.filter(
-                type=EventPart.EventPartTypes.END
-            )
-            .first()
-            .type_name,
+            "evaluate": _eventpart_attribute(EventPart.EventPartTypes.END, "type_name"),
         },
         "pretix_eventparts_end_name": {
             "label": _("3rd Eventpart Name"),
             "editor_sample": _("3rd Part Name"),
-            "evaluate": lambda orderposition, order, event: order.eventpart_set.filter(
-                type=EventPart.EventPartTypes.END
-            )
-            .first()
-            .name,
+            "evaluate": _eventpart_attribute(EventPart.EventPartTypes.END, "name"),
         },
         "pretix_eventparts_end_description": {
             "label": _("3rd Eventpart Description"),
             "editor_sample": _("Descriptive Text ..."),
-            "evaluate": lambda orderposition, order, event: order.eventpart_set.filter(
-                type=EventPart.EventPartTypes.END
-            )
-            .first()
-            .description,
+            "evaluate": _eventpart_attribute(
+                EventPart.EventPartTypes.END, "description"
+            ),
         },
         "pretix_eventparts_end_category": {
             "label": _("3rd Eventpart Category"),
             "editor_sample": _("Category 3"),
-            "evaluate": lambda orderposition, order, event: order.eventpart_set.filter(
-                type=EventPart.EventPartTypes.END
-            )
-            .first()
-            .category,
+            "evaluate": _eventpart_attribute(EventPart.EventPartTypes.END, "category"),
         },
     }
+
+
+@receiver(
+    [
+        order_paid,
+        order_canceled,
+        order_changed,
+        order_expired,
+        order_reactivated,
+        order_denied,
+    ],
+    dispatch_uid="pretix_eventparts_occupancy",
+)
+@instrumented("order_status")
+def order_occupancy_changed(sender, order, **kwargs):
+    schedule_promotion(sender, update_order_occupancy(order))
+
+
+@receiver(order_changed, dispatch_uid="pretix_eventparts_positions")
+@instrumented("order_changed")
+def order_positions_changed(sender, order, **kwargs):
+    sync_order_assignments(order)
+
+
+@receiver(periodic_task, dispatch_uid="pretix_eventparts_reservations")
+def expire_reservations(sender, **kwargs):
+    clear_expired_reservations()
+
+
+@receiver(periodic_task, dispatch_uid="pretix_eventparts_tickets")
+def regenerate_stale_tickets(sender, **kwargs):
+    schedule_stale_regenerations()
+
+
+@receiver(periodic_task, dispatch_uid="pretix_eventparts_waitinglist")
+def promote_waiting_lists(sender, **kwargs):
+    schedule_waiting_list_promotions()
+
+
+@receiver(periodic_task, dispatch_uid="pretix_eventparts_forecast")
+def refresh_forecasts(sender, **kwargs):
+    schedule_forecast_refreshes()
@@ -0,0 +1,211 @@
+from datetime import timedelta
+from django.core.files.base import ContentFile
+from django.utils.timezone import now
+from i18nfield.strings import LazyI18nString
+from pretix.base.email import get_email_context
+from pretix.base.i18n import language
+from pretix.base.models import CachedFile, Event, Organizer, User
+from pretix.base.services.mail import SendMailException, mail
+from pretix.base.services.tasks import ProfiledEventTask, ProfiledOrganizerUserTask
+from pretix.celery_app import app
+
+from pretix_eventparts.assignments import (
+    CapacityExceeded,
+    apply_auto_assignment,
+    plan_auto_assignment,
+    promote_waiting_list,
+)
+from pretix_eventparts.cloning import apply_templates
+from pretix_eventparts.forecast import refresh_forecast
+from pretix_eventparts.importers import (
+    AssignmentImportError,
+    count_rows,
+    error_report,
+    import_assignments,
+    read_rows,
+)
+from pretix_eventparts.mails import batches, participant_recipients
+from pretix_eventparts.tickets import regenerate_pending_tickets
+
+MAIL_BATCH_SIZE = 500
+
+
+@app.task(base=ProfiledEventTask, bind=True, throws=(CapacityExceeded,))
+def auto_assign(
+    self,
+    event: Event,
+    balance_categories: bool = False,
+    dry_run: bool = False,
+    user: int = None,
+):
+    self.update_state(state="PROGRESS", meta={"value": 0})
+    plan = plan_auto_assignment(event, balance_categories=balance_categories)
+    summary = {
+        "dry_run": dry_run,
+        "assigned": len(plan["assignments"]),
+        "unplaced": plan["unplaced"],
+        "eventparts": plan["eventparts"],
+    }
+    if dry_run:
+        return summary
+
+    try:
+        summary["assigned"] = apply_auto_assignment(
+            event,
+            plan,
+            progress=lambda value: self.update_state(
+                state="PROGRESS", meta={"value": value}
+            ),
+        )
+    except CapacityExceeded as e:
+        # The chunks written before stay, so report what has been done
+        summary["assigned"] = e.assigned
+        summary["full"] = e.eventpart.name
+    event.log_action(
+        "pretix_eventparts.autoassign",
+        user=User.objects.get(pk=user) if user else None,
+        data={
+            "assigned": summary["assigned"],
+            "unplaced": summary["unplaced"],
+            "balance_categories": balance_categories,
+        },
+    )
+    return summary
+
+
+@app.task(base=ProfiledEventTask, bind=True, throws=(AssignmentImportError,))
+def import_assignments_file(
+    self,
+    event: Event,
+    fileid: str,
+    match_by: str = "name",
+    user: int = None,
+    session_key: str = None,
+):
+    self.update_state(state="PROGRESS", meta={"value": 0})
+    cf = CachedFile.objects.get(id=fileid)
+    total = count_rows(cf.file, cf.filename)
+    header, rows = read_rows(cf.file, cf.filename)
+    imported, errors = import_assignments(
+        event,
+        header,
+        rows,
+        match_by=match_by,
+        progress=lambda value: self.update_state(
+            state="PROGRESS", meta={"value": value}
+        ),
+        total=total,
+    )
+    cf.delete()
+
+    report = None
+    if errors:
+        report = CachedFile.objects.create(
+            expires=now() + timedelta(days=1),
+            date=now(),
+            filename="{}_eventparts_import_errors.csv".format(event.slug),
+            type="text/csv",
+            session_key=session_key,
+        )
+        report.file.save("errors.csv", ContentFile(error_report(errors)))
+
+    event.log_action(
+        "pretix_eventparts.import",
+        user=User.objects.get(pk=user) if user else None,
+        data={"imported": imported, "errors": len(errors)},
+    )
+    return {
+        "imported": imported,
+        "errors": len(errors),
+        "report": str(report.id) if report else None,
+    }
+
+
+@app.task(base=ProfiledEventTask, bind=True)
+def send_participant_mails(
+    self,
+    event: Event,
+    eventparts: list,
+    subject: dict,
+    message: dict,
+    user: int = None,
+):
+    """Streams the recipients and hands them to
+    :func:`send_participant_mail_batch` in batches of
+    :data:`MAIL_BATCH_SIZE`."""
+    recipients = 0
+    for batch in batches(participant_recipients(eventparts), MAIL_BATCH_SIZE):
+        send_participant_mail_batch.apply_async(
+            args=(event.pk, batch, subject, message)
+        )
+        recipients += len(batch)
+
+    event.log_action(
+        "pretix_eventparts.mail",
+        user=User.objects.get(pk=user) if user else None,
+        data={
+            "eventparts": eventparts,
+            "subject": subject,
+            "message": message,
+            "recipients": recipients,
+        },
+    )
+    return {"recipients": recipients}
+
+
+@app.task(base=ProfiledEventTask, acks_late=True)
+def send_participant_mail_batch(
+    event: Event, recipients: list, subject: dict, message: dict
+):
+    subject = LazyI18nString(subject)
+    message = LazyI18nString(message)
+    for email, locale in recipients:
+        with language(locale, event.settings.region):
+            try:
+                mail(
+                    email,
+                    subject,
+                    message,
+                    get_email_context(event=event),
+                    event,
+                    locale=locale,
+                )
+            except SendMailException:
+                pass
+
+
+@app.task(base=ProfiledEventTask)
+def regenerate_tickets(event: Event):
+    return regenerate_pending_tickets(event)
+
+
+@app.task(base=ProfiledEventTask)
+def promote_waiting_list_task(event: Event):
+    return promote_waiting_list(event)
+
+
+@app.task(base=ProfiledOrganizerUserTask, bind=True)
+def apply_eventpart_templates(
+    self, organizer: Organizer, user: User, events: list, templates: list
+):
+    templates = list(organizer.eventpart_templates.filter(pk__in=templates))
+    events = list(organizer.events.filter(pk__in=events).order_by("pk"))
+    created = 0
+    for i, event in enumerate(events, start=1):
+        count = apply_templates(event, templates)
+        if count:
+            event.log_action(
+                "pretix_eventparts.templates.applied",
+                user=user,
+                data={"created": count},
+            )
+        created += count
+        self.update_state(
+            state="PROGRESS", meta={"value": round(100 * i / len(events))}
+        )
+    return {"events": len(events), "created": created}
+
+
+@app.task(base=ProfiledOrganizerUserTask)
+def refresh_eventpart_forecast(organizer: Organizer, user: User = None):
+    refresh_forecast(organizer)
@@ -0,0 +1,131 @@
+from datetime import timedelta
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Min
+from django.utils.timezone import now
+from django_scopes import scopes_disabled
+from pretix.base.models import CachedCombinedTicket, CachedTicket, OrderPosition
+
+from pretix_eventparts.models import EventPartAssignment, PendingTicketRegeneration
+
+REGENERATION_DELAY = 60
+TICKET_FIELDS = ("name", "description", "category", "type")
+
+
+def _scheduled_key(event):
+    return "pretix_eventparts:tickets_scheduled:{}".format(event.pk)
+
+
+def _schedule(event):
+    from pretix_eventparts.tasks import regenerate_tickets
+
+    if cache.add(_scheduled_key(event), True, timeout=REGENERATION_DELAY):
+        transaction.on_commit(
+            lambda: regenerate_tickets.apply_async(
+                args=(event.pk,), countdown=REGENERATION_DELAY
+            )
+        )
+
+
+def queue_ticket_regeneration(event, positions=(), orders=()):
+    """Marks the tickets of ``positions`` as outdated, together with the
+    tickets of all positions of ``orders`` that show the eventparts of their
+    order because they are not assigned themselves.
+
+    The tickets are regenerated by a task that runs
+    :data:`REGENERATION_DELAY` seconds after the first change, so a
+    series of changes regenerates every ticket only once.
+    """
+    position_ids = set(positions)
+    with scopes_disabled():
+        if orders:
+            position_ids.update(
+                OrderPosition.objects.filter(order_id__in=set(orders))
+                .exclude(eventpart_assignments__isnull=False)
+                .values_list("pk", flat=True)
+            )
+        if not position_ids:
+            return
+        PendingTicketRegeneration.objects.bulk_create(
+            [
+                PendingTicketRegeneration(event=event, position_id=pk)
+                for pk in position_ids
+            ],
+            ignore_conflicts=True,
+        )
+    _schedule(event)
+
+
+def queue_eventpart_ticket_regeneration(eventpart):
+    """Marks the tickets of everyone assigned to ``eventpart`` as outdated."""
+    with scopes_disabled():
+        rows = list(
+            EventPartAssignment.objects.filter(eventpart=eventpart).values_list(
+                "order_id", "position_id"
+            )
+        )
+    queue_ticket_regeneration(
+        eventpart.event,
+        positions={position_id for order_id, position_id in rows if position_id},
+        orders={order_id for order_id, position_id in rows},
+    )
+
+
+def regenerate_pending_tickets(event, chunk_size=500):
+    """Deletes the cached tickets of all marked positions of ``event`` and of
+    their orders and regenerates the ones that had been generated before.
+
+    Returns the number of tickets that are regenerated.
+    """
+    from pretix.base.services.tickets import generate
+
+    cache.delete(_scheduled_key(event))
+    regenerated = 0
+    with scopes_disabled():
+        while True:
+            position_ids = list(
+                PendingTicketRegeneration.objects.filter(event=event)
+                .order_by("pk")
+                .values_list("position_id", flat=True)[:chunk_size]
+            )
+            if not position_ids:
+                break
+
+            outdated = set()
+            for ticket in CachedTicket.objects.filter(
+                order_position_id__in=position_ids
+            ):
+                outdated.add(
+                    ("orderposition", ticket.order_position_id, ticket.provider)
+                )
+                ticket.delete()
+            for ticket in CachedCombinedTicket.objects.filter(
+                order__all_positions__in=position_ids
+            ).distinct():
+                outdated.add(("order", ticket.order_id, ticket.provider))
+                ticket.delete()
+            PendingTicketRegeneration.objects.filter(
+                position_id__in=position_ids
+            ).delete()
+
+            for model, pk, provider in outdated:
+                generate.apply_async(args=(model, pk, provider))
+            regenerated += len(outdated)
+    return regenerated
+
+
+def schedule_stale_regenerations():
+    """Schedules the regeneration for events whose marked positions have been
+    waiting for much longer than :data:`REGENERATION_DELAY`, e.g. because the
+    cache was cleared."""
+    from pretix_eventparts.tasks import regenerate_tickets
+
+    with scopes_disabled():
+        events = (
+            PendingTicketRegeneration.objects.values("event")
+            .annotate(oldest=Min("created"))
+            .filter(oldest__lt=now() - timedelta(seconds=3 * REGENERATION_DELAY))
+            .values_list("event", flat=True)
+        )
+        for event_id in events:
+            regenerate_tickets.apply_async(args=(event_id,))
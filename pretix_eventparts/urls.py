@@ -1,20 +1,61 @@
 from django.conf.urls import url
+from pretix.api.urls import event_router
 
+from pretix_eventparts.api import (
+    CheckinListEventPartViewSet,
+    EventPartAssignmentViewSet,
+    EventPartViewSet,
+)
 from pretix_eventparts.views import (
     EventPartAssign,
+    EventPartAutoAssign,
     EventPartCreate,
     EventPartDelete,
+    EventPartForecastReport,
+    EventPartImport,
+    EventPartImportProcess,
     EventPartList,
+    EventPartMail,
+    EventPartParticipants,
+    EventPartSelection,
+    EventPartTemplates,
+    EventPartTemplatesApply,
     EventPartUpdate,
+    EventPartWaitingList,
     SettingsView,
 )
 
 urlpatterns = [
+    url(
+        r"^control/organizer/(?P<organizer>[^/]+)/eventparts/forecast$",
+        EventPartForecastReport.as_view(),
+        name="forecast",
+    ),
+    url(
+        r"^control/organizer/(?P<organizer>[^/]+)/eventparts/templates/$",
+        EventPartTemplates.as_view(),
+        name="templates",
+    ),
+    url(
+        r"^control/organizer/(?P<organizer>[^/]+)/eventparts/templates/apply$",
+        EventPartTemplatesApply.as_view(),
+        name="templates.apply",
+    ),
     url(
         r"^control/event/(?P<organizer>[^/]+)/(?P<event>[^/]+)/eventparts/parts/",
         EventPartList.as_view(),
         name="eventpart.list",
     ),
+    url(
+        r"^control/event/(?P<organizer>[^/]+)/(?P<event>[^/]+)/eventparts/part/(?P<eventpart>\d+)/participants$",
+        EventPartParticipants.as_view(),
+        name="eventpart.participants",
+    ),
+    url(
+        r"^control/event/(?P<organizer>[^/]+)/(?P<event>[^/]+)/eventparts/part/(?P<eventpart>\d+)/waitinglist$",
+        EventPartWaitingList.as_view(),
+        name="eventpart.waitinglist",
+    ),
     url(
         r"^control/event/(?P<organizer>[^/]+)/(?P<event>[^/]+)/eventparts/part/(?P<eventpart>\d+)/delete$",
         EventPartDelete.as_view(),
@@ -35,9 +76,49 @@ urlpatterns = [
         EventPartAssign.as_view(),
         name="eventpart.assign",
     ),
+    url(
+        r"^control/event/(?P<organizer>[^/]+)/(?P<event>[^/]+)/eventparts/autoassign$",
+        EventPartAutoAssign.as_view(),
+        name="eventpart.autoassign",
+    ),
+    url(
+        r"^control/event/(?P<organizer>[^/]+)/(?P<event>[^/]+)/eventparts/import$",
+        EventPartImport.as_view(),
+        name="eventpart.import",
+    ),
+    url(
+        r"^control/event/(?P<organizer>[^/]+)/(?P<event>[^/]+)/eventparts/import/(?P<file>[^/]+)/$",
+        EventPartImportProcess.as_view(),
+        name="eventpart.import.process",
+    ),
+    url(
+        r"^control/event/(?P<organizer>[^/]+)/(?P<event>[^/]+)/eventparts/mail$",
+        EventPartMail.as_view(),
+        name="eventpart.mail",
+    ),
     url(
         r"^control/event/(?P<organizer>[^/]+)/(?P<event>[^/]+)/eventparts/settings$",
         SettingsView.as_view(),
         name="eventpart.settings",
     ),
 ]
+
+event_patterns = [
+    url(
+        r"^order/(?P<order>[^/]+)/(?P<secret>[A-Za-z0-9]+)/eventparts/$",
+        EventPartSelection.as_view(),
+        name="order.eventparts",
+    ),
+]
+
+event_router.register(r"eventparts", EventPartViewSet)
+event_router.register(
+    r"eventpart_assignments",
+    EventPartAssignmentViewSet,
+    basename="eventpart_assignments",
+)
+event_router.register(
+    r"checkinlists/(?P<list>\d+)/eventparts",
+    CheckinListEventPartViewSet,
+    basename="checkinlist-eventparts",
+)
@@ -0,0 +1,53 @@
+from django_scopes import scope
+
+from pretix_eventparts.models import EventPart, EventPartAssignment
+
+
+def _assignments_for_order(order):
+    assignments = getattr(order, "_eventpart_assignments", None)
+    if assignments is None:
+        by_type = {t: None for t in EventPart.EventPartTypes.values}
+        by_position = {}
+        with scope(event=order.event):
+            rows = (
+                EventPartAssignment.objects.filter(order=order)
+                .select_related("eventpart")
+                .order_by("position__positionid")
+            )
+            for row in rows:
+                part = row.eventpart
+                part.event = order.event
+                if by_type[row.type] is None:
+                    by_type[row.type] = part
+                if row.position_id:
+                    by_position.setdefault(row.position_id, {})[row.type] = part
+        assignments = by_type, by_position
+        order._eventpart_assignments = assignments
+    return assignments
+
+
+def eventparts_for_order(order):
+    """Returns the eventparts assigned to ``order`` keyed by their type.
+
+    If the positions of the order are assigned to different eventparts,
+    the one of the first position is returned. The assignments are
+    fetched with a single query and memoized on the order instance, so
+    every caller rendering the same order shares the lookup. Types
+    without an assignment map to ``None``.
+    """
+    return _assignments_for_order(order)[0]
+
+
+def eventparts_for_position(position, order=None):
+    """Returns the eventparts assigned to ``position`` keyed by their type.
+
+    Positions without an assignment of their own, e.g. ones that do not
+    grant admission, fall back to the eventparts of their order. Shares
+    the lookup of :func:`eventparts_for_order`.
+    """
+    by_type, by_position = _assignments_for_order(order or position.order)
+    return {**by_type, **by_position.get(position.pk, {})}
+
+
+def clear_eventparts_for_order(order):
+    order.__dict__.pop("_eventpart_assignments", None)
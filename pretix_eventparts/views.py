@@ -1,25 +1,79 @@
+from datetime import date, timedelta
+from django.conf import settings
 from django.contrib import messages
 from django.db import transaction
 from django.http import Http404, HttpResponseRedirect
+from django.shortcuts import get_object_or_404, redirect
 from django.urls import resolve, reverse
 from django.utils.functional import cached_property
+from django.utils.timezone import now
 from django.utils.translation import gettext_lazy as _
-from django.views.generic import FormView, ListView
+from django.views.generic import FormView, ListView, TemplateView
 from django.views.generic.edit import DeleteView
 from django_scopes import scope
-from pretix.base.models import Event, Order
-from pretix.control.permissions import EventPermissionRequiredMixin
+from itertools import islice
+from pretix.base.models import CachedFile, Event, Order
+from pretix.base.views.tasks import AsyncAction
+from pretix.control.permissions import (
+    EventPermissionRequiredMixin,
+    OrganizerPermissionRequiredMixin,
+)
 from pretix.control.views import CreateView, PaginationMixin, UpdateView
 from pretix.control.views.event import EventSettingsFormView, EventSettingsViewMixin
+from pretix.control.views.organizer import OrganizerDetailViewMixin
 from pretix.helpers.models import modelcopy
+from pretix.multidomain.urlreverse import eventreverse
 from pretix.presale.style import regenerate_css
-
+from pretix.presale.views import EventViewMixin
+from pretix.presale.views.order import OrderDetailMixin
+
+from pretix_eventparts.assignments import (
+    CapacityExceeded,
+    promote_waiting_list,
+    schedule_promotion,
+    set_assignments,
+)
+from pretix_eventparts.cache import eventparts_cache
+from pretix_eventparts.cloning import save_as_templates
+from pretix_eventparts.forecast import FORECAST_WINDOW
 from pretix_eventparts.forms import (
+    ApplyTemplatesForm,
     AssignEventPartForm,
+    AssignmentImportForm,
+    AssignmentUploadForm,
+    AutoAssignForm,
     EventPartForm,
+    EventPartSelectionForm,
     EventpartSettingsForm,
+    ParticipantMailForm,
+    SaveTemplatesForm,
+    WaitingListEntryForm,
+)
+from pretix_eventparts.importers import AssignmentImportError, read_rows
+from pretix_eventparts.models import (
+    PARTICIPANTS_PAGE_SIZE,
+    EventPart,
+    EventPartForecast,
+    clear_type_names,
+    type_names,
 )
-from pretix_eventparts.models import EventPart
+from pretix_eventparts.reservations import (
+    active_reservations,
+    available_places,
+    confirm_reservations,
+    order_seats,
+    release_reservations,
+    reserve_eventparts,
+)
+from pretix_eventparts.tasks import (
+    apply_eventpart_templates,
+    auto_assign,
+    import_assignments_file,
+    refresh_eventpart_forecast,
+    send_participant_mails,
+)
+from pretix_eventparts.tickets import TICKET_FIELDS, queue_eventpart_ticket_regeneration
+from pretix_eventparts.utils import eventparts_for_order
 
 
 class EventPartCreate(EventPermissionRequiredMixin, CreateView):
@@ -141,8 +195,19 @@ class EventPartUpdate(EventPermissionRequiredMixin, UpdateView):
                     user=self.request.user,
                     data={k: form.cleaned_data.get(k) for k in form.changed_data},
                 )
+            if set(form.changed_data) & set(TICKET_FIELDS):
+                queue_eventpart_ticket_regeneration(self.object)
             return super().form_valid(form)
 
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx["participants"] = self.object.participant_orders(
+            limit=PARTICIPANTS_PAGE_SIZE + 1
+        )
+        ctx["more_participants"] = len(ctx["participants"]) > PARTICIPANTS_PAGE_SIZE
+        del ctx["participants"][PARTICIPANTS_PAGE_SIZE:]
+        return ctx
+
     def get_success_url(self) -> str:
         return reverse(
             "plugins:pretix_eventparts:eventpart.list",
@@ -159,6 +224,32 @@ class EventPartUpdate(EventPermissionRequiredMixin, UpdateView):
         return super().form_invalid(form)
 
 
+class EventPartParticipants(EventPermissionRequiredMixin, TemplateView):
+    template_name = "pretix_eventparts/eventparts/eventpart_participants.html"
+    permission = "can_view_orders"
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        with scope(event=self.request.event):
+            try:
+                eventpart = self.request.event.eventparts.get(
+                    pk=self.kwargs["eventpart"]
+                )
+            except EventPart.DoesNotExist:
+                raise Http404(_("The requested eventpart does not exist."))
+        after = self.request.GET.get("after", "")
+        orders = eventpart.participant_orders(
+            after=int(after) if after.isdigit() else None,
+            limit=PARTICIPANTS_PAGE_SIZE + 1,
+        )
+        ctx["eventpart"] = eventpart
+        ctx["participants"] = orders[:PARTICIPANTS_PAGE_SIZE]
+        if len(orders) > PARTICIPANTS_PAGE_SIZE:
+            ctx["next_after"] = ctx["participants"][-1].pk
+        ctx["first_page"] = not after
+        return ctx
+
+
 class EventPartList(EventPermissionRequiredMixin, PaginationMixin, ListView):
     model = EventPart
     context_object_name = "eventparts"
@@ -167,16 +258,19 @@ class EventPartList(EventPermissionRequiredMixin, PaginationMixin, ListView):
 
     def get_queryset(self):
         with scope(event=self.request.event):
-            qs = EventPart.objects.filter(event=self.request.event)
+            qs = EventPart.objects.filter(event=self.request.event).with_occupancy()
 
             return qs
 
     def get_context_data(self, **kwargs):
         with scope(event=self.request.event):
             ctx = super().get_context_data(**kwargs)
-            ctx["start"] = self.request.event.settings.eventparts__public_start_name
-            ctx["middle"] = self.request.event.settings.eventparts__public_middle_name
-            ctx["end"] = self.request.event.settings.eventparts__public_end_name
+            for eventpart in ctx["eventparts"]:
+                eventpart.event = self.request.event
+            names = type_names(self.request.event)
+            ctx["start"] = names[EventPart.EventPartTypes.START]
+            ctx["middle"] = names[EventPart.EventPartTypes.MIDDLE]
+            ctx["end"] = names[EventPart.EventPartTypes.END]
             return ctx
 
 
@@ -190,56 +284,476 @@ class EventPartAssign(EventPermissionRequiredMixin, FormView):
         kwargs["event"] = self.request.event
         return kwargs
 
+    @cached_property
+    def order(self):
+        with scope(organizer=self.request.organizer):
+            return get_object_or_404(
+                self.request.event.orders, code=self.kwargs["code"]
+            )
+
     def get_initial(self):
-        with scope(event=self.request.event):
-            url = resolve(self.request.path_info)
-            order = Order.objects.filter(code=url.kwargs["code"]).get()
-
-            initial = {
-                "eventpart_start": order.eventpart_set.filter(
-                    type=EventPart.EventPartTypes.START
-                ).first(),
-                "eventpart_middle": order.eventpart_set.filter(
-                    type=EventPart.EventPartTypes.MIDDLE
-                ).first(),
-                "eventpart_end": order.eventpart_set.filter(
-                    type=EventPart.EventPartTypes.END
-                ).first(),
-            }
-            return initial
+        assigned = eventparts_for_order(self.order)
+        return {"eventpart_" + type: part for type, part in assigned.items()}
 
     @transaction.atomic
     def form_valid(self, form):
         with scope(event=self.request.event):
-            url = resolve(self.request.path_info)
-            order = Order.objects.get(code=url.kwargs["code"])
-            order.eventpart_set.clear()
-            order.eventpart_set.add(
-                form.cleaned_data["eventpart_start"],
-                form.cleaned_data["eventpart_middle"],
-                form.cleaned_data["eventpart_end"],
-            )
+            try:
+                set_assignments(
+                    self.request.event,
+                    {
+                        self.order: {
+                            type: form.cleaned_data["eventpart_" + type]
+                            for type in EventPart.EventPartTypes.values
+                        }
+                    },
+                )
+            except CapacityExceeded as e:
+                form.add_error(None, str(e))
+                return self.form_invalid(form)
             return super().form_valid(form)
 
     def get_success_url(self) -> str:
+        return reverse(
+            "control:event.order",
+            kwargs={
+                "organizer": self.request.event.organizer.slug,
+                "event": self.request.event.slug,
+                "code": self.order.code,
+            },
+        )
+
+    def form_invalid(self, form):
         with scope(event=self.request.event):
-            url = resolve(self.request.path_info)
-            return reverse(
-                "control:event.order",
+            messages.error(
+                self.request,
+                _("We could not save your changes. See below for details."),
+            )
+            return super().form_invalid(form)
+
+
+class EventPartWaitingList(EventPermissionRequiredMixin, FormView):
+    form_class = WaitingListEntryForm
+    template_name = "pretix_eventparts/eventparts/eventpart_waitinglist.html"
+    permission = "can_change_orders"
+
+    @cached_property
+    def eventpart(self):
+        with scope(event=self.request.event):
+            try:
+                return self.request.event.eventparts.get(pk=self.kwargs["eventpart"])
+            except EventPart.DoesNotExist:
+                raise Http404(_("The requested eventpart does not exist."))
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs["eventpart"] = self.eventpart
+        return kwargs
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx["eventpart"] = self.eventpart
+        with scope(event=self.request.event):
+            ctx["entries"] = list(
+                self.eventpart.waiting_list.select_related("order").order_by(
+                    "-priority", "created", "pk"
+                )
+            )
+        return ctx
+
+    def post(self, request, *args, **kwargs):
+        if "delete" in request.POST:
+            with scope(event=request.event):
+                self.eventpart.waiting_list.filter(pk=request.POST["delete"]).delete()
+            messages.success(request, _("The entry has been removed."))
+            return redirect(self.get_success_url())
+        if "promote" in request.POST:
+            with scope(event=request.event):
+                count = promote_waiting_list(request.event)
+            messages.success(
+                request,
+                _("{count} orders have been promoted.").format(count=count),
+            )
+            return redirect(self.get_success_url())
+        return super().post(request, *args, **kwargs)
+
+    def form_valid(self, form):
+        with scope(event=self.request.event):
+            self.eventpart.waiting_list.create(
+                order=form.cleaned_data["order"],
+                priority=form.cleaned_data["priority"],
+            )
+        schedule_promotion(self.request.event, [self.eventpart.pk])
+        messages.success(
+            self.request, _("The order has been added to the waiting list.")
+        )
+        return super().form_valid(form)
+
+    def get_success_url(self):
+        return reverse(
+            "plugins:pretix_eventparts:eventpart.waitinglist",
+            kwargs={
+                "organizer": self.request.event.organizer.slug,
+                "event": self.request.event.slug,
+                "eventpart": self.eventpart.pk,
+            },
+        )
+
+
+class EventPartAutoAssign(EventPermissionRequiredMixin, AsyncAction, FormView):
+    form_class = AutoAssignForm
+    template_name = "pretix_eventparts/eventparts/eventpart_autoassign.html"
+    permission = "can_change_orders"
+    task = auto_assign
+    known_errortypes = ["CapacityExceeded"]
+    preview_session_key = "pretix_eventparts_autoassign_preview"
+
+    def get(self, request, *args, **kwargs):
+        if "async_id" in request.GET and settings.HAS_CELERY:
+            return self.get_result(request)
+        return FormView.get(self, request, *args, **kwargs)
+
+    def form_valid(self, form):
+        return self.do(
+            self.request.event.pk,
+            balance_categories=form.cleaned_data["balance_categories"],
+            dry_run=form.cleaned_data["dry_run"],
+            user=self.request.user.pk,
+        )
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        preview = self.request.session.pop(self.preview_session_key, None)
+        if preview:
+            with scope(event=self.request.event):
+                names = type_names(self.request.event)
+            ctx["preview"] = preview
+            ctx["preview_unplaced"] = [
+                (names[t], n) for t, n in preview["unplaced"].items()
+            ]
+            ctx["preview_eventparts"] = sorted(
+                (
+                    dict(e, type_name=names[e["type"]])
+                    for e in preview["eventparts"].values()
+                ),
+                key=lambda e: (e["type"], e["category"], e["name"]),
+            )
+        return ctx
+
+    def get_success_message(self, value):
+        if value["dry_run"]:
+            return _(
+                "{count} orders would be assigned. No changes have been made yet."
+            ).format(count=value["assigned"])
+        if "full" in value:
+            return _(
+                "{count} orders have been assigned before the eventpart {name} "
+                "filled up in the meantime. Start the assignment again to place "
+                "the remaining orders."
+            ).format(count=value["assigned"], name=value["full"])
+        return _("{count} orders have been assigned.").format(count=value["assigned"])
+
+    def get_success_url(self, value):
+        if value["dry_run"]:
+            self.request.session[self.preview_session_key] = value
+            return self.get_error_url()
+        return reverse(
+            "plugins:pretix_eventparts:eventpart.list",
+            kwargs={
+                "organizer": self.request.event.organizer.slug,
+                "event": self.request.event.slug,
+            },
+        )
+
+    def get_error_url(self):
+        return reverse(
+            "plugins:pretix_eventparts:eventpart.autoassign",
+            kwargs={
+                "organizer": self.request.event.organizer.slug,
+                "event": self.request.event.slug,
+            },
+        )
+
+
+class EventPartImport(EventPermissionRequiredMixin, FormView):
+    form_class = AssignmentUploadForm
+    template_name = "pretix_eventparts/eventparts/eventpart_import.html"
+    permission = "can_change_orders"
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs["event"] = self.request.event
+        return kwargs
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        if self.request.GET.get("report"):
+            ctx["report_url"] = reverse(
+                "cachedfile.download", kwargs={"id": self.request.GET["report"]}
+            )
+        return ctx
+
+    def form_valid(self, form):
+        upload = form.cleaned_data["file"]
+        cf = CachedFile.objects.create(
+            expires=now() + timedelta(days=1),
+            date=now(),
+            filename=upload.name,
+            type=upload.content_type or "application/octet-stream",
+            web_download=False,
+        )
+        cf.file.save(upload.name, upload)
+        return redirect(
+            reverse(
+                "plugins:pretix_eventparts:eventpart.import.process",
                 kwargs={
                     "organizer": self.request.event.organizer.slug,
                     "event": self.request.event.slug,
-                    "code": url.kwargs["code"],
+                    "file": cf.id,
                 },
             )
+        )
 
-    def form_invalid(self, form):
-        with scope(event=self.request.event):
+
+class EventPartImportProcess(EventPermissionRequiredMixin, AsyncAction, FormView):
+    form_class = AssignmentImportForm
+    template_name = "pretix_eventparts/eventparts/eventpart_import_process.html"
+    permission = "can_change_orders"
+    task = import_assignments_file
+    known_errortypes = ["AssignmentImportError"]
+
+    @cached_property
+    def file(self):
+        return get_object_or_404(CachedFile, pk=self.kwargs.get("file"))
+
+    @cached_property
+    def parsed(self):
+        try:
+            header, rows = read_rows(self.file.file, self.file.filename)
+        except AssignmentImportError as e:
+            messages.error(self.request, str(e))
+            return None
+        return header, [
+            [record.get(c, "") for c in header] for line, record in islice(rows, 3)
+        ]
+
+    def dispatch(self, request, *args, **kwargs):
+        if "async_id" in request.GET and settings.HAS_CELERY:
+            return self.get_result(request)
+        if not self.parsed:
+            return redirect(
+                reverse(
+                    "plugins:pretix_eventparts:eventpart.import",
+                    kwargs={
+                        "organizer": request.event.organizer.slug,
+                        "event": request.event.slug,
+                    },
+                )
+            )
+        return super().dispatch(request, *args, **kwargs)
+
+    def get(self, request, *args, **kwargs):
+        return FormView.get(self, request, *args, **kwargs)
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx["header"], ctx["sample_rows"] = self.parsed
+        return ctx
+
+    def form_valid(self, form):
+        if not self.request.session.session_key:
+            self.request.session.cycle_key()
+        return self.do(
+            self.request.event.pk,
+            str(self.file.id),
+            match_by=form.cleaned_data["match_by"],
+            user=self.request.user.pk,
+            session_key=self.request.session.session_key,
+        )
+
+    def get_success_message(self, value):
+        if value["errors"]:
+            return _(
+                "{imported} rows have been imported, {errors} rows failed. "
+                "Please download the error report for details."
+            ).format(**value)
+        return _("{imported} rows have been imported.").format(**value)
+
+    def get_success_url(self, value):
+        if value["report"]:
+            return "{}?report={}".format(
+                reverse(
+                    "plugins:pretix_eventparts:eventpart.import",
+                    kwargs={
+                        "organizer": self.request.event.organizer.slug,
+                        "event": self.request.event.slug,
+                    },
+                ),
+                value["report"],
+            )
+        return reverse(
+            "plugins:pretix_eventparts:eventpart.list",
+            kwargs={
+                "organizer": self.request.event.organizer.slug,
+                "event": self.request.event.slug,
+            },
+        )
+
+    def get_error_url(self):
+        return reverse(
+            "plugins:pretix_eventparts:eventpart.import.process",
+            kwargs={
+                "organizer": self.request.event.organizer.slug,
+                "event": self.request.event.slug,
+                "file": self.file.id,
+            },
+        )
+
+
+class EventPartMail(EventPermissionRequiredMixin, AsyncAction, FormView):
+    form_class = ParticipantMailForm
+    template_name = "pretix_eventparts/eventparts/eventpart_mail.html"
+    permission = "can_change_orders"
+    task = send_participant_mails
+
+    def get(self, request, *args, **kwargs):
+        if "async_id" in request.GET and settings.HAS_CELERY:
+            return self.get_result(request)
+        return FormView.get(self, request, *args, **kwargs)
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs["event"] = self.request.event
+        return kwargs
+
+    def get_initial(self):
+        initial = super().get_initial()
+        if self.request.GET.get("eventpart"):
+            initial["eventparts"] = self.request.GET.getlist("eventpart")
+        return initial
+
+    def form_valid(self, form):
+        return self.do(
+            self.request.event.pk,
+            form.cleaned_data["eventpart_ids"],
+            form.cleaned_data["subject"].data,
+            form.cleaned_data["message"].data,
+            user=self.request.user.pk,
+        )
+
+    def get_success_message(self, value):
+        return _("{recipients} emails have been queued for sending.").format(**value)
+
+    def get_success_url(self, value):
+        return reverse(
+            "plugins:pretix_eventparts:eventpart.list",
+            kwargs={
+                "organizer": self.request.event.organizer.slug,
+                "event": self.request.event.slug,
+            },
+        )
+
+    def get_error_url(self):
+        return reverse(
+            "plugins:pretix_eventparts:eventpart.mail",
+            kwargs={
+                "organizer": self.request.event.organizer.slug,
+                "event": self.request.event.slug,
+            },
+        )
+
+
+class EventPartSelection(EventViewMixin, OrderDetailMixin, FormView):
+    form_class = EventPartSelectionForm
+    template_name = "pretix_eventparts/eventparts/eventpart_selection.html"
+
+    def dispatch(self, request, *args, **kwargs):
+        self.request = request
+        self.kwargs = kwargs
+        if not self.order:
+            raise Http404(
+                _("Unknown order code or not authorized to access this order.")
+            )
+        if not request.event.settings.eventparts__selfservice or (
+            self.order.status not in (Order.STATUS_PENDING, Order.STATUS_PAID)
+        ):
+            messages.error(request, _("You cannot choose eventparts for this order."))
+            return redirect(self.get_order_url())
+        with scope(event=request.event):
+            return super().dispatch(request, *args, **kwargs)
+
+    def get_selection_url(self):
+        return eventreverse(
+            self.request.event,
+            "plugins:pretix_eventparts:order.eventparts",
+            kwargs={"order": self.order.code, "secret": self.order.secret},
+        )
+
+    @cached_property
+    def reservations(self):
+        return active_reservations(self.order)
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs["event"] = self.request.event
+        kwargs["eventparts"] = list(
+            EventPart.objects.filter(event=self.request.event).order_by(
+                "category", "name"
+            )
+        )
+        kwargs["current"] = eventparts_for_order(self.order)
+        kwargs["available"] = available_places(self.request.event)
+        kwargs["seats"] = order_seats(self.order)
+        return kwargs
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx["order"] = self.order
+        ctx["reservations"] = self.reservations
+        if self.reservations:
+            ctx["expires"] = self.reservations[0].expires
+        ctx["settings"] = self.request.event.settings
+        return ctx
+
+    def post(self, request, *args, **kwargs):
+        if "confirm" in request.POST:
+            return self.confirm()
+        if "cancel" in request.POST:
+            release_reservations(self.order)
+            return redirect(self.get_selection_url())
+        return super().post(request, *args, **kwargs)
+
+    def confirm(self):
+        try:
+            eventparts = confirm_reservations(self.order)
+        except CapacityExceeded as e:
+            release_reservations(self.order)
+            messages.error(self.request, str(e))
+            return redirect(self.get_selection_url())
+        if not eventparts:
             messages.error(
                 self.request,
-                _("We could not save your changes. See below for details."),
+                _("Your reservation has expired. Please choose again."),
             )
-            return super().form_invalid(form)
+            return redirect(self.get_selection_url())
+        self.order.log_action(
+            "pretix_eventparts.selfservice",
+            data={e.type: e.pk for e in eventparts},
+        )
+        messages.success(self.request, _("Your choice has been saved."))
+        return redirect(self.get_order_url())
+
+    def form_valid(self, form):
+        changes = form.changes()
+        if not changes:
+            messages.info(self.request, _("You did not change anything."))
+            return redirect(self.get_order_url())
+        try:
+            reserve_eventparts(self.order, list(changes.values()))
+        except CapacityExceeded as e:
+            form.add_error(None, str(e))
+            return self.form_invalid(form)
+        return redirect(self.get_selection_url())
 
 
 class SettingsView(EventSettingsViewMixin, EventSettingsFormView):
@@ -248,11 +762,17 @@ class SettingsView(EventSettingsViewMixin, EventSettingsFormView):
     template_name = "pretix_eventparts/eventparts/settings.html"
     permission = "can_change_settings"
 
+    def post(self, request, *args, **kwargs):
+        self.was_public = request.event.settings.eventparts__public
+        return super().post(request, *args, **kwargs)
+
     def form_success(self):
-        form = self.get_form()
-        if form.is_valid():
+        eventparts_cache(self.request.event).clear()
+        clear_type_names(self.request.event)
 
-            if form.cleaned_data["eventparts__public"] is True:
+        public = self.request.event.settings.eventparts__public
+        if bool(public) != bool(self.was_public):
+            if public:
                 regenerate_css.apply_async(args=(self.request.event.pk,))
                 self.request.event.log_action(
                     "pretix_eventparts.public", user=self.request.user
@@ -271,3 +791,159 @@ class SettingsView(EventSettingsViewMixin, EventSettingsFormView):
                 "event": self.request.event.slug,
             },
         )
+
+
+class EventPartTemplates(
+    OrganizerDetailViewMixin, OrganizerPermissionRequiredMixin, FormView
+):
+    form_class = SaveTemplatesForm
+    template_name = "pretix_eventparts/organizers/templates.html"
+    permission = "can_change_organizer_settings"
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs["organizer"] = self.request.organizer
+        kwargs["request"] = self.request
+        return kwargs
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx["templates"] = self.request.organizer.eventpart_templates.all()
+        return ctx
+
+    def post(self, request, *args, **kwargs):
+        if "delete" in request.POST:
+            request.organizer.eventpart_templates.filter(
+                pk=request.POST["delete"]
+            ).delete()
+            messages.success(request, _("The template has been deleted."))
+            return redirect(self.get_success_url())
+        return super().post(request, *args, **kwargs)
+
+    def form_valid(self, form):
+        count = save_as_templates(form.cleaned_data["event"])
+        messages.success(
+            self.request,
+            _("{count} templates have been created.").format(count=count),
+        )
+        return super().form_valid(form)
+
+    def get_success_url(self):
+        return reverse(
+            "plugins:pretix_eventparts:templates",
+            kwargs={"organizer": self.request.organizer.slug},
+        )
+
+
+class EventPartTemplatesApply(
+    OrganizerDetailViewMixin, OrganizerPermissionRequiredMixin, AsyncAction, FormView
+):
+    form_class = ApplyTemplatesForm
+    template_name = "pretix_eventparts/organizers/templates_apply.html"
+    permission = "can_change_organizer_settings"
+    task = apply_eventpart_templates
+
+    def get(self, request, *args, **kwargs):
+        if "async_id" in request.GET and settings.HAS_CELERY:
+            return self.get_result(request)
+        return FormView.get(self, request, *args, **kwargs)
+
+    def get_form_kwargs(self):
+        kwargs = super().get_form_kwargs()
+        kwargs["organizer"] = self.request.organizer
+        kwargs["request"] = self.request
+        return kwargs
+
+    def form_valid(self, form):
+        return self.do(
+            organizer=self.request.organizer.pk,
+            user=self.request.user.pk,
+            events=[e.pk for e in form.cleaned_data["events"]],
+            templates=[t.pk for t in form.cleaned_data["templates"]],
+        )
+
+    def get_success_message(self, value):
+        return _("{created} eventparts have been created in {events} events.").format(
+            **value
+        )
+
+    def get_success_url(self, value):
+        return reverse(
+            "plugins:pretix_eventparts:templates",
+            kwargs={"organizer": self.request.organizer.slug},
+        )
+
+    def get_error_url(self):
+        return reverse(
+            "plugins:pretix_eventparts:templates.apply",
+            kwargs={"organizer": self.request.organizer.slug},
+        )
+
+
+class EventPartForecastReport(
+    OrganizerDetailViewMixin,
+    OrganizerPermissionRequiredMixin,
+    AsyncAction,
+    TemplateView,
+):
+    template_name = "pretix_eventparts/organizers/forecast.html"
+    permission = "can_change_organizer_settings"
+    task = refresh_eventpart_forecast
+
+    def get(self, request, *args, **kwargs):
+        if "async_id" in request.GET and settings.HAS_CELERY:
+            return self.get_result(request)
+        return TemplateView.get(self, request, *args, **kwargs)
+
+    def post(self, request, *args, **kwargs):
+        return self.do(organizer=request.organizer.pk, user=request.user.pk)
+
+    def get_context_data(self, **kwargs):
+        ctx = super().get_context_data(**kwargs)
+        ctx["window"] = FORECAST_WINDOW
+        try:
+            with scope(organizer=self.request.organizer):
+                snapshot = EventPartForecast.objects.get(
+                    organizer=self.request.organizer
+                )
+        except EventPartForecast.DoesNotExist:
+            return ctx
+        events = self.request.user.get_events_with_permission(
+            "can_view_orders", self.request
+        ).filter(
+            organizer=self.request.organizer,
+            pk__in={r["event"] for r in snapshot.data.get("eventparts", [])},
+        )
+        events = {e.pk: e for e in events}
+        ctx["snapshot"] = snapshot
+
+        def visible(rows):
+            rows = [r for r in rows if r["event"] in events]
+            for r in rows:
+                r["event_date"] = date.fromisoformat(r["event_date"])
+                r["type_name"] = type_names(events[r["event"]])[r["type"]]
+            return sorted(
+                rows,
+                key=lambda r: (
+                    not r["overflow"],
+                    r["days_until_full"] is None,
+                    r["days_until_full"] or 0,
+                    r["event_date"],
+                ),
+            )
+
+        ctx["eventparts"] = visible(snapshot.data.get("eventparts", []))
+        ctx["categories"] = visible(snapshot.data.get("categories", []))
+        return ctx
+
+    def get_success_message(self, value):
+        return _("The forecast has been updated.")
+
+    def get_success_url(self, value):
+        return self.get_error_url()
+
+    def get_error_url(self):
+        return reverse(
+            "plugins:pretix_eventparts:forecast",
+            kwargs={"organizer": self.request.organizer.slug},
+        )
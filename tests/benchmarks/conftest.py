@@ -0,0 +1,174 @@
+import json
+import os
+import pytest
+import statistics
+import time
+from decimal import Decimal
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+from django_scopes import scopes_disabled
+from pretix.base.models import Order, OrderPosition
+
+from pretix_eventparts.models import EventPart, EventPartAssignment
+from pretix_eventparts.occupancy import update_occupancy
+
+BASELINE = os.path.join(os.path.dirname(__file__), "baseline.json")
+RESULTS = os.environ.get(
+    "EVENTPARTS_BENCHMARK_RESULTS",
+    os.path.join(os.path.dirname(__file__), "results.json"),
+)
+PARTS = int(os.environ.get("EVENTPARTS_BENCHMARK_PARTS", 5))
+ORDERS = int(os.environ.get("EVENTPARTS_BENCHMARK_ORDERS", 200))
+POSITIONS = int(os.environ.get("EVENTPARTS_BENCHMARK_POSITIONS", 2))
+ROUNDS = int(os.environ.get("EVENTPARTS_BENCHMARK_ROUNDS", 5))
+# Wall times differ too much between machines to be compared by default
+MAX_SLOWDOWN = os.environ.get("EVENTPARTS_BENCHMARK_MAX_SLOWDOWN")
+
+
+def _scale():
+    return {"parts": PARTS, "orders": ORDERS, "positions": POSITIONS}
+
+
+def _load_baseline():
+    if not os.path.exists(BASELINE):
+        return {}
+    with open(BASELINE) as f:
+        baseline = json.load(f)
+    if baseline.get("scale") != _scale():
+        return {}
+    return baseline["results"]
+
+
+@pytest.fixture(scope="session")
+def benchmark_results():
+    results = {}
+    yield results
+    if not results:
+        return
+    data = {"scale": _scale(), "results": results}
+    with open(RESULTS, "w") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    if os.environ.get("EVENTPARTS_BENCHMARK_SAVE_BASELINE"):
+        with open(BASELINE, "w") as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+
+
+@pytest.fixture
+def benchmark(request, benchmark_results):
+    """Runs a function ``ROUNDS`` times and records the number of queries of
+    the last round and the wall times.
+
+    The query count must not exceed the one in ``baseline.json`` for the
+    same dataset size. If ``EVENTPARTS_BENCHMARK_MAX_SLOWDOWN`` is set,
+    the median wall time may not exceed the baseline by more than that
+    factor either.
+    """
+    name = request.node.name.replace("test_", "", 1)
+
+    def run(func):
+        timings = []
+        for i in range(ROUNDS):
+            with CaptureQueriesContext(connection) as ctx:
+                start = time.perf_counter()
+                func()
+                timings.append(time.perf_counter() - start)
+        result = {
+            "queries": len(ctx),
+            "median": statistics.median(timings),
+            "min": min(timings),
+        }
+        benchmark_results[name] = result
+
+        expected = _load_baseline().get(name)
+        if expected:
+            assert (
+                result["queries"] <= expected["queries"]
+            ), "{} needs {} queries, the baseline is {}".format(
+                name, result["queries"], expected["queries"]
+            )
+            if MAX_SLOWDOWN:
+                assert result["median"] <= expected["median"] * float(
+                    MAX_SLOWDOWN
+                ), "{} takes {:.4f}s, the baseline is {:.4f}s".format(
+                    name, result["median"], expected["median"]
+                )
+        return result
+
+    return run
+
+
+@pytest.fixture
+@scopes_disabled()
+def dataset(event, item):
+    """Creates ``PARTS`` eventparts per type and ``ORDERS`` paid orders with
+    ``POSITIONS`` admission positions each, spread evenly over the parts."""
+    event.settings.eventparts__public = True
+    EventPart.objects.bulk_create(
+        [
+            EventPart(
+                event=event,
+                name="{} {}".format(type, i),
+                type=type,
+                category="Category {}".format(i % 3),
+                capacity=ORDERS * POSITIONS,
+            )
+            for type in EventPart.EventPartTypes.values
+            for i in range(PARTS)
+        ]
+    )
+    parts = list(EventPart.objects.filter(event=event).order_by("pk"))
+
+    Order.objects.bulk_create(
+        [
+            Order(
+                code="BENCH{:05d}".format(i),
+                event=event,
+                email="bench{}@dummy.test".format(i),
+                status=Order.STATUS_PAID,
+                datetime=now(),
+                expires=now(),
+                total=Decimal("23.00") * POSITIONS,
+                locale="en",
+            )
+            for i in range(ORDERS)
+        ]
+    )
+    orders = list(Order.objects.filter(event=event).order_by("pk"))
+    OrderPosition.objects.bulk_create(
+        [
+            OrderPosition(
+                order=order,
+                item=item,
+                price=Decimal("23.00"),
+                tax_rate=Decimal("0.00"),
+                tax_value=Decimal("0.00"),
+                positionid=i + 1,
+                secret="bench{}-{}".format(order.pk, i),
+                pseudonymization_id="B{}-{}".format(order.pk, i),
+            )
+            for order in orders
+            for i in range(POSITIONS)
+        ]
+    )
+
+    by_type = {
+        type: [p for p in parts if p.type == type]
+        for type in EventPart.EventPartTypes.values
+    }
+    EventPartAssignment.objects.bulk_create(
+        [
+            EventPartAssignment(
+                order_id=order_id,
+                position_id=position_id,
+                eventpart=candidates[order_id % PARTS],
+                type=type,
+            )
+            for order_id, position_id in OrderPosition.objects.filter(
+                order__event=event
+            ).values_list("order_id", "pk")
+            for type, candidates in by_type.items()
+        ]
+    )
+    update_occupancy(p.pk for p in parts)
+    return {"parts": parts, "orders": orders}
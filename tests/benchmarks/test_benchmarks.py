@@ -0,0 +1,106 @@
+import pytest
+from django_scopes import scopes_disabled
+from pretix.base.models import Order
+
+from pretix_eventparts.assignments import plan_auto_assignment, set_assignments
+from pretix_eventparts.models import EventPart
+from pretix_eventparts.signals import (
+    order_eventpart_selection,
+    order_eventpart_selection_public,
+    ticket_text_variables,
+)
+
+
+def _fresh_order(dataset):
+    return Order.objects.select_related("event").get(pk=dataset["orders"][0].pk)
+
+
+def _order_request(rf, event):
+    request = rf.get("/")
+    request.event = event
+    request.eventpermset = set()
+    return request
+
+
+@pytest.mark.django_db
+def test_eventpart_list(benchmark, dataset, logged_in_client, event):
+    url = "/control/event/{}/{}/eventparts/parts/".format(
+        event.organizer.slug, event.slug
+    )
+    benchmark(lambda: logged_in_client.get(url))
+
+
+@pytest.mark.django_db
+def test_used_places(benchmark, dataset):
+    def run():
+        with scopes_disabled():
+            for part in EventPart.objects.all():
+                part.used_places()
+
+    benchmark(run)
+
+
+@pytest.mark.django_db
+def test_used_places_annotated(benchmark, dataset):
+    def run():
+        with scopes_disabled():
+            for part in EventPart.objects.with_occupancy():
+                part.used_places()
+
+    benchmark(run)
+
+
+@pytest.mark.django_db
+def test_order_info(benchmark, dataset, rf, event):
+    request = _order_request(rf, event)
+
+    def run():
+        with scopes_disabled():
+            order_eventpart_selection(event, _fresh_order(dataset), request)
+
+    benchmark(run)
+
+
+@pytest.mark.django_db
+def test_order_info_public(benchmark, dataset, rf, event):
+    request = _order_request(rf, event)
+
+    def run():
+        with scopes_disabled():
+            order_eventpart_selection_public(event, _fresh_order(dataset), request)
+
+    benchmark(run)
+
+
+@pytest.mark.django_db
+def test_ticket_text_variables(benchmark, dataset, event):
+    variables = ticket_text_variables(sender=event)
+
+    def run():
+        with scopes_disabled():
+            order = _fresh_order(dataset)
+            for position in order.positions.all():
+                for v in variables.values():
+                    v["evaluate"](position, order, order.event)
+
+    benchmark(run)
+
+
+@pytest.mark.django_db
+def test_set_assignments(benchmark, dataset, event):
+    parts = [p for p in dataset["parts"] if p.type == EventPart.EventPartTypes.START]
+    rounds = iter(range(1000))
+
+    def run():
+        part = parts[next(rounds) % len(parts)]
+        with scopes_disabled():
+            set_assignments(
+                event, {order: {part.type: part} for order in dataset["orders"][:50]}
+            )
+
+    benchmark(run)
+
+
+@pytest.mark.django_db
+def test_plan_auto_assignment(benchmark, dataset, event):
+    benchmark(lambda: plan_auto_assignment(event))
@@ -1 +1,128 @@
-# put your pytest fixtures here
+import datetime
+import pytest
+from decimal import Decimal
+from django.utils.timezone import now
+from django_scopes import scopes_disabled
+from pretix.base.models import Event, Order, OrderPosition, Organizer, Team, User
+
+from pretix_eventparts.assignments import set_assignments
+from pretix_eventparts.models import EventPart
+
+
+@pytest.fixture
+@scopes_disabled()
+def organizer():
+    return Organizer.objects.create(name="Dummy", slug="dummy")
+
+
+@pytest.fixture
+@scopes_disabled()
+def event(organizer):
+    return Event.objects.create(
+        organizer=organizer,
+        name="Dummy",
+        slug="dummy",
+        date_from=now(),
+        plugins="pretix_eventparts",
+    )
+
+
+@pytest.fixture
+@scopes_disabled()
+def item(event):
+    return event.items.create(
+        name="Ticket", default_price=Decimal("23.00"), admission=True
+    )
+
+
+@pytest.fixture
+@scopes_disabled()
+def user(organizer, event):
+    user = User.objects.create_user("dummy@dummy.dummy", "dummy")
+    team = Team.objects.create(
+        organizer=organizer,
+        can_change_items=True,
+        can_change_event_settings=True,
+        can_view_orders=True,
+        can_change_orders=True,
+    )
+    team.members.add(user)
+    team.limit_events.add(event)
+    return user
+
+
+@pytest.fixture
+def logged_in_client(client, user):
+    client.login(email="dummy@dummy.dummy", password="dummy")
+    return client
+
+
+@pytest.fixture
+def make_order(event, item):
+    counter = {"i": 0}
+
+    @scopes_disabled()
+    def _make_order(positions=1, status=Order.STATUS_PAID):
+        counter["i"] += 1
+        order = Order.objects.create(
+            code="FOO{:05d}".format(counter["i"]),
+            event=event,
+            email="dummy{}@dummy.test".format(counter["i"]),
+            status=status,
+            datetime=now(),
+            expires=now() + datetime.timedelta(days=10),
+            total=Decimal("23.00") * positions,
+            locale="en",
+        )
+        for i in range(positions):
+            OrderPosition.objects.create(
+                order=order,
+                item=item,
+                variation=None,
+                price=Decimal("23.00"),
+                positionid=i + 1,
+            )
+        return order
+
+    return _make_order
+
+
+@pytest.fixture
+def make_eventpart(event):
+    @scopes_disabled()
+    def _make_eventpart(
+        name="Part", type=EventPart.EventPartTypes.START, capacity=10, category=""
+    ):
+        return EventPart.objects.create(
+            event=event, name=name, type=type, capacity=capacity, category=category
+        )
+
+    return _make_eventpart
+
+
+@pytest.fixture
+def assign(event):
+    @scopes_disabled()
+    def _assign(order, *eventparts):
+        set_assignments(event, {order: {e.type: e for e in eventparts}})
+
+    return _assign
+
+
+@pytest.fixture
+@scopes_disabled()
+def token_client(organizer, event):
+    from rest_framework.test import APIClient
+
+    team = Team.objects.create(
+        organizer=organizer,
+        can_change_items=True,
+        can_view_orders=True,
+        can_change_orders=True,
+    )
+    team.limit_events.add(event)
+    client = APIClient()
+    client.credentials(
+        HTTP_AUTHORIZATION="Token " + team.tokens.create(name="Foo").token
+    )
+    return client
@@ -0,0 +1,98 @@
+import pytest
+from django_scopes import scopes_disabled
+
+from pretix_eventparts.models import EventPart
+
+
+def _url(event, path):
+    return "/api/v1/organizers/{}/events/{}/{}".format(
+        event.organizer.slug, event.slug, path
+    )
+
+
+@pytest.mark.django_db
+def test_list_and_create_eventparts(
+    token_client, event, make_eventpart, make_order, assign
+):
+    with scopes_disabled():
+        part = make_eventpart(name="Bus", capacity=5)
+        assign(make_order(positions=2), part)
+
+    response = token_client.get(_url(event, "eventparts/"))
+    assert response.status_code == 200
+    assert response.data["results"] == [
+        {
+            "id": part.pk,
+            "name": "Bus",
+            "description": {"en": ""},
+            "category": "",
+            "type": "start",
+            "capacity": 5,
+            "occupancy": 2,
+        }
+    ]
+
+    response = token_client.post(
+        _url(event, "eventparts/"),
+        {"name": "Train", "type": "end", "capacity": 3},
+        format="json",
+    )
+    assert response.status_code == 201
+    with scopes_disabled():
+        assert event.eventparts.get(name="Train").type == "end"
+
+    url = _url(event, "eventparts/{}/".format(part.pk))
+    response = token_client.patch(url, {"type": "end"}, format="json")
+    assert response.status_code == 400
+    assert "cannot be changed" in str(response.data["type"])
+    response = token_client.patch(url, {"type": "start", "capacity": 6}, format="json")
+    assert response.status_code == 200
+
+
+@pytest.mark.django_db
+def test_assignment_endpoints(token_client, event, make_eventpart, make_order, assign):
+    with scopes_disabled():
+        bus = make_eventpart(name="Bus")
+        train = make_eventpart(name="Train")
+        dinner = make_eventpart(name="Dinner", type=EventPart.EventPartTypes.END)
+        first, second = make_order(), make_order()
+        assign(first, bus)
+
+    response = token_client.get(_url(event, "eventpart_assignments/"))
+    assert response.status_code == 200
+    assert response.data["results"][0] == {
+        "order": first.code,
+        "start": bus.pk,
+        "middle": None,
+        "end": None,
+    }
+
+    response = token_client.patch(
+        _url(event, "eventpart_assignments/{}/".format(first.code)),
+        {"start": train.pk},
+        format="json",
+    )
+    assert response.status_code == 200
+    assert response.data["start"] == train.pk
+
+    response = token_client.post(
+        _url(event, "eventpart_assignments/bulk/"),
+        {
+            first.code: {"end": dinner.pk},
+            second.code: {"start": bus.pk, "end": dinner.pk},
+        },
+        format="json",
+    )
+    assert response.status_code == 200
+    with scopes_disabled():
+        assert set(first.eventpart_set.all()) == {train, dinner}
+        assert set(second.eventpart_set.all()) == {bus, dinner}
+        assert dinner.occupancy_counter.paid == 2
+
+    response = token_client.post(
+        _url(event, "eventpart_assignments/bulk/"),
+        {first.code: {"start": dinner.pk}, "UNKNOWN": {}},
+        format="json",
+    )
+    assert response.status_code == 400
+    assert set(response.data) == {first.code, "UNKNOWN"}
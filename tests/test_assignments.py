@@ -0,0 +1,206 @@
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from django.db import connection
+from django_scopes import scopes_disabled
+from pretix.base.models import Order, OrderPosition
+
+from pretix_eventparts.assignments import (
+    CapacityExceeded,
+    apply_auto_assignment,
+    plan_auto_assignment,
+    set_assignments,
+    sync_order_assignments,
+)
+from pretix_eventparts.models import EventPart
+from pretix_eventparts.utils import eventparts_for_order, eventparts_for_position
+
+
+@pytest.mark.django_db
+def test_auto_assignment_respects_capacity(event, make_eventpart, make_order, assign):
+    with scopes_disabled():
+        small = make_eventpart(name="A", capacity=3)
+        large = make_eventpart(name="B", capacity=4)
+        end = make_eventpart(name="End", type=EventPart.EventPartTypes.END)
+        orders = [make_order(positions=2) for _ in range(4)]
+        make_order(status=Order.STATUS_PENDING)
+        assign(orders[0], large)
+
+        plan = plan_auto_assignment(event)
+        assert plan["unplaced"] == {"start": 1, "end": 0}
+        apply_auto_assignment(event, plan, chunk_size=2)
+
+        assert small.used_places() == 2
+        assert large.used_places() == 4
+        assert end.used_places() == 8
+        assert large.occupancy_counter.paid == 4
+        assert plan_auto_assignment(event)["assignments"] == []
+
+
+@pytest.mark.django_db
+def test_capacity_zero_means_unlimited(event, make_eventpart, make_order):
+    with scopes_disabled():
+        part = make_eventpart(capacity=0)
+        set_assignments(event, {make_order(positions=3): {"start": part}})
+        for _ in range(3):
+            make_order(positions=2)
+
+        plan = plan_auto_assignment(event)
+        assert plan["unplaced"] == {"start": 0}
+        apply_auto_assignment(event, plan)
+        assert part.used_places() == 9
+
+
+@pytest.mark.django_db
+def test_auto_assignment_balances_categories(event, make_eventpart, make_order):
+    with scopes_disabled():
+        bus = make_eventpart(name="Bus", category="Shuttle", capacity=10)
+        train = make_eventpart(name="Train", category="Rail", capacity=10)
+        for _ in range(4):
+            make_order()
+
+        plan = plan_auto_assignment(event, balance_categories=True)
+        assert plan["eventparts"][bus.pk]["after"] == 2
+        assert plan["eventparts"][train.pk]["after"] == 2
+
+
+@pytest.mark.django_db
+def test_auto_assignment_counts_what_it_writes(event, make_eventpart, make_order):
+    with scopes_disabled():
+        bus = make_eventpart(name="Bus", capacity=4)
+        first, second = make_order(positions=2), make_order(positions=2)
+        plan = plan_auto_assignment(event)
+        assert len(plan["assignments"]) == 2
+
+        # Assigned by hand while the plan was waiting to be applied
+        set_assignments(event, {first: {"start": make_eventpart(name="Train")}})
+        assert apply_auto_assignment(event, plan, chunk_size=1) == 1
+        assert eventparts_for_order(first)["start"].name == "Train"
+        assert eventparts_for_order(second)["start"] == bus
+        assert bus.used_places() == 2
+
+
+@pytest.mark.django_db
+def test_auto_assignment_keeps_chunks_written_before_a_part_fills_up(
+    event, make_eventpart, make_order
+):
+    with scopes_disabled():
+        bus = make_eventpart(name="Bus", capacity=6)
+        for _ in range(3):
+            make_order(positions=2)
+        plan = plan_auto_assignment(event)
+
+        set_assignments(event, {make_order(positions=2): {"start": bus}})
+        with pytest.raises(CapacityExceeded) as e:
+            apply_auto_assignment(event, plan, chunk_size=1)
+        assert e.value.assigned == 2
+        assert bus.used_places() == 6
+
+
+@pytest.mark.django_db
+def test_auto_assignment_dry_run(logged_in_client, event, make_eventpart, make_order):
+    with scopes_disabled():
+        part = make_eventpart()
+        make_order()
+
+    url = "/control/event/{}/{}/eventparts/autoassign".format(
+        event.organizer.slug, event.slug
+    )
+    response = logged_in_client.post(url, {"dry_run": "on"}, follow=True)
+    assert response.status_code == 200
+    assert "1 assignment would be made" in response.content.decode()
+    with scopes_disabled():
+        assert part.used_places() == 0
+
+    logged_in_client.post(url, {}, follow=True)
+    with scopes_disabled():
+        assert part.used_places() == 1
+
+
+@pytest.mark.django_db
+def test_assignment_rejects_full_eventpart(event, make_eventpart, make_order):
+    with scopes_disabled():
+        part = make_eventpart(capacity=3)
+        set_assignments(event, {make_order(positions=2): {"start": part}})
+        with pytest.raises(CapacityExceeded):
+            set_assignments(event, {make_order(positions=2): {"start": part}})
+        assert part.used_places() == 2
+
+
+@pytest.mark.django_db
+def test_canceled_orders_do_not_take_up_places(event, make_eventpart, make_order):
+    with scopes_disabled():
+        part = make_eventpart(capacity=2)
+        for status in (Order.STATUS_CANCELED, Order.STATUS_EXPIRED):
+            order = make_order(positions=2)
+            set_assignments(event, {order: {"start": part}})
+            order.status = status
+            order.save()
+        set_assignments(event, {make_order(positions=2): {"start": part}})
+        assert part.used_places() == 2
+
+
+@pytest.mark.django_db(transaction=True)
+def test_concurrent_assignments_never_exceed_capacity(
+    event, make_eventpart, make_order
+):
+    if connection.vendor != "postgresql":
+        pytest.skip("SQLite has no row locks and rejects concurrent writers")
+    with scopes_disabled():
+        part = make_eventpart(capacity=5)
+        orders = [make_order() for _ in range(25)]
+
+    def attempt(order):
+        try:
+            with scopes_disabled():
+                set_assignments(event, {order: {"start": part}})
+            return True
+        except CapacityExceeded:
+            return False
+        finally:
+            connection.close()
+
+    with ThreadPoolExecutor(max_workers=10) as pool:
+        results = list(pool.map(attempt, orders))
+
+    with scopes_disabled():
+        assert part.used_places() == sum(results) == 5
+
+
+@pytest.mark.django_db
+def test_positions_without_admission_cannot_be_assigned(
+    event, make_eventpart, make_order
+):
+    with scopes_disabled():
+        part = make_eventpart()
+        order = make_order()
+        shirt = event.items.create(
+            name="Shirt", default_price=Decimal("10.00"), admission=False
+        )
+        position = order.all_positions.create(
+            item=shirt, price=Decimal("10.00"), positionid=2
+        )
+
+        with pytest.raises(ValueError):
+            set_assignments(event, {position: {"start": part}})
+        assert part.used_places() == 0
+
+
+@pytest.mark.django_db
+def test_positions_can_be_assigned_individually(event, make_eventpart, make_order):
+    with scopes_disabled():
+        bus = make_eventpart(name="Bus")
+        train = make_eventpart(name="Train")
+        order = make_order(positions=3)
+        first, second, third = order.positions.order_by("positionid")
+
+        set_assignments(event, {order: {"start": bus}})
+        set_assignments(event, {second: {"start": train}})
+        assert (bus.used_places(), train.used_places()) == (2, 1)
+        assert eventparts_for_position(second)["start"] == train
+        assert eventparts_for_order(order)["start"] == bus
+
+        OrderPosition.all.filter(pk=third.pk).update(canceled=True)
+        sync_order_assignments(order)
+        assert (bus.used_places(), train.used_places()) == (1, 1)
+        assert bus.occupancy_counter.paid == 1
@@ -0,0 +1,99 @@
+import pytest
+from django.test import override_settings
+from django_scopes import scopes_disabled
+
+from pretix_eventparts.cache import checkin_cache_key, eventparts_cache
+from pretix_eventparts.checkin import checkin_data, checkin_list_members
+
+
+def _url(event, checkinlist):
+    return "/api/v1/organizers/{}/events/{}/checkinlists/{}/eventparts/".format(
+        event.organizer.slug, event.slug, checkinlist.pk
+    )
+
+
+@pytest.mark.django_db
+def test_checkin_list_filtered_by_eventpart(
+    token_client, event, make_eventpart, make_order, assign
+):
+    with scopes_disabled():
+        bus = make_eventpart(name="Bus")
+        train = make_eventpart(name="Train")
+        first, second = make_order(positions=2), make_order()
+        make_order()
+        assign(first, bus)
+        assign(second, train)
+        checkinlist = event.checkin_lists.create(name="Shuttle", all_products=True)
+        bus.checkin_lists.add(checkinlist)
+        unfiltered = event.checkin_lists.create(name="Main", all_products=True)
+
+    response = token_client.get(_url(event, checkinlist))
+    assert response.status_code == 200
+    assert [(p["order"], p["positionid"]) for p in response.data["results"]] == [
+        (first.code, 1),
+        (first.code, 2),
+    ]
+    assert response.data["results"][0]["eventparts"] == {
+        "start": bus.pk,
+        "middle": None,
+        "end": None,
+    }
+
+    response = token_client.get(_url(event, unfiltered))
+    assert len(response.data["results"]) == 4
+
+    with scopes_disabled():
+        assign(second, bus)
+        assert len(checkin_list_members(checkinlist)) == 3
+        assert checkin_list_members(unfiltered) is None
+
+
+@pytest.mark.django_db
+def test_edit_eventpart_checkin_lists(logged_in_client, event, make_eventpart):
+    with scopes_disabled():
+        part = make_eventpart(name="Bus")
+        checkinlist = event.checkin_lists.create(name="Shuttle", all_products=True)
+    url = "/control/event/{}/{}/eventparts/part/{}/".format(
+        event.organizer.slug, event.slug, part.pk
+    )
+    assert "Shuttle" in logged_in_client.get(url).content.decode()
+    logged_in_client.post(
+        url,
+        {
+            "name": "Bus",
+            "description_0": "Shuttle to the kickoff",
+            "category": "Shuttle",
+            "type": "start",
+            "capacity": 10,
+            "checkin_lists": [checkinlist.pk],
+        },
+    )
+    with scopes_disabled():
+        assert list(part.checkin_lists.all()) == [checkinlist]
+        assert checkin_list_members(checkinlist) == frozenset()
+
+
+@pytest.mark.django_db
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+def test_checkin_data_is_cached_per_list(event, make_eventpart, make_order, assign):
+    with scopes_disabled():
+        bus = make_eventpart(name="Bus")
+        train = make_eventpart(name="Train")
+        first, second = make_order(), make_order()
+        assign(first, bus)
+        assign(second, train)
+        shuttle = event.checkin_lists.create(name="Shuttle", all_products=True)
+        bus.checkin_lists.add(shuttle)
+        main = event.checkin_lists.create(name="Main", all_products=True)
+
+        assert list(checkin_data(shuttle)["positions"]) == [first.positions.get().pk]
+        cache = eventparts_cache(event)
+        assert cache.get(checkin_cache_key(main.pk)) is None
+        assert len(checkin_data(main)["positions"]) == 2
+
+        assign(second, bus)
+        assert cache.get(checkin_cache_key(shuttle.pk)) is None
+        assert cache.get(checkin_cache_key(main.pk)) is None
+        assert len(checkin_list_members(shuttle)) == 2
@@ -0,0 +1,84 @@
+import pytest
+from django.utils.timezone import now
+from django_scopes import scopes_disabled
+from pretix.base.models import Event, Team
+
+from pretix_eventparts.cloning import save_as_templates
+from pretix_eventparts.models import EventPart
+
+
+def _parts(event):
+    return sorted(
+        EventPart.objects.filter(event=event).values_list("name", "type", "capacity")
+    )
+
+
+@pytest.mark.django_db
+def test_event_copy_copies_eventparts_and_checkin_lists(
+    organizer, event, make_eventpart
+):
+    with scopes_disabled():
+        bus = make_eventpart(name="Bus", capacity=40)
+        make_eventpart(name="Closing", type=EventPart.EventPartTypes.END)
+        shuttle = event.checkin_lists.create(name="Shuttle", all_products=True)
+        bus.checkin_lists.add(shuttle)
+
+        clone = Event.objects.create(
+            organizer=organizer, name="Clone", slug="clone", date_from=now()
+        )
+        clone.copy_data_from(event)
+
+        assert _parts(clone) == _parts(event)
+        copied = EventPart.objects.get(event=clone, name="Bus")
+        assert [cl.name for cl in copied.checkin_lists.all()] == ["Shuttle"]
+        assert copied.checkin_lists.get().event == clone
+
+
+@pytest.fixture
+def other_event(organizer, user):
+    with scopes_disabled():
+        other = Event.objects.create(
+            organizer=organizer,
+            name="Other",
+            slug="other",
+            date_from=now(),
+            plugins="pretix_eventparts",
+        )
+        team = Team.objects.create(
+            organizer=organizer,
+            can_change_items=True,
+            can_change_organizer_settings=True,
+        )
+        team.members.add(user)
+        team.limit_events.add(other)
+    return other
+
+
+@pytest.mark.django_db
+def test_apply_templates_to_events(
+    logged_in_client, organizer, event, other_event, make_eventpart
+):
+    with scopes_disabled():
+        make_eventpart(name="Bus", capacity=40)
+        make_eventpart(name="Closing", type=EventPart.EventPartTypes.END)
+        EventPart.objects.create(event=other_event, name="Bus", capacity=5)
+    url = "/control/organizer/{}/eventparts/templates/".format(organizer.slug)
+
+    assert logged_in_client.get(url).status_code == 200
+    logged_in_client.post(url, {"event": event.pk})
+    with scopes_disabled():
+        templates = list(organizer.eventpart_templates.all())
+        assert sorted(t.name for t in templates) == ["Bus", "Closing"]
+        assert save_as_templates(event) == 0
+
+    response = logged_in_client.post(
+        url + "apply",
+        {
+            "templates": [t.pk for t in templates],
+            "events": [event.pk, other_event.pk],
+        },
+    )
+    assert response.status_code == 302
+    with scopes_disabled():
+        assert _parts(event) == [("Bus", "start", 40), ("Closing", "end", 10)]
+        assert _parts(other_event) == [("Bus", "start", 5), ("Closing", "end", 10)]
@@ -0,0 +1,30 @@
+import pytest
+from django_scopes import scopes_disabled
+from pretix.base.models import Order
+
+from pretix_eventparts.exporters import EventPartAssignmentExporter
+from pretix_eventparts.models import EventPart
+
+
+@pytest.mark.django_db
+def test_assignment_export_csv(event, make_eventpart, make_order, assign):
+    with scopes_disabled():
+        order = make_order(positions=2)
+        assign(
+            order,
+            make_eventpart(name="Bus"),
+            make_eventpart(name="Dinner", type=EventPart.EventPartTypes.END),
+        )
+        make_order(status=Order.STATUS_PENDING)
+
+        exporter = EventPartAssignmentExporter(event, event.organizer)
+        filename, content_type, data = exporter.render(
+            {"_format": "default", "paid_only": True}
+        )
+
+    assert filename == "dummy_eventparts.csv"
+    lines = data.decode().strip().splitlines()
+    assert lines[0].endswith('"Start","Middle","End"')
+    assert len(lines) == 3
+    assert lines[1].startswith('"{}",1,"paid"'.format(order.code))
+    assert lines[2].endswith('"Bus","","Dinner"')
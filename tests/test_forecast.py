@@ -0,0 +1,89 @@
+import pytest
+from datetime import timedelta
+from django.utils.timezone import now
+from django_scopes import scopes_disabled
+from pretix.base.models import Order, Team
+
+from pretix_eventparts.forecast import compute_forecast
+from pretix_eventparts.models import EventPartAssignment
+
+
+@pytest.fixture
+def upcoming(event):
+    event.date_from = now() + timedelta(days=30)
+    event.save()
+    return event
+
+
+def _backdate(order, days):
+    EventPartAssignment.objects.filter(order=order).update(
+        assigned_at=now() - timedelta(days=days)
+    )
+
+
+@pytest.mark.django_db
+def test_forecast_extrapolates_recent_assignments(
+    organizer, upcoming, make_eventpart, make_order, assign
+):
+    with scopes_disabled():
+        bus = make_eventpart(name="Bus", capacity=10, category="Travel")
+        train = make_eventpart(name="Train", capacity=10, category="Travel")
+        for days in (1, 3):
+            order = make_order(positions=2)
+            assign(order, bus)
+            _backdate(order, days)
+        old = make_order(positions=2)
+        assign(old, train)
+        _backdate(old, 40)
+        assign(make_order(status=Order.STATUS_CANCELED), train)
+
+    forecast = compute_forecast(organizer)
+    rows = {r["name"]: r for r in forecast["eventparts"]}
+
+    assert rows["Bus"]["occupancy"] == 4
+    assert rows["Bus"]["velocity"] == round(4 / 14, 2)
+    assert rows["Bus"]["forecast"] == 4 + round(4 / 14 * 30)
+    assert rows["Bus"]["overflow"]
+    assert rows["Bus"]["days_until_full"] == 21
+
+    assert rows["Train"]["occupancy"] == 2
+    assert rows["Train"]["forecast"] == 2
+    assert rows["Train"]["days_until_full"] is None
+    assert not rows["Train"]["overflow"]
+
+    (travel,) = forecast["categories"]
+    assert travel["capacity"] == 20
+    assert travel["occupancy"] == 6
+    assert not travel["overflow"]
+
+
+@pytest.mark.django_db
+def test_forecast_ignores_past_events(organizer, event, make_eventpart):
+    with scopes_disabled():
+        make_eventpart()
+    assert compute_forecast(organizer)["eventparts"] == []
+
+
+@pytest.mark.django_db
+def test_forecast_report(
+    logged_in_client, user, organizer, upcoming, make_eventpart, make_order, assign
+):
+    with scopes_disabled():
+        team = Team.objects.create(
+            organizer=organizer, can_change_organizer_settings=True
+        )
+        team.members.add(user)
+        assign(make_order(), make_eventpart(name="Bus"))
+    url = "/control/organizer/{}/eventparts/forecast".format(organizer.slug)
+
+    response = logged_in_client.get(url)
+    assert response.status_code == 200
+    assert "not been computed yet" in response.content.decode()
+
+    assert logged_in_client.post(url).status_code == 302
+    response = logged_in_client.get(url)
+    assert [r["name"] for r in response.context["eventparts"]] == ["Bus"]
+
+    upcoming.settings.eventparts__public_start_name = "Arrival"
+    response = logged_in_client.get(url)
+    assert response.context["eventparts"][0]["type_name"] == "Arrival"
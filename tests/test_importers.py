@@ -0,0 +1,145 @@
+import pytest
+from decimal import Decimal
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django_scopes import scopes_disabled
+
+from pretix_eventparts.importers import (
+    AssignmentImportError,
+    error_report,
+    import_assignments,
+    read_rows,
+)
+from pretix_eventparts.models import EventPart
+from pretix_eventparts.utils import eventparts_for_order, eventparts_for_position
+
+
+def _read(content):
+    return read_rows(SimpleUploadedFile("import.csv", content.encode()), "import.csv")
+
+
+@pytest.mark.django_db
+def test_import_assignments(event, make_eventpart, make_order):
+    with scopes_disabled():
+        bus = make_eventpart(name="Bus")
+        train = make_eventpart(name="Train", capacity=1)
+        camp = make_eventpart(name="Camp", type=EventPart.EventPartTypes.END)
+        first, second, third = make_order(positions=2), make_order(), make_order()
+
+        header, rows = _read(
+            "Order,Position,Start,End\n"
+            "{},2,Train,camp\n"
+            "{},,bus,\n"
+            "{},,Train,\n"
+            "FOOBAR,,Bus,\n"
+            "{},,Plane,\n".format(first.code, second.code, third.code, first.code)
+        )
+        imported, errors = import_assignments(event, header, rows, chunk_size=2)
+
+        assert imported == 2
+        assert [(line, code) for line, code, position, message in errors] == [
+            (4, third.code),
+            (5, "FOOBAR"),
+            (6, first.code),
+        ]
+        position = first.positions.get(positionid=2)
+        assert eventparts_for_position(position)["start"] == train
+        assert eventparts_for_position(position)["end"] == camp
+        assert eventparts_for_order(second)["start"] == bus
+        assert train.used_places() == 1
+
+        report = error_report(errors).decode()
+        assert "FOOBAR" in report
+        assert "No order with this code exists." in report
+
+
+@pytest.mark.django_db
+def test_import_normalizes_positions_and_reports_unmatched_rows(
+    event, make_eventpart, make_order
+):
+    with scopes_disabled():
+        bus = make_eventpart(name="Bus")
+        order = make_order(positions=2)
+
+        header, rows = _read(
+            "Order,Position,Start\n"
+            "{code},2.0,Bus\n"
+            "{code},second,Bus\n"
+            "{code},1,\n".format(code=order.code)
+        )
+        progress = []
+        imported, errors = import_assignments(
+            event, header, rows, chunk_size=2, progress=progress.append, total=3
+        )
+
+        assert imported == 1
+        assert [(line, message) for line, code, position, message in errors] == [
+            (3, "The position ID is not a number."),
+            (4, "The row does not name an eventpart."),
+        ]
+        assert eventparts_for_position(order.positions.get(positionid=2)) == {
+            "start": bus,
+            "middle": None,
+            "end": None,
+        }
+        assert progress == [67, 100]
+
+
+@pytest.mark.django_db
+def test_import_rejects_positions_without_admission(event, make_eventpart, make_order):
+    with scopes_disabled():
+        bus = make_eventpart(name="Bus", capacity=1)
+        order = make_order()
+        shirt = event.items.create(
+            name="Shirt", default_price=Decimal("10.00"), admission=False
+        )
+        order.all_positions.create(item=shirt, price=Decimal("10.00"), positionid=2)
+
+        header, rows = _read("order,position,start\n{},2,Bus\n".format(order.code))
+        imported, errors = import_assignments(event, header, rows)
+
+        assert imported == 0
+        assert [message for line, code, position, message in errors] == [
+            "The order has no admission position with this ID."
+        ]
+        assert bus.used_places() == 0
+
+
+@pytest.mark.django_db
+def test_import_requires_order_column(event):
+    with pytest.raises(AssignmentImportError):
+        _read("Code,Start\nFOO,Bus\n")
+
+
+@pytest.mark.django_db
+def test_import_view(logged_in_client, event, make_eventpart, make_order):
+    with scopes_disabled():
+        bus = make_eventpart(name="Bus")
+        order = make_order()
+    url = "/control/event/{}/{}/eventparts/import".format(
+        event.organizer.slug, event.slug
+    )
+    upload = SimpleUploadedFile(
+        "import.csv", "order,start\n{},Bus\n".format(order.code).encode()
+    )
+    response = logged_in_client.post(url, {"file": upload})
+    assert response.status_code == 302
+    response = logged_in_client.get(response["Location"])
+    assert order.code in response.content.decode()
+
+    logged_in_client.post(response.request["PATH_INFO"], {"match_by": "name"})
+    with scopes_disabled():
+        assert eventparts_for_order(order)["start"] == bus
+
+
+@pytest.mark.django_db
+def test_csv_rows_are_decoded_as_they_are_read():
+    content = "Order;Start\r" + "".join(
+        "FOO{:05d};Bäckerei\r".format(i) for i in range(20000)
+    )
+    upload = SimpleUploadedFile("import.csv", content.encode("latin-1"))
+
+    header, rows = read_rows(upload, "import.csv")
+    assert header == ["order", "start"]
+    assert next(rows) == (2, {"order": "FOO00000", "start": "Bäckerei"})
+    assert upload.tell() < upload.size / 10
+    assert sum(1 for row in rows) == 19999
@@ -0,0 +1,31 @@
+import json
+import logging
+import pytest
+from django_scopes import scopes_disabled
+
+from pretix_eventparts import instrumentation
+from pretix_eventparts.signals import order_eventpart_selection
+
+
+@pytest.mark.django_db
+def test_receivers_are_instrumented(
+    monkeypatch, caplog, rf, event, make_eventpart, make_order, assign
+):
+    request = rf.get("/")
+    request.event = event
+    with scopes_disabled():
+        order = make_order()
+        assign(order, make_eventpart(name="Bus"))
+
+        with caplog.at_level(logging.INFO, logger=instrumentation.__name__):
+            order_eventpart_selection(event, order, request)
+            assert not caplog.records
+
+            monkeypatch.setattr(instrumentation, "ENABLED", True)
+            order = type(order).objects.get(pk=order.pk)
+            assert "Bus" in order_eventpart_selection(event, order, request)
+
+    record = json.loads(caplog.records[0].getMessage())
+    assert record["receiver"] == "control.order_info"
+    assert record["queries"] > 0
+    assert record["duration"] >= record["db_duration"] > 0
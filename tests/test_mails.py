@@ -0,0 +1,60 @@
+import pytest
+from django.core import mail as djmail
+from django_scopes import scopes_disabled
+from pretix.base.models import Order
+
+from pretix_eventparts.mails import batches, participant_recipients
+
+
+@pytest.mark.django_db
+def test_participant_recipients_are_deduplicated(
+    event, make_eventpart, make_order, assign
+):
+    with scopes_disabled():
+        bus = make_eventpart(name="Bus")
+        train = make_eventpart(name="Train")
+        first, second, third = make_order(positions=2), make_order(), make_order()
+        second.email = first.email.upper()
+        second.save()
+        canceled = make_order(status=Order.STATUS_CANCELED)
+        assign(first, bus)
+        assign(second, train)
+        assign(third, train)
+        assign(canceled, bus)
+
+        assert list(participant_recipients([bus.pk, train.pk])) == [
+            (first.email, "en"),
+            (third.email, "en"),
+        ]
+        assert bus.contacts() == [first.email]
+    assert list(batches(range(5), 2)) == [[0, 1], [2, 3], [4]]
+
+
+@pytest.mark.django_db
+def test_mail_view(logged_in_client, event, make_eventpart, make_order, assign):
+    with scopes_disabled():
+        bus = make_eventpart(name="Bus", category="Shuttle")
+        make_eventpart(name="Train")
+        order = make_order()
+        assign(order, bus)
+    url = "/control/event/{}/{}/eventparts/mail".format(
+        event.organizer.slug, event.slug
+    )
+    response = logged_in_client.post(
+        url, {"subject_0": "Hello", "message_0": "Welcome to {event}"}
+    )
+    assert "Please select at least one eventpart or category." in (
+        response.content.decode()
+    )
+
+    djmail.outbox = []
+    logged_in_client.post(
+        url,
+        {
+            "categories": ["Shuttle"],
+            "subject_0": "Hello",
+            "message_0": "Welcome to {event}",
+        },
+    )
+    assert [m.to for m in djmail.outbox] == [[order.email]]
+    assert "Welcome to Dummy" in djmail.outbox[0].body
@@ -0,0 +1,82 @@
+import pytest
+from django.core.management import call_command
+from django_scopes import scopes_disabled
+from io import StringIO
+from pretix.base.models import Order
+
+from pretix_eventparts.models import EventPart, EventPartAssignment, EventPartOccupancy
+from pretix_eventparts.occupancy import update_order_occupancy
+
+
+@pytest.mark.django_db
+def test_counters_follow_order_status(event, make_eventpart, make_order, assign):
+    with scopes_disabled():
+        part = make_eventpart()
+        paid = make_order(positions=2)
+        pending = make_order(positions=1, status=Order.STATUS_PENDING)
+        assign(paid, part)
+        assign(pending, part)
+        update_order_occupancy(paid)
+
+        counter = EventPartOccupancy.objects.get(eventpart=part)
+        assert counter.counts() == {
+            "pending": 1,
+            "paid": 2,
+            "expired": 0,
+            "canceled": 0,
+        }
+
+        paid.status = Order.STATUS_CANCELED
+        paid.save()
+        update_order_occupancy(paid)
+        counter.refresh_from_db()
+        assert (counter.paid, counter.canceled, counter.active) == (0, 2, 1)
+
+        EventPartAssignment.objects.filter(order=pending).delete()
+        update_order_occupancy(pending, extra_eventpart_ids=[part.pk])
+        counter.refresh_from_db()
+        assert counter.pending == 0
+
+
+@pytest.mark.django_db
+def test_occupancy_is_read_from_counters(event, make_eventpart, make_order, assign):
+    with scopes_disabled():
+        part = make_eventpart()
+        assign(make_order(positions=2), part)
+        assign(make_order(status=Order.STATUS_PENDING), part)
+        assert EventPart.objects.with_occupancy().get(pk=part.pk).occupancy == 3
+
+        EventPartOccupancy.objects.filter(eventpart=part).update(paid=5)
+        assert EventPart.objects.with_occupancy().get(pk=part.pk).occupancy == 6
+        assert part.used_places() == 6
+        assert (
+            EventPart.objects.with_occupancy(status=Order.STATUS_PAID)
+            .get(pk=part.pk)
+            .occupancy
+            == 5
+        )
+        assert make_eventpart(name="Empty").used_places() == 0
+
+
+@pytest.mark.django_db
+def test_rebuild_command_reports_drift(make_eventpart, make_order):
+    with scopes_disabled():
+        part = make_eventpart(name="Bus")
+        order = make_order(positions=3)
+        EventPartAssignment.objects.bulk_create(
+            [
+                EventPartAssignment(
+                    order=order, position=p, eventpart=part, type=part.type
+                )
+                for p in order.positions.all()
+            ]
+        )
+
+    out = StringIO()
+    call_command("rebuild_eventpart_occupancy", stdout=out)
+    assert "paid 0 -> 3" in out.getvalue()
+    assert "1 had drifted" in out.getvalue()
+
+    out = StringIO()
+    call_command("rebuild_eventpart_occupancy", stdout=out)
+    assert "0 had drifted" in out.getvalue()
@@ -0,0 +1,80 @@
+import datetime
+import pytest
+from django.utils.timezone import now
+from django_scopes import scopes_disabled
+
+from pretix_eventparts.assignments import CapacityExceeded, set_assignments
+from pretix_eventparts.models import EventPartReservation
+from pretix_eventparts.reservations import (
+    available_places,
+    confirm_reservations,
+    reserve_eventparts,
+)
+
+
+@pytest.mark.django_db
+def test_selfservice_reserve_and_confirm(client, event, make_eventpart, make_order):
+    event.live = True
+    event.save()
+    event.settings.eventparts__selfservice = True
+    with scopes_disabled():
+        part = make_eventpart(name="Bus")
+        order = make_order(positions=2)
+
+    url = "/{}/{}/order/{}/{}/eventparts/".format(
+        event.organizer.slug, event.slug, order.code, order.secret
+    )
+    response = client.get(url)
+    assert "Bus (10 places left)" in response.content.decode()
+
+    response = client.post(url, {"start": part.pk}, follow=True)
+    assert "We are holding your places" in response.content.decode()
+    with scopes_disabled():
+        assert part.used_places() == 0
+        assert EventPartReservation.objects.get(order=order).seats == 2
+
+    client.post(url, {"confirm": ""})
+    with scopes_disabled():
+        assert part.used_places() == 2
+        assert not EventPartReservation.objects.exists()
+
+
+@pytest.mark.django_db
+def test_selfservice_disabled(client, event, make_order):
+    event.live = True
+    event.save()
+    order = make_order()
+    url = "/{}/{}/order/{}/{}/eventparts/".format(
+        event.organizer.slug, event.slug, order.code, order.secret
+    )
+    assert client.get(url).status_code == 302
+    assert client.get(url.replace(order.secret, "foo")).status_code == 404
+
+
+@pytest.mark.django_db
+def test_reservations_hold_places(event, make_eventpart, make_order):
+    with scopes_disabled():
+        part = make_eventpart(capacity=1)
+        first, second, third = make_order(), make_order(), make_order()
+
+        reserve_eventparts(first, [part])
+        with pytest.raises(CapacityExceeded):
+            reserve_eventparts(second, [part])
+        with pytest.raises(CapacityExceeded):
+            set_assignments(event, {third: {"start": part}})
+        assert available_places(event) == {part.pk: 0}
+
+        EventPartReservation.objects.update(expires=now() - datetime.timedelta(1))
+        assert confirm_reservations(first) == []
+        reserve_eventparts(second, [part])
+        assert confirm_reservations(second) == [part]
+        assert part.used_places() == 1
+
+
+@pytest.mark.django_db
+def test_unlimited_eventparts_can_always_be_reserved(event, make_eventpart, make_order):
+    with scopes_disabled():
+        part = make_eventpart(capacity=0)
+        set_assignments(event, {make_order(positions=5): {"start": part}})
+        reserve_eventparts(make_order(), [part])
+        assert available_places(event) == {part.pk: None}
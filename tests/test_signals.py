@@ -0,0 +1,105 @@
+import pytest
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django_scopes import scopes_disabled
+
+from pretix_eventparts.models import EventPart
+from pretix_eventparts.signals import ticket_text_variables
+
+
+@pytest.mark.django_db
+def test_ticket_text_variables_share_one_lookup(
+    event, make_eventpart, make_order, assign
+):
+    with scopes_disabled():
+        order = make_order()
+        assign(
+            order,
+            make_eventpart(name="Bus", category="Shuttle"),
+            make_eventpart(name="Lunch", type=EventPart.EventPartTypes.MIDDLE),
+        )
+        order = type(order).objects.select_related("event").get(pk=order.pk)
+        position = order.positions.first()
+        # warm the settings cache, only the eventpart lookup should be left
+        order.event.settings.eventparts__public_start_name
+
+        variables = ticket_text_variables(sender=event)
+        with CaptureQueriesContext(connection) as ctx:
+            values = {
+                key: v["evaluate"](position, order, order.event)
+                for key, v in variables.items()
+            }
+        assert len(ctx) == 1
+
+    assert values["pretix_eventparts_start_name"] == "Bus"
+    assert values["pretix_eventparts_start_category"] == "Shuttle"
+    assert values["pretix_eventparts_middle_name"] == "Lunch"
+    assert values["pretix_eventparts_end_name"] == ""
+    assert values["pretix_eventparts_end_type"] == ""
+
+
+@pytest.mark.django_db
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+def test_public_order_info_is_cached_until_assignment_changes(
+    rf, event, make_eventpart, make_order, assign
+):
+    from pretix_eventparts.signals import order_eventpart_selection_public
+
+    event.settings.eventparts__public = True
+    request = rf.get("/")
+    request.event = event
+    with scopes_disabled():
+        order = make_order()
+        assign(order, make_eventpart(name="Bus"))
+
+        assert "Bus" in order_eventpart_selection_public(event, order, request)
+        order = type(order).objects.get(pk=order.pk)
+        with CaptureQueriesContext(connection) as ctx:
+            assert "Bus" in order_eventpart_selection_public(event, order, request)
+        assert len(ctx) == 0
+
+        assign(order, make_eventpart(name="Train"))
+        order = type(order).objects.get(pk=order.pk)
+        assert "Train" in order_eventpart_selection_public(event, order, request)
+
+        event.settings.eventparts__public = False
+        event.eventparts.first().save()
+        assert order_eventpart_selection_public(event, order, request) is None
+
+
+@pytest.mark.django_db
+@override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+)
+def test_dashboard_widget_is_cached_until_assignment_changes(
+    event, make_eventpart, make_order, assign
+):
+    from pretix_eventparts.signals import dashboard_widgets
+
+    with scopes_disabled():
+        bus = make_eventpart(name="Bus", category="Shuttle", capacity=4)
+        assign(make_order(positions=2), bus)
+
+        assert "2 / 4" in dashboard_widgets(event)[0]["content"]
+        with CaptureQueriesContext(connection) as ctx:
+            content = dashboard_widgets(event)[0]["content"]
+        assert len(ctx) == 0
+        assert "Category: Shuttle" in content
+
+        assign(make_order(positions=2), bus)
+        assert "4 / 4" in dashboard_widgets(event)[0]["content"]
+
+
+@pytest.mark.django_db
+def test_lazy_dashboard_widget_skips_the_summary(monkeypatch, event, make_eventpart):
+    from pretix_eventparts import signals
+
+    monkeypatch.setattr(signals, "occupancy_summary", None)
+    assert signals.dashboard_widgets(event, lazy=True) == []
+    with scopes_disabled():
+        make_eventpart(name="Bus")
+    (widget,) = signals.dashboard_widgets(event, lazy=True)
+    assert widget["content"] is None
@@ -0,0 +1,57 @@
+import pytest
+from django_scopes import scopes_disabled
+from pretix.base.models import CachedTicket
+
+from pretix_eventparts.models import PendingTicketRegeneration
+from pretix_eventparts.tickets import (
+    queue_eventpart_ticket_regeneration,
+    regenerate_pending_tickets,
+)
+
+
+def _pending(event):
+    return set(
+        PendingTicketRegeneration.objects.filter(event=event).values_list(
+            "position_id", flat=True
+        )
+    )
+
+
+@pytest.mark.django_db
+def test_assignment_changes_mark_tickets_once(
+    event, make_eventpart, make_order, assign
+):
+    with scopes_disabled():
+        bus = make_eventpart(name="Bus")
+        train = make_eventpart(name="Train")
+        order, other = make_order(positions=2), make_order()
+        assign(other, train)
+        PendingTicketRegeneration.objects.all().delete()
+        position = order.positions.first()
+        CachedTicket.objects.create(
+            order_position=position, provider="pdf", type="application/pdf"
+        )
+
+        for part in (bus, train, bus):
+            assign(order, part)
+        assert _pending(event) == set(order.positions.values_list("pk", flat=True))
+
+        assert regenerate_pending_tickets(event) == 1
+        assert not CachedTicket.objects.filter(order_position=position).exists()
+        assert not _pending(event)
+
+
+@pytest.mark.django_db
+def test_eventpart_rename_marks_only_its_participants(
+    event, make_eventpart, make_order, assign
+):
+    with scopes_disabled():
+        bus = make_eventpart(name="Bus")
+        train = make_eventpart(name="Train")
+        order, other = make_order(positions=2), make_order()
+        assign(order, bus)
+        assign(other, train)
+        PendingTicketRegeneration.objects.all().delete()
+
+        queue_eventpart_ticket_regeneration(bus)
+        assert _pending(event) == set(order.positions.values_list("pk", flat=True))
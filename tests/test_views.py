@@ -0,0 +1,246 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django_scopes import scopes_disabled
+from pretix.base.models import Order
+
+
+def _list_url(event):
+    return "/control/event/{}/{}/eventparts/parts/".format(
+        event.organizer.slug, event.slug
+    )
+
+
+def _populate(make_eventpart, make_order, assign, count):
+    with scopes_disabled():
+        for i in range(count):
+            part = make_eventpart(name="Part {}".format(i))
+            assign(make_order(positions=2), part)
+            assign(make_order(positions=1), part)
+
+
+@pytest.mark.django_db
+def test_list_query_count_is_independent_of_row_count(
+    logged_in_client, event, make_eventpart, make_order, assign
+):
+    _populate(make_eventpart, make_order, assign, 2)
+    logged_in_client.get(_list_url(event))
+    with CaptureQueriesContext(connection) as few:
+        response = logged_in_client.get(_list_url(event))
+    assert response.status_code == 200
+
+    _populate(make_eventpart, make_order, assign, 10)
+    with CaptureQueriesContext(connection) as many:
+        response = logged_in_client.get(_list_url(event))
+    assert response.status_code == 200
+
+    assert len(many) == len(few)
+
+
+@pytest.mark.django_db
+def test_occupancy_annotation(event, make_eventpart, make_order, assign):
+    from pretix_eventparts.models import EventPart
+
+    with scopes_disabled():
+        part = make_eventpart()
+        assign(make_order(positions=2), part)
+        assign(make_order(positions=3, status=Order.STATUS_PENDING), part)
+        empty = make_eventpart(name="Empty")
+
+        assert part.used_places() == 5
+        annotated = EventPart.objects.with_occupancy().get(pk=part.pk)
+        assert annotated.occupancy == 5
+        assert annotated.used_places() == 5
+        paid = EventPart.objects.with_occupancy(status=Order.STATUS_PAID)
+        assert paid.get(pk=part.pk).occupancy == 2
+        assert paid.get(pk=empty.pk).occupancy == 0
+
+
+@pytest.mark.django_db
+def test_settings_regenerate_css_only_when_made_public(
+    monkeypatch, logged_in_client, event
+):
+    from pretix_eventparts import views
+
+    calls = []
+    monkeypatch.setattr(
+        views.regenerate_css, "apply_async", lambda **kwargs: calls.append(kwargs)
+    )
+    url = "/control/event/{}/{}/eventparts/settings".format(
+        event.organizer.slug, event.slug
+    )
+    data = {
+        "eventparts__public": "on",
+        "eventparts__selfservice_reservation_time": "10",
+        "eventparts__public_name_0": "Eventparts",
+        "eventparts__public_start_name_0": "Start",
+        "eventparts__public_middle_name_0": "Middle",
+        "eventparts__public_end_name_0": "End",
+    }
+    assert logged_in_client.post(url, data).status_code == 302
+    logged_in_client.post(url, data)
+    assert len(calls) == 1
+
+    del data["eventparts__public"]
+    logged_in_client.post(url, data)
+    data["eventparts__public"] = "on"
+    logged_in_client.post(url, data)
+    assert len(calls) == 2
+
+
+@pytest.mark.django_db
+def test_type_names_are_shared_until_settings_change(
+    logged_in_client, event, make_eventpart
+):
+    from pretix_eventparts.models import clear_type_names
+
+    with scopes_disabled():
+        parts = [make_eventpart(name="Part {}".format(i)) for i in range(3)]
+    for part in parts:
+        part.event = event
+    assert [str(p.type_name) for p in parts] == ["Start"] * 3
+
+    event.settings.eventparts__public_start_name = "Arrival"
+    assert str(parts[0].type_name) == "Start"
+    clear_type_names(event)
+    assert str(parts[0].type_name) == "Arrival"
+
+    url = "/control/event/{}/{}/eventparts/".format(event.organizer.slug, event.slug)
+    logged_in_client.post(
+        url + "settings",
+        {
+            "eventparts__selfservice_reservation_time": "10",
+            "eventparts__public_name_0": "Eventparts",
+            "eventparts__public_start_name_0": "Kickoff",
+            "eventparts__public_middle_name_0": "Middle",
+            "eventparts__public_end_name_0": "End",
+        },
+    )
+    assert "Kickoff" in logged_in_client.get(url + "parts/").content.decode()
+
+
+def test_sass_postamble_is_read_once(monkeypatch):
+    from pretix_eventparts import signals
+
+    signals._postamble_path.cache_clear()
+    signals._postamble_content.cache_clear()
+    assert ".eventpart-row" in signals.r_sass_postamble("main.scss")
+    monkeypatch.setattr(
+        signals.finders, "find", lambda path: pytest.fail("Looked up again")
+    )
+    assert signals.r_sass_postamble("main.scss") == signals.postamble()
+    assert signals._postamble_content.cache_info().misses == 1
+
+
+@pytest.mark.django_db
+def test_participants_are_paged_by_order_id(
+    monkeypatch, logged_in_client, event, make_eventpart, make_order, assign
+):
+    from pretix_eventparts import views
+
+    monkeypatch.setattr(views, "PARTICIPANTS_PAGE_SIZE", 2)
+    with scopes_disabled():
+        part = make_eventpart()
+        orders = [make_order(positions=2) for i in range(5)]
+        for order in orders:
+            assign(order, part)
+        assign(make_order(), make_eventpart(name="Other"))
+    url = "/control/event/{}/{}/eventparts/part/{}/participants".format(
+        event.organizer.slug, event.slug, part.pk
+    )
+
+    seen = []
+    after = ""
+    while True:
+        response = logged_in_client.get(url + after)
+        assert response.status_code == 200
+        seen += [o.code for o in response.context["participants"]]
+        if "next_after" not in response.context:
+            break
+        after = "?after={}".format(response.context["next_after"])
+    assert seen == [o.code for o in orders]
+
+
+@pytest.mark.django_db
+def test_order_search_by_eventpart(
+    logged_in_client, event, make_eventpart, make_order, assign
+):
+    with scopes_disabled():
+        bus, train = make_eventpart(name="Bus"), make_eventpart(name="Night train")
+        on_bus, on_train = make_order(), make_order()
+        assign(on_bus, bus)
+        assign(on_train, train)
+    url = "/control/event/{}/{}/orders/".format(event.organizer.slug, event.slug)
+
+    response = logged_in_client.get(url, {"query": "night"})
+    assert [o.code for o in response.context["orders"]] == [on_train.code]
+
+    response = logged_in_client.get(url, {"eventparts-eventpart": bus.pk})
+    assert [o.code for o in response.context["orders"]] == [on_bus.code]
+
+
+@pytest.mark.django_db
+def test_assign_form_loads_eventparts_once(
+    logged_in_client, event, make_eventpart, make_order
+):
+    from pretix_eventparts.models import EventPart
+    from pretix_eventparts.utils import eventparts_for_order
+
+    with scopes_disabled():
+        order = make_order()
+        bus = make_eventpart(name="Bus")
+        closing = make_eventpart(name="Closing", type=EventPart.EventPartTypes.END)
+    url = "/control/event/{}/{}/eventparts/order/{}/".format(
+        event.organizer.slug, event.slug, order.code
+    )
+
+    logged_in_client.get(url)
+    with CaptureQueriesContext(connection) as few:
+        assert logged_in_client.get(url).status_code == 200
+    with scopes_disabled():
+        for i in range(10):
+            make_eventpart(
+                name="Part {}".format(i), type=EventPart.EventPartTypes.MIDDLE
+            )
+    with CaptureQueriesContext(connection) as many:
+        response = logged_in_client.get(url)
+    assert len(many) == len(few)
+    assert "Part 9" in response.content.decode()
+
+    response = logged_in_client.post(
+        url, {"eventpart_start": bus.pk, "eventpart_end": closing.pk}
+    )
+    assert response.status_code == 302
+    with scopes_disabled():
+        assigned = eventparts_for_order(Order.objects.get(pk=order.pk))
+    assert assigned["start"] == bus and assigned["end"] == closing
+    assert assigned["middle"] is None
+
+    response = logged_in_client.post(url, {"eventpart_start": closing.pk})
+    assert response.status_code == 200
+    assert "eventpart_start" in response.context["form"].errors
+
+
+@pytest.mark.django_db
+def test_type_is_fixed_once_orders_are_assigned(
+    event, make_eventpart, make_order, assign
+):
+    from pretix_eventparts.forms import EventPartForm
+    from pretix_eventparts.models import EventPart
+
+    with scopes_disabled():
+        part = make_eventpart(name="Bus")
+        data = {
+            "name": "Bus",
+            "description_0": "Leaves at noon",
+            "category": "Shuttle",
+            "type": "end",
+            "capacity": 10,
+        }
+        assert EventPartForm(data=data, instance=part, event=event).is_valid()
+
+        assign(make_order(), part)
+        part = EventPart.objects.get(pk=part.pk)
+        form = EventPartForm(data=data, instance=part, event=event)
+        assert not form.is_valid()
+        assert "type" in form.errors
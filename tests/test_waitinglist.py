@@ -0,0 +1,142 @@
+import pytest
+from datetime import timedelta
+from django_scopes import scopes_disabled
+from pretix.base.models import Order
+
+from pretix_eventparts.assignments import promote_waiting_list
+from pretix_eventparts.models import EventPartWaitingListEntry
+from pretix_eventparts.utils import eventparts_for_order
+
+
+def _enqueue(eventpart, order, priority=0, age=0):
+    entry = EventPartWaitingListEntry.objects.create(
+        eventpart=eventpart, order=order, priority=priority
+    )
+    EventPartWaitingListEntry.objects.filter(pk=entry.pk).update(
+        created=entry.created - timedelta(minutes=age)
+    )
+    return entry
+
+
+def _assigned(order, type):
+    order = Order.objects.get(pk=order.pk)
+    part = eventparts_for_order(order)[type]
+    return part.pk if part else None
+
+
+@pytest.mark.django_db
+def test_promotes_by_priority_then_age(event, make_eventpart, make_order):
+    with scopes_disabled():
+        bus = make_eventpart(name="Bus", capacity=2)
+        old, new, urgent = make_order(), make_order(), make_order()
+        _enqueue(bus, new, age=1)
+        _enqueue(bus, old, age=2)
+        _enqueue(bus, urgent, priority=5)
+
+        assert promote_waiting_list(event) == 2
+        assert _assigned(urgent, bus.type) == bus.pk
+        assert _assigned(old, bus.type) == bus.pk
+        assert _assigned(new, bus.type) is None
+        assert list(bus.waiting_list.values_list("order", flat=True)) == [new.pk]
+
+
+@pytest.mark.django_db
+def test_skips_orders_that_do_not_fit(event, make_eventpart, make_order, assign):
+    with scopes_disabled():
+        bus = make_eventpart(name="Bus", capacity=3)
+        assign(make_order(), bus)
+        group, single = make_order(positions=3), make_order()
+        _enqueue(bus, group, age=2)
+        _enqueue(bus, single, age=1)
+
+        assert promote_waiting_list(event) == 1
+        assert _assigned(single, bus.type) == bus.pk
+        assert _assigned(group, bus.type) is None
+        assert bus.waiting_list.filter(order=group).exists()
+
+
+@pytest.mark.django_db
+def test_promotion_moves_order_and_frees_its_place(
+    event, make_eventpart, make_order, assign
+):
+    with scopes_disabled():
+        bus = make_eventpart(name="Bus", capacity=1)
+        train = make_eventpart(name="Train", capacity=1)
+        moving, waiting = make_order(), make_order()
+        assign(moving, bus)
+        _enqueue(train, moving, priority=1)
+        _enqueue(bus, waiting)
+        _enqueue(train, waiting)
+
+        assert promote_waiting_list(event) == 1
+        assert _assigned(moving, bus.type) == train.pk
+        assert not EventPartWaitingListEntry.objects.filter(order=moving).exists()
+
+        # The place freed on the bus goes to the next order in line
+        assert promote_waiting_list(event) == 1
+        assert _assigned(waiting, bus.type) == bus.pk
+        assert not EventPartWaitingListEntry.objects.filter(order=waiting).exists()
+
+
+@pytest.mark.django_db
+def test_drops_canceled_orders(event, make_eventpart, make_order):
+    with scopes_disabled():
+        bus = make_eventpart(name="Bus")
+        _enqueue(bus, make_order(status=Order.STATUS_CANCELED))
+
+        assert promote_waiting_list(event) == 0
+        assert not bus.waiting_list.exists()
+
+
+@pytest.mark.django_db
+def test_waiting_list_view(event, make_eventpart, make_order, logged_in_client):
+    with scopes_disabled():
+        bus = make_eventpart(name="Bus", capacity=0)
+        order = make_order()
+    url = "/control/event/{}/{}/eventparts/part/{}/waitinglist".format(
+        event.organizer.slug, event.slug, bus.pk
+    )
+
+    assert logged_in_client.get(url).status_code == 200
+    response = logged_in_client.post(url, {"order": order.code.lower(), "priority": 3})
+    assert response.status_code == 302
+    with scopes_disabled():
+        entry = bus.waiting_list.get()
+    assert entry.order == order and entry.priority == 3
+
+    response = logged_in_client.post(url, {"order": order.code, "priority": 0})
+    assert response.status_code == 200
+    assert "already on the waiting list" in response.content.decode()
+
+    logged_in_client.post(url, {"delete": entry.pk})
+    with scopes_disabled():
+        assert not bus.waiting_list.exists()
+
+
+@pytest.mark.django_db
+def test_canceled_order_frees_its_place(
+    monkeypatch, event, make_eventpart, make_order, assign
+):
+    from pretix.base.signals import order_canceled
+
+    from pretix_eventparts import assignments
+
+    scheduled = []
+    monkeypatch.setattr(
+        assignments.transaction, "on_commit", lambda func: scheduled.append(func)
+    )
+    with scopes_disabled():
+        bus = make_eventpart(name="Bus", capacity=1)
+        leaving, waiting = make_order(), make_order()
+        assign(leaving, bus)
+        _enqueue(bus, waiting)
+        assert promote_waiting_list(event) == 0
+
+        leaving.status = Order.STATUS_CANCELED
+        leaving.save()
+        order_canceled.send(event, order=leaving)
+        assert scheduled
+
+        assert promote_waiting_list(event) == 1
+        assert _assigned(waiting, bus.type) == bus.pk
+        assert bus.used_places() == 1